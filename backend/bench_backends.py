@@ -0,0 +1,128 @@
+"""
+Latency / memory benchmark for inference backends.
+
+Each backend is loaded in a fresh process so its resident memory is measured
+in isolation. Reports load time, per-item latency for the image and text
+towers at batch size 1 and --batch-size, and RSS after load / peak.
+
+    python bench_backends.py --backends torch torch-int8 torchscript onnx onnx-int8
+"""
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+from pathlib import Path
+
+from inference_backends import BACKENDS, MODEL_NAME
+
+DATA_ROOT = Path(__file__).resolve().parent.parent / "data"
+
+
+def rss_mb() -> dict:
+    """Current and peak resident set size of this process, in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {
+            "rss_mb": int(fields["VmRSS"].split()[0]) / 1024,
+            "peak_rss_mb": int(fields["VmHWM"].split()[0]) / 1024,
+        }
+    except (OSError, KeyError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return {"rss_mb": peak, "peak_rss_mb": peak}
+
+
+def sample_inputs(n: int):
+    from PIL import Image
+    image_paths = sorted((DATA_ROOT / "data" / "chest_xrays").glob("*.jpg"))[:n]
+    images = [Image.open(p).convert("RGB") for p in image_paths]
+    with open(DATA_ROOT / "radiology_test_set.json") as f:
+        texts = [r["report_text"] for r in json.load(f)[:n]]
+    return images, texts
+
+
+def time_per_item(fn, items, batch_size: int, repeats: int) -> float:
+    """Median milliseconds per item over `repeats` passes"""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for i in range(0, len(items), batch_size):
+            fn(items[i:i + batch_size])
+        samples.append((time.perf_counter() - started) * 1000 / len(items))
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def run_one(name: str, n: int, batch_size: int, repeats: int, threads: int, results):
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    from inference_backends import load_backend
+
+    images, texts = sample_inputs(n)
+    baseline = rss_mb()["rss_mb"]
+
+    started = time.perf_counter()
+    backend = load_backend(name, MODEL_NAME)
+    backend.warmup()
+    load_s = time.perf_counter() - started
+    after_load = rss_mb()["rss_mb"]
+
+    # Warm-up (graph optimization, allocator)
+    backend.encode_images(images[:batch_size])
+    backend.encode_text(texts[:batch_size])
+
+    report = {
+        "backend": name,
+        "load_s": round(load_s, 2),
+        "image_ms_per_item_b1": round(time_per_item(backend.encode_images, images, 1, repeats), 2),
+        f"image_ms_per_item_b{batch_size}": round(time_per_item(backend.encode_images, images, batch_size, repeats), 2),
+        "text_ms_per_item_b1": round(time_per_item(backend.encode_text, texts, 1, repeats), 2),
+        f"text_ms_per_item_b{batch_size}": round(time_per_item(backend.encode_text, texts, batch_size, repeats), 2),
+        "model_rss_mb": round(after_load - baseline, 1),
+        "peak_rss_mb": round(rss_mb()["peak_rss_mb"], 1),
+    }
+    results.put(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    reports = []
+    for name in args.backends:
+        results = ctx.Queue()
+        proc = ctx.Process(target=run_one, args=(name, args.samples, args.batch_size, args.repeats, args.threads, results))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            print(f"❌ {name} failed (exit code {proc.exitcode})")
+            continue
+        reports.append(results.get())
+
+    print()
+    for report in reports:
+        print(f"--- {report['backend']} ---")
+        for key, value in report.items():
+            if key != "backend":
+                print(f"   {key:<24} {value}")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": MODEL_NAME, "results": reports}, f, indent=4)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Response size / deserialization benchmark for the read projections in data_access.py.
+
+Each read shape the API issues is sent to Qdrant twice over REST, once the way
+it used to be fetched (whole payload, and every vector where it asked for
+any) and once with its Projection. For both variants reports the response
+bytes, the time to parse the body into qdrant models, and the end-to-end
+round trip.
+
+    python bench_projection.py --repeats 50 --output projection.json
+"""
+import os
+import json
+import time
+import argparse
+
+import httpx
+from dotenv import load_dotenv
+from qdrant_client.http import models
+
+load_dotenv()
+
+from data_access import Knowledge, Uploads, MedicalHistory
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
+USER_COLLECTION = os.getenv("QDRANT_USER_COLLECTION", "patient_uploads")
+MEDICAL_HISTORY_COLLECTION = "medical_history"
+
+
+def parse_points(body: dict, model):
+    result = body["result"]
+    points = result["points"] if isinstance(result, dict) else result
+    return [model(**point) for point in points]
+
+
+def sample_point(http, collection: str):
+    """First point of a collection (with payload and vectors), or None if it is empty/missing"""
+    response = http.post(f"/collections/{collection}/points/scroll",
+                         json={"limit": 1, "with_payload": True, "with_vector": True})
+    if response.status_code != 200:
+        return None
+    points = response.json()["result"]["points"]
+    return points[0] if points else None
+
+
+def build_cases(http, limit: int):
+    """(name, path, full request body, projected request body, response model) per read shape"""
+    cases = []
+    knowledge = sample_point(http, KNOWLEDGE_COLLECTION)
+    if knowledge:
+        path = f"/collections/{KNOWLEDGE_COLLECTION}/points/query"
+        query = {"query": knowledge["vector"]["image_vector"], "using": "image_vector", "limit": limit}
+        cases.append(("knowledge hits (search)", path,
+                      {**query, "with_payload": True},
+                      {**query, "with_payload": Knowledge.HIT.with_payload},
+                      models.ScoredPoint))
+        path = f"/collections/{KNOWLEDGE_COLLECTION}/points/scroll"
+        page = {"limit": 1024, "with_vector": ["image_vector", "text_vector"]}
+        cases.append(("knowledge index load (1024 pts)", path,
+                      {**page, "with_payload": True},
+                      {**page, "with_payload": Knowledge.HIT.with_payload},
+                      models.Record))
+
+    upload = sample_point(http, USER_COLLECTION)
+    if upload:
+        path = f"/collections/{USER_COLLECTION}/points"
+        ids = {"ids": [upload["id"]]}
+        neighbor_source = Uploads.RAG_CONTEXT.with_vector("image_vector")
+        cases.append(("scan neighbor lookup", path,
+                      {**ids, "with_payload": True, "with_vector": True},
+                      {**ids, "with_payload": neighbor_source.with_payload, "with_vector": neighbor_source.with_vectors},
+                      models.Record))
+        cases.append(("formal report scan", path,
+                      {**ids, "with_payload": True},
+                      {**ids, "with_payload": Uploads.REPORT_SCAN.with_payload},
+                      models.Record))
+        path = f"/collections/{USER_COLLECTION}/points/scroll"
+        history = {"limit": 100, "with_vector": False, "filter": {"must": [
+            {"key": "patient_id", "match": {"value": upload["payload"].get("patient_id")}}]}}
+        cases.append(("patient history", path,
+                      {**history, "with_payload": True},
+                      {**history, "with_payload": Uploads.HISTORY_ROW.with_payload},
+                      models.Record))
+
+    item = sample_point(http, MEDICAL_HISTORY_COLLECTION)
+    if item:
+        path = f"/collections/{MEDICAL_HISTORY_COLLECTION}/points/scroll"
+        listing = {"limit": 1000, "with_vector": False, "filter": {"must": [
+            {"key": "patient_id", "match": {"value": item["payload"].get("patient_id")}}]}}
+        cases.append(("medical history listing", path,
+                      {**listing, "with_payload": True},
+                      {**listing, "with_payload": MedicalHistory.LISTING.with_payload},
+                      models.Record))
+    return cases
+
+
+def measure(http, path: str, body: dict, model, repeats: int) -> dict:
+    sizes, parse_ms, round_trip_ms = [], [], []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        response = http.post(path, json=body)
+        response.raise_for_status()
+        content = response.content
+        parsed_at = time.perf_counter()
+        parse_points(json.loads(content), model)
+        finished = time.perf_counter()
+        sizes.append(len(content))
+        parse_ms.append((finished - parsed_at) * 1000)
+        round_trip_ms.append((finished - started) * 1000)
+    parse_ms.sort()
+    round_trip_ms.sort()
+    return {
+        "bytes": sizes[-1],
+        "parse_ms_p50": round(parse_ms[len(parse_ms) // 2], 3),
+        "round_trip_ms_p50": round(round_trip_ms[len(round_trip_ms) // 2], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=10, help="Hits per knowledge search")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    headers = {"api-key": QDRANT_API_KEY} if QDRANT_API_KEY else {}
+    with httpx.Client(base_url=QDRANT_URL, headers=headers, timeout=60) as http:
+        cases = build_cases(http, args.limit)
+        if not cases:
+            print("❌ No collections with data found. Run ingest_to_qdrant.py and upload a scan first.")
+            return
+
+        reports = []
+        for name, path, full_body, projected_body, model in cases:
+            # Warm-up (connection, Qdrant caches)
+            measure(http, path, full_body, model, 2)
+            measure(http, path, projected_body, model, 2)
+            full = measure(http, path, full_body, model, args.repeats)
+            projected = measure(http, path, projected_body, model, args.repeats)
+            reports.append({"read": name, "full": full, "projected": projected})
+
+    print()
+    print(f"{'read':<34}{'bytes':>22}{'parse ms (p50)':>24}{'round trip ms (p50)':>26}")
+    for report in reports:
+        full, projected = report["full"], report["projected"]
+        saved = 1 - projected["bytes"] / full["bytes"] if full["bytes"] else 0.0
+        print(f"{report['read']:<34}"
+              f"{full['bytes']:>9} → {projected['bytes']:<7}{saved:>5.0%}"
+              f"{full['parse_ms_p50']:>12.3f} → {projected['parse_ms_p50']:<9.3f}"
+              f"{full['round_trip_ms_p50']:>13.3f} → {projected['round_trip_ms_p50']:<9.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+/chat throughput against a local Qdrant for each Qdrant client configuration.
+
+Starts the API once per configuration:
+  threaded    blocking QdrantClient on the I/O thread pool (previous behaviour)
+  async-rest  AsyncQdrantClient over pooled HTTP connections
+  async-grpc  AsyncQdrantClient with prefer_grpc
+and drives the same /chat load at each. The messages alternate between the
+fetch intent (filtered vector search on patient_uploads) and text diagnosis
+with the in-process knowledge index disabled, so every request makes Qdrant
+round trips. The servers run with an empty GEMINI_API_KEY (unless --with-llm)
+so the LLM stays out of the numbers.
+
+    python bench_qdrant_client.py --requests 1000 --concurrency 64
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import subprocess
+from pathlib import Path
+
+from loadgen import run_load, wait_until_ready
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+CONFIGS = {
+    "threaded": {"QDRANT_CLIENT_MODE": "threaded"},
+    "async-rest": {"QDRANT_CLIENT_MODE": "async", "QDRANT_PREFER_GRPC": "false"},
+    "async-grpc": {"QDRANT_CLIENT_MODE": "async", "QDRANT_PREFER_GRPC": "true"},
+}
+
+MESSAGES = [
+    "Show my scan from march",
+    "What is pleural effusion?",
+    "Fetch my previous chest x-ray",
+    "What findings suggest cardiomegaly?",
+]
+
+
+def run_config(name: str, args) -> dict:
+    env = dict(os.environ, KNOWLEDGE_INDEX_ENABLED="false", WARMUP_TOWERS="text",
+               QDRANT_POOL_SIZE=str(args.pool_size), **CONFIGS[name])
+    if not args.with_llm:
+        # Empty rather than unset: load_dotenv() in main.py would restore it from .env
+        env["GEMINI_API_KEY"] = ""
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"]
+
+    print(f"▶️ {name}")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        if not wait_until_ready(base_url):
+            raise RuntimeError(f"{name} server did not become ready")
+        make_body = lambda i: {"patient_id": args.patient_id, "message": f"{MESSAGES[i % len(MESSAGES)]} ({i})"}
+        # Warm-up: text tower, embedding cache misses, Qdrant connections
+        run_load(base_url, "/chat", make_body=make_body, requests=args.concurrency * 2, concurrency=args.concurrency)
+        load = run_load(base_url, "/chat", make_body=make_body,
+                        requests=args.requests, concurrency=args.concurrency)
+        return {"config": name, **load}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--pool-size", type=int, default=64, help="QDRANT_POOL_SIZE for the REST configs")
+    parser.add_argument("--patient-id", default="BENCH")
+    parser.add_argument("--with-llm", action="store_true", help="Keep GEMINI_API_KEY (LLM latency dominates)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run_config(name, args) for name in args.configs]
+
+    print()
+    baseline = results[0]["requests_per_sec"] if results else 0
+    for r in results:
+        speedup = r["requests_per_sec"] / baseline if baseline else 0.0
+        print(f"--- {r['config']} ---")
+        print(f"   requests/sec        {r['requests_per_sec']}  ({speedup:.2f}x, ok={r['ok']}, errors={r['errors']})")
+        print(f"   latency p50/p95/p99 {r['p50_ms']} / {r['p95_ms']} / {r['p99_ms']} ms")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
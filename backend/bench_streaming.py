@@ -0,0 +1,138 @@
+"""
+Time-to-first-byte of the JSON vs streaming (SSE) RAG endpoints.
+
+Starts the API with the local fake streaming LLM (LLM_BACKEND=fake, so the
+numbers do not depend on Gemini) unless --base-url points at a running
+server, then calls each endpoint pair sequentially and reports p50/p95 of
+  ttfb         first response byte (for JSON this is the whole answer)
+  first_token  first `token` event (SSE only)
+  total        last byte
+
+Every sample is a cache miss: the started server runs with LLM_CACHE_SIZE=0,
+and the LLM answer cache is cleared (DELETE /llm-cache, outside the timer)
+before each request, so a --base-url server does not replay the answers for
+the repeated --scan-id either.
+
+    python bench_streaming.py --requests 50 --scan-id <uploaded scan id>
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlparse
+
+from loadgen import percentile, wait_until_ready
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def clear_llm_cache(base_url: str):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    conn.request("DELETE", "/llm-cache")
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    if response.status >= 400:
+        raise RuntimeError(f"DELETE /llm-cache returned {response.status}")
+
+
+def timed_request(base_url: str, path: str, body: dict) -> dict:
+    clear_llm_cache(base_url)
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=300)
+    started = time.perf_counter()
+    conn.request("POST", path, body=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    first_line = response.readline()
+    ttfb = time.perf_counter() - started
+    first_token = None
+    if response.getheader("Content-Type", "").startswith("text/event-stream"):
+        line = first_line
+        while line:
+            if line.startswith(b"event: error"):
+                raise RuntimeError(f"{path}: {response.readline().decode().strip()}")
+            if line.startswith(b"event: token") and first_token is None:
+                first_token = time.perf_counter() - started
+            line = response.readline()
+    else:
+        response.read()
+        if response.status >= 400:
+            raise RuntimeError(f"{path} returned {response.status}")
+    total = time.perf_counter() - started
+    conn.close()
+    return {"ttfb": ttfb * 1000, "first_token": first_token * 1000 if first_token is not None else None,
+            "total": total * 1000}
+
+
+def summarize(samples) -> dict:
+    report = {}
+    for key in ("ttfb", "first_token", "total"):
+        values = [s[key] for s in samples if s[key] is not None]
+        if values:
+            report[f"{key}_p50_ms"] = round(percentile(values, 50), 1)
+            report[f"{key}_p95_ms"] = round(percentile(values, 95), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--patient-id", default="BENCH")
+    parser.add_argument("--scan-id", help="Uploaded scan to use for the analyze-scan pair (skipped if omitted)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    proc = None
+    base_url = args.base_url
+    if not base_url:
+        env = dict(os.environ, LLM_BACKEND="fake", WARMUP_TOWERS="text", LLM_CACHE_SIZE="0")
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+                                 "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    pairs = [("/chat", "/chat/stream", lambda i: {"patient_id": args.patient_id,
+                                                  "message": f"What is pleural effusion? ({i})"})]
+    if args.scan_id:
+        pairs.append(("/analyze-scan", "/analyze-scan/stream", lambda i: {"scan_id": args.scan_id}))
+
+    results = []
+    try:
+        if not wait_until_ready(base_url):
+            raise RuntimeError("server did not become ready")
+        for json_path, stream_path, make_body in pairs:
+            for path in (json_path, stream_path):
+                timed_request(base_url, path, make_body(-1))  # warm-up
+                samples = [timed_request(base_url, path, make_body(i)) for i in range(args.requests)]
+                results.append({"endpoint": path, **summarize(samples)})
+    finally:
+        if proc:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print()
+    for r in results:
+        print(f"--- {r['endpoint']} ---")
+        for key, value in r.items():
+            if key != "endpoint":
+                print(f"   {key:<20} {value}")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Shared-weights vs independent workers benchmark.
+
+Starts the API twice with the same number of workers:
+  shared       python serve.py --workers N   (weights loaded once, forked copy-on-write)
+  independent  uvicorn main:app --workers N  (every worker loads its own copy)
+drives the same /chat load at both, and reports requests/sec, latency and
+total memory of the process tree (RSS double-counts shared pages, PSS splits
+them fairly between processes).
+
+    python bench_workers.py --workers 4 --requests 400 --concurrency 16
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+from pathlib import Path
+
+from loadgen import run_load, wait_until_ready
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+
+def process_tree(root_pid: int):
+    """root_pid and all of its descendants (Linux /proc)"""
+    parents = {}
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                stat = (entry / "stat").read_text()
+                ppid = int(stat.rsplit(")", 1)[1].split()[1])
+                parents.setdefault(ppid, []).append(int(entry.name))
+            except (OSError, IndexError, ValueError):
+                continue
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(parents.get(pid, []))
+    return tree
+
+
+def memory_mb(pids) -> dict:
+    """Summed RSS and PSS over pids, in MB"""
+    rss = pss = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Rss:"):
+                    rss += int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss += int(line.split()[1])
+        except OSError:
+            continue
+    return {"total_rss_mb": round(rss / 1024, 1), "total_pss_mb": round(pss / 1024, 1)}
+
+
+def run_mode(mode: str, args) -> dict:
+    env = dict(os.environ, PRELOAD_TOWERS="image,text", WARMUP_TOWERS="image,text")
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    if mode == "shared":
+        cmd = [sys.executable, "serve.py", "--workers", str(args.workers), "--port", str(args.port),
+               "--log-level", "warning"]
+    else:
+        env.update(OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads))
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(args.workers),
+               "--port", str(args.port), "--log-level", "warning"]
+
+    print(f"▶️ {mode}: {' '.join(cmd)}")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        if not wait_until_ready(base_url):
+            raise RuntimeError(f"{mode} server did not become ready")
+        # Let every worker finish its warmup before measuring memory
+        time.sleep(args.settle)
+        idle = memory_mb(process_tree(proc.pid))
+
+        load = run_load(
+            base_url, "/chat",
+            make_body=lambda i: {"patient_id": "BENCH", "message": f"What is pleural effusion? ({i})"},
+            requests=args.requests, concurrency=args.concurrency,
+        )
+        loaded = memory_mb(process_tree(proc.pid))
+        return {"mode": mode, "workers": args.workers, "idle": idle, "under_load": loaded, **load}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--settle", type=float, default=10.0, help="Seconds to wait after /ready before measuring")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run_mode("shared", args), run_mode("independent", args)]
+
+    print()
+    for r in results:
+        print(f"--- {r['mode']} ({r['workers']} workers) ---")
+        print(f"   requests/sec      {r['requests_per_sec']}  (ok={r['ok']}, errors={r['errors']})")
+        print(f"   latency p50/p95   {r['p50_ms']} / {r['p95_ms']} ms")
+        print(f"   idle RSS / PSS    {r['idle']['total_rss_mb']} / {r['idle']['total_pss_mb']} MB")
+        print(f"   load RSS / PSS    {r['under_load']['total_rss_mb']} / {r['under_load']['total_pss_mb']} MB")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
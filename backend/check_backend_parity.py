@@ -0,0 +1,123 @@
+"""
+Parity check for inference backends.
+
+Re-embeds a sample of the knowledge base with each backend and reports the
+cosine drift against the fp32 vectors already stored in radiology_memory.
+
+    python check_backend_parity.py --backends torch-int8 onnx onnx-int8 --samples 200
+"""
+import os
+import argparse
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+
+from inference_backends import load_backend, BACKENDS, INFERENCE_BACKEND, MODEL_NAME
+
+load_dotenv()
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
+BATCH_SIZE = 16
+
+
+def resolve_image_path(image_path: str, data_root: Path) -> Path:
+    """Ingested paths are relative to data/ and may use Windows separators"""
+    return data_root / image_path.replace("\\", "/")
+
+
+def fetch_reference_points(client: QdrantClient, limit: int):
+    points, offset = [], None
+    while len(points) < limit:
+        batch, offset = client.scroll(
+            collection_name=KNOWLEDGE_COLLECTION,
+            limit=min(256, limit - len(points)),
+            offset=offset,
+            with_payload=["report_text", "image_path"],
+            with_vectors=True,
+        )
+        points.extend(batch)
+        if offset is None:
+            break
+    return points
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def summarize(cosines: np.ndarray) -> dict:
+    if len(cosines) == 0:
+        return {"n": 0}
+    return {
+        "n": int(len(cosines)),
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "p01_cosine": float(np.percentile(cosines, 1)),
+        "max_drift": float(1.0 - cosines.min()),
+    }
+
+
+def check_backend(name: str, points, data_root: Path) -> dict:
+    backend = load_backend(name, MODEL_NAME)
+
+    # Text tower
+    texts = [p.payload.get("report_text", "") for p in points]
+    new_text = []
+    for i in range(0, len(texts), BATCH_SIZE):
+        new_text.extend(backend.encode_text(texts[i:i + BATCH_SIZE]))
+    ref_text = np.array([p.vector["text_vector"] for p in points], dtype=np.float32)
+    text_cos = cosine_rows(ref_text, np.array(new_text, dtype=np.float32))
+
+    # Image tower (only for images present on this machine)
+    with_images = [p for p in points if resolve_image_path(p.payload.get("image_path", ""), data_root).is_file()]
+    new_images = []
+    for i in range(0, len(with_images), BATCH_SIZE):
+        chunk = with_images[i:i + BATCH_SIZE]
+        images = [Image.open(resolve_image_path(p.payload["image_path"], data_root)) for p in chunk]
+        new_images.extend(backend.encode_images(images))
+    if with_images:
+        ref_images = np.array([p.vector["image_vector"] for p in with_images], dtype=np.float32)
+        image_cos = cosine_rows(ref_images, np.array(new_images, dtype=np.float32))
+    else:
+        image_cos = np.array([], dtype=np.float32)
+
+    return {"text_vector": summarize(text_cos), "image_vector": summarize(image_cos)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=[INFERENCE_BACKEND], choices=list(BACKENDS))
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--data-root", default=str(Path(__file__).resolve().parent.parent / "data"))
+    args = parser.parse_args()
+
+    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60)
+    points = fetch_reference_points(client, args.samples)
+    if not points:
+        print(f"❌ No points found in '{KNOWLEDGE_COLLECTION}'. Run the ingestion script first.")
+        return
+    print(f"📐 Comparing {len(points)} reference points from '{KNOWLEDGE_COLLECTION}'\n")
+
+    for name in args.backends:
+        report = check_backend(name, points, Path(args.data_root))
+        print(f"--- {name} ---")
+        for vector_name, stats in report.items():
+            if not stats["n"]:
+                print(f"   {vector_name:<13} no samples")
+                continue
+            print(
+                f"   {vector_name:<13} n={stats['n']:<5} mean cos={stats['mean_cosine']:.5f}  "
+                f"p01={stats['p01_cosine']:.5f}  min={stats['min_cosine']:.5f}  max drift={stats['max_drift']:.5f}"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
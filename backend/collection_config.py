@@ -0,0 +1,160 @@
+import os
+import time
+import uuid
+from dataclasses import dataclass, replace
+from typing import Optional, Sequence
+
+from qdrant_client.http import models
+
+# --- CONFIGURATION ---
+# none | scalar (int8, 4x smaller) | binary (1 bit per dimension, 32x smaller)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+# Keep the quantized copy in RAM; with quantization the fp32 originals go to disk (mmap)
+QDRANT_QUANTIZED_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZED_ALWAYS_RAM", "true").lower() in ("1", "true", "yes")
+# auto = fp32 originals on disk exactly when quantized, otherwise true / false
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "auto").lower()
+QDRANT_SCALAR_QUANTILE = float(os.getenv("QDRANT_SCALAR_QUANTILE", "0.99"))
+# HNSW graph: more links (m) and a wider build beam (ef_construct) = better recall, more memory / build time
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() in ("1", "true", "yes")
+# Query time: search beam (0 = server default), candidates fetched from the quantized index
+# per requested hit, and whether they are re-ranked with the fp32 originals
+QDRANT_SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "0"))
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() in ("1", "true", "yes")
+# Vectorless collection holding one version marker per collection, bumped by every ingest
+QDRANT_VERSION_COLLECTION = os.getenv("QDRANT_VERSION_COLLECTION", "collection_versions")
+
+VECTOR_SIZE = 512
+VECTOR_NAMES = ("image_vector", "text_vector")
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """Storage and search settings shared by the scan collections (patient_uploads, radiology_memory)"""
+    quantization: str = QDRANT_QUANTIZATION
+    always_ram: bool = QDRANT_QUANTIZED_ALWAYS_RAM
+    vectors_on_disk: Optional[bool] = (None if QDRANT_VECTORS_ON_DISK == "auto"
+                                       else QDRANT_VECTORS_ON_DISK in ("1", "true", "yes"))
+    scalar_quantile: float = QDRANT_SCALAR_QUANTILE
+    hnsw_m: int = QDRANT_HNSW_M
+    hnsw_ef_construct: int = QDRANT_HNSW_EF_CONSTRUCT
+    hnsw_on_disk: bool = QDRANT_HNSW_ON_DISK
+    search_hnsw_ef: int = QDRANT_SEARCH_HNSW_EF
+    oversampling: float = QDRANT_OVERSAMPLING
+    rescore: bool = QDRANT_RESCORE
+
+    def __post_init__(self):
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown QDRANT_QUANTIZATION '{self.quantization}'. "
+                             f"Choose from: {', '.join(QUANTIZATION_MODES)}")
+
+    @property
+    def originals_on_disk(self) -> bool:
+        if self.vectors_on_disk is None:
+            return self.quantization != "none"
+        return self.vectors_on_disk
+
+    def with_options(self, **changes) -> "CollectionProfile":
+        return replace(self, **changes)
+
+    def describe(self) -> str:
+        storage = "fp32 on disk" if self.originals_on_disk else "fp32 in RAM"
+        quantized = "" if self.quantization == "none" else f", {self.quantization} quantized"
+        return f"{storage}{quantized}, HNSW m={self.hnsw_m} ef_construct={self.hnsw_ef_construct}"
+
+    # --- CREATION ---
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=self.scalar_quantile, always_ram=self.always_ram))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=self.always_ram))
+        return None
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct, on_disk=self.hnsw_on_disk)
+
+    def vectors_config(self, vector_names: Sequence[str] = VECTOR_NAMES) -> dict:
+        return {
+            name: models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE,
+                                      on_disk=self.originals_on_disk)
+            for name in vector_names
+        }
+
+    # --- SEARCH ---
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        """Per-query params for query_points / QueryRequest (None = server defaults)"""
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(ignore=False, rescore=self.rescore,
+                                                           oversampling=self.oversampling)
+        if quantization is None and not self.search_hnsw_ef:
+            return None
+        return models.SearchParams(hnsw_ef=self.search_hnsw_ef or None, quantization=quantization)
+
+
+DEFAULT_PROFILE = CollectionProfile()
+SEARCH_PARAMS = DEFAULT_PROFILE.search_params()
+
+
+def create_scan_collection(client, collection_name: str, profile: CollectionProfile = DEFAULT_PROFILE,
+                           vector_names: Sequence[str] = VECTOR_NAMES, **options):
+    """Create a collection of 512-d COSINE named vectors with the profile's storage settings"""
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(vector_names),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+        **options
+    )
+
+
+def update_scan_collection(client, collection_name: str, profile: CollectionProfile = DEFAULT_PROFILE,
+                           vector_names: Sequence[str] = VECTOR_NAMES):
+    """
+    Apply the profile to an existing collection. Qdrant rebuilds the HNSW graph
+    and quantized copies in the background; searches keep working meanwhile.
+    """
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={name: models.VectorParamsDiff(on_disk=profile.originals_on_disk) for name in vector_names},
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config() or models.Disabled.DISABLED,
+    )
+
+
+# --- VERSION MARKERS ---
+
+def _version_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"collection-version/{collection_name}"))
+
+
+def bump_collection_version(client, collection_name: str, version_collection: str = QDRANT_VERSION_COLLECTION) -> str:
+    """
+    Record that collection_name changed. Readers compare the marker instead of
+    scanning the collection, so every writer of a watched collection calls this
+    once it is done (also after a failed run: some points may have changed).
+    """
+    if not client.collection_exists(version_collection):
+        client.create_collection(collection_name=version_collection, vectors_config={})
+    version = uuid.uuid4().hex[:16]
+    client.upsert(collection_name=version_collection, wait=True, points=[models.PointStruct(
+        id=_version_point_id(collection_name), vector={},
+        payload={"collection": collection_name, "version": version, "updated_at": time.time()}
+    )])
+    return version
+
+
+def read_collection_version(client, collection_name: str,
+                            version_collection: str = QDRANT_VERSION_COLLECTION) -> Optional[str]:
+    """The last bumped version of collection_name, or None if it was never bumped"""
+    if not client.collection_exists(version_collection):
+        return None
+    records = client.retrieve(collection_name=version_collection, ids=[_version_point_id(collection_name)],
+                              with_payload=["version"], with_vectors=False)
+    return (records[0].payload or {}).get("version") if records else None
@@ -0,0 +1,162 @@
+import os
+import re
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+# --- CONFIGURATION ---
+# Reference-report tokens per RAG prompt (compare splits it between the two scans)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "512"))
+# Longest share of the budget a single report may take
+CONTEXT_MAX_REPORT_TOKENS = int(os.getenv("CONTEXT_MAX_REPORT_TOKENS", "160"))
+# Reports whose text_vectors are at least this similar to an already packed one are dropped
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+
+# Rough English / clinical-text ratio; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+# Below this many free tokens a trimmed report is not worth adding
+MIN_REPORT_TOKENS = 12
+# Similar-case previews returned to the frontend
+PREVIEW_TOKENS = 50
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text.strip()) if s]
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Longest prefix of whole sentences within max_tokens. A first sentence that
+    is already too long is cut at a word boundary instead.
+    """
+    text = text.strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        # +1 for the joining space
+        cost = estimate_tokens(sentence) + (1 if kept else 0)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+    cut = text[:max(0, max_tokens * CHARS_PER_TOKEN - 1)]
+    cut = cut.rsplit(" ", 1)[0] if " " in cut else cut
+    return f"{cut}…" if cut else ""
+
+
+class PackedContext:
+    """Hits chosen for a prompt, best first, with the (possibly trimmed) text of each"""
+
+    def __init__(self, hits: List, texts: List[str], duplicates: int, truncated: int):
+        self.hits = hits
+        self.texts = texts
+        self.duplicates = duplicates
+        self.truncated = truncated
+
+    @property
+    def tokens(self) -> int:
+        return sum(estimate_tokens(text) for text in self.texts)
+
+    def __iter__(self):
+        return iter(zip(self.hits, self.texts))
+
+    def __len__(self):
+        return len(self.hits)
+
+
+class ContextPacker:
+    """
+    Fills a token budget with knowledge-base reports, greedily by score.
+
+    A report is skipped when its text_vector is within dedup_threshold cosine of
+    a report already packed (ROCOv2 has many near-identical captions) or its
+    normalized text is identical to one. Reports longer than the remaining
+    budget, or than max_report_tokens, are trimmed at sentence boundaries.
+    """
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET, max_report_tokens: int = CONTEXT_MAX_REPORT_TOKENS,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD):
+        self.budget = budget
+        self.max_report_tokens = max_report_tokens
+        self.dedup_threshold = dedup_threshold
+        self._lock = threading.Lock()
+        self.packs = 0
+        self.candidates = 0
+        self.packed = 0
+        self.duplicates = 0
+        self.truncated = 0
+        self.tokens = 0
+
+    def pack(self, hits: Sequence, vectors: Optional[Dict[str, Sequence[float]]] = None,
+             budget: Optional[int] = None,
+             text_of: Callable = lambda hit: (hit.payload or {}).get("report_text", "")) -> PackedContext:
+        """`vectors` maps str(hit.id) to its text_vector; hits without one are only deduplicated by text"""
+        budget = self.budget if budget is None else budget
+        vectors = vectors or {}
+        chosen, texts, seen_texts, seen_vectors = [], [], set(), []
+        duplicates = truncated = used = 0
+
+        for hit in sorted(hits, key=lambda h: h.score, reverse=True):
+            text = (text_of(hit) or "").strip()
+            if not text:
+                continue
+            normalized = normalize_text(text)
+            vector = vectors.get(str(hit.id))
+            if vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            if normalized in seen_texts or (vector is not None and seen_vectors and
+                                            float(np.max(np.stack(seen_vectors) @ vector)) >= self.dedup_threshold):
+                duplicates += 1
+                continue
+
+            remaining = min(budget - used, self.max_report_tokens)
+            if remaining < MIN_REPORT_TOKENS:
+                break
+            packed = trim_to_tokens(text, remaining)
+            if not packed:
+                continue
+            if packed != text:
+                truncated += 1
+            chosen.append(hit)
+            texts.append(packed)
+            seen_texts.add(normalized)
+            if vector is not None:
+                seen_vectors.append(vector)
+            used += estimate_tokens(packed)
+
+        with self._lock:
+            self.packs += 1
+            self.candidates += len(hits)
+            self.packed += len(chosen)
+            self.duplicates += duplicates
+            self.truncated += truncated
+            self.tokens += used
+        return PackedContext(chosen, texts, duplicates, truncated)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget_tokens": self.budget,
+                "max_report_tokens": self.max_report_tokens,
+                "dedup_threshold": self.dedup_threshold,
+                "packs": self.packs,
+                "candidates": self.candidates,
+                "packed": self.packed,
+                "duplicates_dropped": self.duplicates,
+                "truncated": self.truncated,
+                "mean_tokens": round(self.tokens / self.packs, 1) if self.packs else 0.0,
+            }
@@ -0,0 +1,154 @@
+"""
+Read projections for the Qdrant collections.
+
+Every read names the Projection it needs instead of passing
+with_payload=True / with_vectors=True, so Qdrant only serializes (and the
+client only parses) the payload keys and named vectors the caller uses.
+The payload of each collection is described by a TypedDict and every
+projection is checked against it at import, so a misspelled key fails at
+startup instead of silently returning None.
+"""
+from dataclasses import dataclass
+from typing import List, Tuple, TypedDict
+
+VECTOR_NAMES = ("image_vector", "text_vector")
+
+
+# --- PAYLOAD SCHEMAS ---
+
+class KnowledgePayload(TypedDict, total=False):
+    """radiology_memory: one ingested reference case"""
+    patient_id: str
+    scan_date: str
+    modality: str
+    diagnosis: List[str]
+    report_text: str
+    image_path: str
+
+
+class SentencePayload(TypedDict, total=False):
+    """radiology_sentences: one sentence of a radiology_memory report"""
+    parent_id: str
+    position: int
+    sentence: str
+    report_hash: str
+
+
+class UploadPayload(TypedDict, total=False):
+    """patient_uploads: one uploaded scan plus its upload-time RAG context"""
+    patient_id: str
+    status: str
+    scan_id: str
+    scan_type: str
+    filename: str
+    original_filename: str
+    file_path: str
+    upload_timestamp: str
+    upload_date: str
+    upload_date_full: str
+    report_text: str
+    notes: str
+    file_size: int
+    content_type: str
+    has_chat_history: bool
+    analyzed_at: str
+    rag_status: str
+    rag_neighbors: List[dict]
+    rag_kb_version: str
+    rag_updated_at: str
+    rag_error: str
+
+
+class ChatPayload(TypedDict, total=False):
+    """chat_history: the saved conversation of one scan"""
+    chat_id: str
+    patient_id: str
+    scan_id: str
+    messages: List[dict]
+    saved_at: str
+    message_count: int
+
+
+class MedicalHistoryPayload(TypedDict, total=False):
+    """medical_history: a folder or file in a patient's document tree"""
+    patient_id: str
+    item_type: str
+    name: str
+    parent_path: str
+    path: str
+    created_at: str
+    file_type: str
+    mime_type: str
+    size: int
+    storage_filename: str
+    uploaded_at: str
+
+
+@dataclass(frozen=True)
+class Projection:
+    """Payload keys and named vectors one read site needs (empty = none)"""
+    schema: type
+    payload: Tuple[str, ...] = ()
+    vectors: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        unknown = [key for key in self.payload if key not in self.schema.__annotations__]
+        if unknown:
+            raise ValueError(f"{self.schema.__name__} has no payload field(s) {', '.join(unknown)}")
+        unknown = [name for name in self.vectors if name not in VECTOR_NAMES]
+        if unknown:
+            raise ValueError(f"Unknown named vector(s) {', '.join(unknown)}")
+
+    @property
+    def with_payload(self):
+        return list(self.payload) if self.payload else False
+
+    @property
+    def with_vectors(self):
+        return list(self.vectors) if self.vectors else False
+
+    def with_vector(self, name: str) -> "Projection":
+        """Same payload plus one named vector"""
+        return Projection(self.schema, self.payload, (name,))
+
+
+# --- PROJECTIONS PER COLLECTION ---
+
+class Knowledge:
+    # RAG prompts, similar-case lists and stored neighbors only read the report
+    HIT = Projection(KnowledgePayload, ("report_text",))
+    # Near-duplicate detection while packing prompt context
+    DEDUP_VECTOR = Projection(KnowledgePayload, vectors=("text_vector",))
+
+
+class Sentences:
+    # Grouped sentence hits are stitched back into a passage per parent case
+    PASSAGE = Projection(SentencePayload, ("parent_id", "position", "sentence"))
+
+
+class Uploads:
+    # Upload-time enrichment state (also the payload half of a neighbor lookup)
+    RAG_CONTEXT = Projection(UploadPayload, ("rag_status", "rag_neighbors", "rag_kb_version",
+                                             "rag_updated_at", "rag_error"))
+    HISTORY_ROW = Projection(UploadPayload, ("scan_id", "upload_date", "upload_date_full", "scan_type",
+                                             "report_text", "filename", "has_chat_history",
+                                             "upload_timestamp", "rag_status"))
+    FETCH_MATCH = Projection(UploadPayload, ("scan_id", "scan_type", "upload_date", "upload_date_full",
+                                             "report_text", "filename"))
+    COMPARE_SCAN = Projection(UploadPayload, ("scan_id", "filename", "upload_date"))
+    REPORT_SCAN = Projection(UploadPayload, ("patient_id", "upload_date_full"))
+
+
+class ChatHistory:
+    CONVERSATION = Projection(ChatPayload, ("messages", "saved_at"))
+
+
+class MedicalHistory:
+    # Existence checks and counts need no payload at all
+    EXISTS = Projection(MedicalHistoryPayload)
+    LISTING = Projection(MedicalHistoryPayload, ("item_type", "name", "created_at", "file_type",
+                                                 "mime_type", "size", "uploaded_at", "path"))
+    DELETE_TARGET = Projection(MedicalHistoryPayload, ("patient_id", "item_type", "path"))
+    FOLDER_CONTENT = Projection(MedicalHistoryPayload, ("item_type", "path"))
+    RENAME_TARGET = Projection(MedicalHistoryPayload, ("patient_id", "item_type", "parent_path"))
+    DOWNLOAD = Projection(MedicalHistoryPayload, ("patient_id", "item_type", "path", "name", "mime_type"))
@@ -0,0 +1,234 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+# --- CONFIGURATION ---
+TEXT_EMBEDDING_CACHE_SIZE = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", "4096"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Cache key for a text embedding. The BioMedCLIP text tower (PubMedBERT) is
+    uncased, so case and runs of whitespace do not change the vector.
+    """
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded least-recently-used cache with hit/miss counters.
+    With ttl_seconds, entries also expire that long after they were stored.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: Optional[float] = None):
+        self.capacity = max(0, capacity)
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            if key in self._data:
+                expires_at, value = self._data[key]
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._data[key]
+                    self.expirations += 1
+                else:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        if self.capacity == 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class TextEmbeddingCache:
+    """Memoizes 512-d text vectors keyed on normalized text"""
+
+    def __init__(self, capacity: int = TEXT_EMBEDDING_CACHE_SIZE):
+        self._cache = LRUCache(capacity)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        vector = self._cache.get(normalize_text(text))
+        # Hand out a fresh list so callers cannot mutate the cached vector
+        return list(vector) if vector is not None else None
+
+    def put(self, text: str, vector: List[float]):
+        self._cache.put(normalize_text(text), tuple(vector))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# --- PERSISTENT IMAGE EMBEDDING STORE ---
+
+IMAGE_EMBEDDING_STORE_DIR = os.getenv("IMAGE_EMBEDDING_STORE_DIR", "embedding_store")
+EMBEDDING_DIM = 512
+_DIGEST_SIZE = 32
+
+
+def image_digest(image, model_id: str) -> bytes:
+    """SHA-256 over the model identifier and the decoded pixels of an RGB image"""
+    h = hashlib.sha256()
+    h.update(model_id.encode("utf-8"))
+    h.update(f"|{image.mode}|{image.size[0]}x{image.size[1]}|".encode("ascii"))
+    h.update(image.tobytes())
+    return h.digest()
+
+
+class ImageEmbeddingStore:
+    """
+    Append-only, content-addressed store of image vectors shared by all workers.
+
+    Layout in `directory`:
+        vectors.f32  float32 rows of size `dim`, memory-mapped for reads
+        keys.bin     32-byte digests, row i of keys.bin names row i of vectors.f32
+        .lock        flock() target that serializes appends across processes
+
+    Each process keeps a digest -> row dict for O(1) lookups and tails keys.bin
+    to pick up rows appended by other workers.
+    """
+
+    def __init__(self, directory: str = IMAGE_EMBEDDING_STORE_DIR, dim: int = EMBEDDING_DIM):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = self.directory / "vectors.f32"
+        self.keys_path = self.directory / "keys.bin"
+        self.lock_path = self.directory / ".lock"
+        self.vectors_path.touch(exist_ok=True)
+        self.keys_path.touch(exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index = {}
+        self._keys_offset = 0
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+
+        self._refresh()
+
+    def _refresh(self):
+        # Tail keys.bin; rows are always written before their key so every key
+        # we read here already has its vector on disk
+        size = self.keys_path.stat().st_size
+        size -= size % _DIGEST_SIZE
+        if size <= self._keys_offset:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read(size - self._keys_offset)
+        row = self._keys_offset // _DIGEST_SIZE
+        for i in range(0, len(data), _DIGEST_SIZE):
+            self._index.setdefault(data[i:i + _DIGEST_SIZE], row)
+            row += 1
+        self._keys_offset = size
+
+    def _vectors(self, rows_needed: int):
+        if self._matrix is None or self._matrix.shape[0] < rows_needed:
+            rows = self.vectors_path.stat().st_size // (self.dim * 4)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def get(self, digest: bytes) -> Optional[List[float]]:
+        with self._lock:
+            row = self._index.get(digest)
+            if row is None:
+                self._refresh()
+                row = self._index.get(digest)
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._vectors(row + 1)[row].tolist()
+
+    def put(self, digest: bytes, vector: List[float]):
+        data = np.asarray(vector, dtype=np.float32)
+        if data.shape != (self.dim,):
+            raise ValueError(f"Expected a {self.dim}-d vector, got shape {data.shape}")
+
+        with self._lock, open(self.lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if digest in self._index:
+                    return
+                # keys.bin is the source of truth; a vector orphaned by a crash
+                # between the two writes is simply overwritten
+                row = self._keys_offset // _DIGEST_SIZE
+                with open(self.vectors_path, "r+b") as f:
+                    f.seek(row * self.dim * 4)
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.keys_path, "r+b") as f:
+                    f.seek(row * _DIGEST_SIZE)
+                    f.write(digest)
+                self._index[digest] = row
+                self._keys_offset = (row + 1) * _DIGEST_SIZE
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": str(self.directory),
+                "size": len(self._index),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
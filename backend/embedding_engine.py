@@ -0,0 +1,147 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+# --- CONFIGURATION ---
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "16"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    """
+    Collects single-item requests for one model tower into small batches.
+    A worker thread waits for the first item, keeps collecting until either
+    max_batch_size items are queued or max_wait_ms has passed, then runs
+    batch_fn once and resolves every caller's future with its own row.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+        # Metrics
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._batches = 0
+        self._busy_seconds = 0.0
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so restart the worker in a child process
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive() or self._pid != os.getpid():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._worker = threading.Thread(
+                    target=self._run, name=f"embed-{self.name}", daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item and return a future resolved with its result"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Drop requests whose caller already gave up
+            live = [(item, f) for item, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            items = [item for item, _ in live]
+            futures = [f for _, f in live]
+
+            started = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._batches += 1
+                    self._items += len(items)
+                    self._batch_sizes[len(items)] += 1
+                    self._busy_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        """Achieved batch sizes and throughput counters for this tower"""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "busy_seconds": round(self._busy_seconds, 3),
+                "queue_depth": self._queue.qsize(),
+            }
+
+
+class EmbeddingEngine:
+    """
+    Front door for BioMedCLIP inference. Text and image requests are batched
+    independently so each tower runs one forward pass per window.
+
+    text_batch_fn:  List[str]       -> List[List[float]]
+    image_batch_fn: List[PIL.Image] -> List[List[float]]
+    """
+
+    def __init__(self, text_batch_fn: Callable, image_batch_fn: Callable,
+                 max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.text = MicroBatcher("text", text_batch_fn, max_batch_size, max_wait_ms)
+        self.image = MicroBatcher("image", image_batch_fn, max_batch_size, max_wait_ms)
+
+    def encode_text(self, text: str) -> List[float]:
+        """Blocking text embedding (for use from worker threads)"""
+        return self.text.submit(text).result()
+
+    def encode_image(self, image) -> List[float]:
+        """Blocking image embedding (for use from worker threads)"""
+        return self.image.submit(image).result()
+
+    async def aencode_text(self, text: str) -> List[float]:
+        """Await a text embedding without blocking the event loop"""
+        return await asyncio.wrap_future(self.text.submit(text))
+
+    async def aencode_image(self, image) -> List[float]:
+        """Await an image embedding without blocking the event loop"""
+        return await asyncio.wrap_future(self.image.submit(image))
+
+    def stats(self) -> dict:
+        return {"text": self.text.stats(), "image": self.image.stats()}
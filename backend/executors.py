@@ -0,0 +1,52 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+# CPU-bound work (PDF rendering, image hashing) gets a small dedicated pool so
+# it cannot starve the I/O pool; blocking network/disk calls get a larger one.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+
+_lock = threading.Lock()
+_executors = {}
+
+
+def _get_executor(kind: str, max_workers: int) -> ThreadPoolExecutor:
+    # Created lazily (and per process) so forked workers never inherit dead threads
+    key = (kind, os.getpid())
+    executor = _executors.get(key)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=kind)
+                _executors[key] = executor
+    return executor
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-bound callable on the bounded CPU pool and await the result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor("cpu", CPU_WORKERS), functools.partial(fn, *args, **kwargs)
+    )
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O callable (Qdrant, Gemini, disk) on the I/O pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor("io", IO_WORKERS), functools.partial(fn, *args, **kwargs)
+    )
+
+
+def shutdown_executors():
+    """Stop this process's pools (called on application shutdown)"""
+    with _lock:
+        for (kind, pid), executor in list(_executors.items()):
+            if pid == os.getpid():
+                executor.shutdown(wait=False, cancel_futures=True)
+                del _executors[(kind, pid)]
@@ -0,0 +1,282 @@
+import os
+import re
+import time
+import threading
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# torch / open_clip / onnxruntime are imported inside the tower builders so that
+# importing this module (and therefore the API) stays cheap.
+
+# --- CONFIGURATION ---
+MODEL_NAME = os.getenv("MODEL_NAME", "hf-hub:microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_EXPORT_DIR = os.getenv("INFERENCE_EXPORT_DIR", "model_exports")
+ONNX_OPSET = 17
+# Keep the other half of the checkpoint after building one tower, so the second
+# tower does not read and build the full model again (false = free it at once)
+INFERENCE_KEEP_SPARE_TOWER = os.getenv("INFERENCE_KEEP_SPARE_TOWER", "true").lower() in ("1", "true", "yes")
+
+TOWERS = ("image", "text")
+
+
+def load_biomedclip(model_name: str) -> dict:
+    """
+    Read the BioMedCLIP checkpoint once, in eval mode, and split it into
+    {tower: (module, prepare)}, where prepare is the image transform or the
+    tokenizer. The CLIP wrapper itself is not kept.
+    """
+    import open_clip
+
+    print(f"🏥 Loading {model_name}...")
+    model, _, preprocess = open_clip.create_model_and_transforms(model_name)
+    model.eval()
+    return {"image": (model.visual, preprocess), "text": (model.text, open_clip.get_tokenizer(model_name))}
+
+
+def _l2_normalize(features: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(features, axis=-1, keepdims=True)
+    return features / np.maximum(norms, 1e-12)
+
+
+def _export_dir(model_name: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", model_name).strip("_")
+    path = Path(INFERENCE_EXPORT_DIR) / slug
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _dummy_image():
+    from PIL import Image
+    return Image.new("RGB", (224, 224))
+
+
+class InferenceBackend:
+    """
+    Runs the BioMedCLIP image and text towers. Each tower is built lazily on
+    first use (or by warmup) and independently of the other, so a worker only
+    pays for the towers it actually calls. Subclasses swap the runtime graph;
+    inputs (PIL images / raw strings) and outputs (L2-normalized 512-d lists)
+    are identical across backends.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        self.model_name = model_name
+        self._towers = {}
+        self._locks = {tower: threading.Lock() for tower in TOWERS}
+        self._checkpoint_lock = threading.Lock()
+        # Tower modules split off a checkpoint load but not built yet
+        self._spare = {}
+        self.load_seconds = {}
+
+    def _build_tower(self, tower: str) -> Tuple[Callable, Callable]:
+        """Return (prepare, run): prepare maps raw inputs to a batch, run maps it to features"""
+        raise NotImplementedError
+
+    def _load_biomedclip(self, tower: str):
+        """
+        (module, prepare) of one tower. The checkpoint is read at most once per
+        backend: the other tower's half is kept until its own build takes it
+        (unless INFERENCE_KEEP_SPARE_TOWER is off or that tower already exists).
+        """
+        with self._checkpoint_lock:
+            spare = self._spare.pop(tower, None)
+            if spare is not None:
+                return spare
+            towers = load_biomedclip(self.model_name)
+            if INFERENCE_KEEP_SPARE_TOWER:
+                for other, part in towers.items():
+                    if other != tower and not self.is_loaded(other):
+                        self._spare[other] = part
+            return towers[tower]
+
+    def _tower(self, tower: str):
+        runner = self._towers.get(tower)
+        if runner is None:
+            with self._locks[tower]:
+                runner = self._towers.get(tower)
+                if runner is None:
+                    started = time.perf_counter()
+                    runner = self._build_tower(tower)
+                    self.load_seconds[tower] = round(time.perf_counter() - started, 2)
+                    self._towers[tower] = runner
+                    print(f"✅ {self.name} {tower} tower ready in {self.load_seconds[tower]:.1f}s")
+        return runner
+
+    def is_loaded(self, tower: str) -> bool:
+        return tower in self._towers
+
+    def warmup(self, towers=TOWERS):
+        """Build the given towers now instead of on first request"""
+        for tower in towers:
+            self._tower(tower)
+
+    def encode_images(self, images) -> List[List[float]]:
+        """Embed a batch of PIL images"""
+        prepare, run = self._tower("image")
+        return _l2_normalize(run(prepare(images))).tolist()
+
+    def encode_text(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of strings"""
+        prepare, run = self._tower("text")
+        return _l2_normalize(run(prepare(texts))).tolist()
+
+    def preprocess_image(self, image):
+        """
+        Per-image preprocessing (thread-safe), for pipelines that prepare inputs
+        on worker threads. Pass the results to encode_preprocessed_images.
+        """
+        prepare, _ = self._tower("image")
+        return prepare([image])
+
+    def encode_preprocessed_images(self, prepared: list) -> List[List[float]]:
+        """Embed a batch of outputs of preprocess_image in one forward pass"""
+        _, run = self._tower("image")
+        if isinstance(prepared[0], np.ndarray):
+            batch = np.concatenate(prepared)
+        else:
+            import torch
+            batch = torch.cat(prepared)
+        return _l2_normalize(run(batch)).tolist()
+
+    def _torch_inputs(self, tower: str, extra):
+        import torch
+        if tower == "image":
+            return lambda images: torch.stack([extra(image) for image in images])
+        return lambda texts: extra(texts)
+
+
+class TorchBackend(InferenceBackend):
+    """Eager fp32 PyTorch (the reference implementation)"""
+
+    name = "torch"
+
+    def _load_module(self, tower: str):
+        return self._load_biomedclip(tower)
+
+    def _build_tower(self, tower):
+        import torch
+        module, extra = self._load_module(tower)
+
+        def run(batch):
+            with torch.inference_mode():
+                return module(batch).float().numpy()
+
+        return self._torch_inputs(tower, extra), run
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """Eager PyTorch with every nn.Linear dynamically quantized to int8"""
+
+    name = "torch-int8"
+
+    def _load_module(self, tower):
+        import torch
+        module, extra = self._load_biomedclip(tower)
+        return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8), extra
+
+
+class TorchScriptBackend(InferenceBackend):
+    """Traced, frozen TorchScript graph per tower, cached under INFERENCE_EXPORT_DIR"""
+
+    name = "torchscript"
+
+    def _build_tower(self, tower):
+        import torch
+        module, extra = self._load_biomedclip(tower)
+        prepare = self._torch_inputs(tower, extra)
+        example = prepare([_dummy_image()] if tower == "image" else ["chest radiograph"])
+
+        path = _export_dir(self.model_name) / f"{'visual' if tower == 'image' else 'text'}.torchscript.pt"
+        if not path.exists():
+            print(f"🔧 Tracing {path.name}...")
+            with torch.inference_mode():
+                traced = torch.jit.trace(module, example, check_trace=False)
+            torch.jit.save(traced, str(path))
+        # The traced graph holds its own copy of the weights
+        del module
+        graph = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.load(str(path)).eval()))
+
+        def run(batch):
+            with torch.inference_mode():
+                return graph(batch).float().numpy()
+
+        return prepare, run
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime (CPU) graph per tower, optionally int8 dynamic-quantized"""
+
+    name = "onnx"
+    quantize = False
+
+    def _build_tower(self, tower):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(f"INFERENCE_BACKEND={self.name} could not import onnxruntime (listed in requirements.txt): {e}") from e
+
+        module, extra = self._load_biomedclip(tower)
+        torch_prepare = self._torch_inputs(tower, extra)
+        input_name = "pixel_values" if tower == "image" else "input_ids"
+        stem = "visual" if tower == "image" else "text"
+        example = torch_prepare([_dummy_image()] if tower == "image" else ["chest radiograph"])
+
+        path = self._export(_export_dir(self.model_name), stem, module, example, input_name)
+        del module
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+        if tower == "image":
+            prepare = lambda images: torch_prepare(images).numpy()
+        else:
+            prepare = lambda texts: torch_prepare(texts).numpy().astype(np.int64)
+        run = lambda batch: session.run(None, {input_name: batch})[0]
+        return prepare, run
+
+    def _export(self, export_dir: Path, stem: str, module, example, input_name: str) -> Path:
+        import torch
+
+        fp32_path = export_dir / f"{stem}.onnx"
+        if not fp32_path.exists():
+            print(f"🔧 Exporting {fp32_path.name}...")
+            with torch.inference_mode():
+                torch.onnx.export(
+                    module, example, str(fp32_path),
+                    input_names=[input_name], output_names=["embeddings"],
+                    dynamic_axes={input_name: {0: "batch"}, "embeddings": {0: "batch"}},
+                    opset_version=ONNX_OPSET,
+                )
+        if not self.quantize:
+            return fp32_path
+
+        int8_path = export_dir / f"{stem}.int8.onnx"
+        if not int8_path.exists():
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            print(f"🔧 Quantizing {int8_path.name}...")
+            quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        return int8_path
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    name = "onnx-int8"
+    quantize = True
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TorchBackend, QuantizedTorchBackend, TorchScriptBackend, OnnxBackend, QuantizedOnnxBackend)
+}
+
+
+def load_backend(name: str = INFERENCE_BACKEND, model_name: str = MODEL_NAME) -> InferenceBackend:
+    """Create the inference backend selected by INFERENCE_BACKEND (towers load on first use)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_name)
@@ -0,0 +1,241 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client.http import models
+
+from collection_config import read_collection_version
+
+# --- CONFIGURATION ---
+KNOWLEDGE_INDEX_ENABLED = os.getenv("KNOWLEDGE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+# Above this many points the knowledge base is searched in Qdrant instead
+KNOWLEDGE_INDEX_MAX_POINTS = int(os.getenv("KNOWLEDGE_INDEX_MAX_POINTS", "100000"))
+# float16 halves memory at a small precision cost (scores are computed in float32)
+KNOWLEDGE_INDEX_DTYPE = os.getenv("KNOWLEDGE_INDEX_DTYPE", "float32")
+# How often the collection's version marker (written by ingest) is checked for changes
+KNOWLEDGE_INDEX_REFRESH_SECONDS = float(os.getenv("KNOWLEDGE_INDEX_REFRESH_SECONDS", "60"))
+
+VECTOR_NAMES = ("image_vector", "text_vector")
+SCROLL_BATCH = 1024
+# float16 matrices are upcast in blocks of this many rows for the matmul
+FLOAT16_BLOCK_ROWS = 8192
+
+
+class _Snapshot:
+    """Immutable view of the collection; replaced wholesale on refresh"""
+
+    def __init__(self, ids, payloads, matrices, version):
+        self.ids = ids
+        self.rows = {str(point_id): row for row, point_id in enumerate(ids)}
+        self.payloads = payloads
+        self.matrices = matrices
+        self.version = version
+
+
+class KnowledgeIndex:
+    """
+    Exact cosine top-k over the knowledge collection, held in process.
+
+    Every named vector is kept as one contiguous row-normalized matrix, so a
+    search is a single matmul plus argpartition and a batch of queries costs
+    one matrix-matrix product. Results are qdrant ScoredPoints, identical in
+    shape to query_points(...).points. When the index is not loaded (disabled,
+    still loading, or collection larger than max_points) `ready` is False and
+    callers should query Qdrant.
+
+    collection_version (the ingest version marker plus the point count) is
+    tracked even when the vectors are not held in memory, so caches of
+    knowledge-base results can key on it. Checking it never scans the
+    collection; only a reload does.
+    """
+
+    def __init__(self, client, collection_name: str, max_points: int = KNOWLEDGE_INDEX_MAX_POINTS,
+                 dtype: str = KNOWLEDGE_INDEX_DTYPE, enabled: bool = KNOWLEDGE_INDEX_ENABLED,
+                 payload_fields: Optional[Sequence[str]] = None):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"KNOWLEDGE_INDEX_DTYPE must be float32 or float16, got '{dtype}'")
+        self.client = client
+        self.collection_name = collection_name
+        self.max_points = max_points
+        self.dtype = np.dtype(dtype)
+        self.enabled = enabled
+        # Only these payload keys are kept in memory (None keeps the whole payload)
+        self.payload_fields = list(payload_fields) if payload_fields is not None else None
+        self.collection_version: Optional[str] = None
+        self._snapshot: Optional[_Snapshot] = None
+        self._warned_unversioned = False
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.status = "not loaded" if enabled else "disabled"
+        self.loaded_at = None
+        self.load_seconds = None
+        self.searches = 0
+        self.queries = 0
+        self.search_seconds = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        """collection_version of the loaded contents (None when not loaded)"""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    # --- LOADING ---
+
+    def _collection_version(self, count: int) -> str:
+        """
+        Ingest's version marker plus the point count: two point lookups, however
+        large the collection. Collections written without a marker fall back to
+        the count alone, which misses edits that keep it unchanged.
+        """
+        marker = read_collection_version(self.client, self.collection_name)
+        if marker is None:
+            if not self._warned_unversioned:
+                print(f"⚠️ {self.collection_name} has no version marker; only point-count changes trigger a "
+                      f"reload until it is re-ingested")
+                self._warned_unversioned = True
+            return f"count-{count}"
+        return f"{marker}-{count}"
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Re-read the collection version and reload if it changed (blocking; run
+        via run_io). Returns True when the collection version changed.
+        """
+        with self._refresh_lock:
+            if not self.client.collection_exists(self.collection_name):
+                self.status = "collection missing"
+                self._snapshot = None
+                changed = self.collection_version is not None
+                self.collection_version = None
+                return changed
+            count = self.client.count(self.collection_name, exact=True).count
+            version = self._collection_version(count)
+            changed = version != self.collection_version
+            self.collection_version = version
+
+            if not self.enabled:
+                return changed
+            if count > self.max_points:
+                if self._snapshot is not None or self.status != "too large":
+                    print(f"⚠️ {self.collection_name} has {count} points (> {self.max_points}); searching in Qdrant")
+                self.status = "too large"
+                self._snapshot = None
+                return changed
+
+            if not force and self._snapshot is not None and self._snapshot.version == version:
+                return changed
+
+            started = time.perf_counter()
+            self._snapshot = self._load(count, version)
+            self.load_seconds = round(time.perf_counter() - started, 2)
+            self.loaded_at = time.time()
+            self.status = "loaded"
+            print(f"✅ Knowledge index: {len(self._snapshot.ids)} points loaded in {self.load_seconds:.1f}s "
+                  f"({self.dtype.name}, version {version})")
+            return changed
+
+    def _load(self, count: int, version: str) -> _Snapshot:
+        ids, payloads = [], []
+        vectors = {name: [] for name in VECTOR_NAMES}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name, limit=SCROLL_BATCH, offset=offset,
+                with_payload=self.payload_fields if self.payload_fields is not None else True,
+                with_vectors=list(VECTOR_NAMES),
+            )
+            for point in points:
+                if not point.vector or any(name not in point.vector for name in VECTOR_NAMES):
+                    continue
+                ids.append(point.id)
+                payloads.append(point.payload or {})
+                for name in VECTOR_NAMES:
+                    vectors[name].append(point.vector[name])
+            if offset is None:
+                break
+
+        matrices = {}
+        for name, rows in vectors.items():
+            matrix = np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+            # Qdrant stores COSINE vectors normalized already; renormalize defensively
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            matrices[name] = np.ascontiguousarray(matrix, dtype=self.dtype)
+        return _Snapshot(ids, payloads, matrices, version)
+
+    # --- SEARCH ---
+
+    def _scores(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """(n_points, n_queries) cosine similarities"""
+        if matrix.dtype == np.float32:
+            return matrix @ queries.T
+        return np.concatenate([
+            matrix[start:start + FLOAT16_BLOCK_ROWS].astype(np.float32) @ queries.T
+            for start in range(0, len(matrix), FLOAT16_BLOCK_ROWS)
+        ])
+
+    def search_batch(self, using: str, queries, limit: int) -> List[List[models.ScoredPoint]]:
+        """Top-`limit` hits for each query vector, best first"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Knowledge index is not loaded")
+        started = time.perf_counter()
+
+        matrix = snapshot.matrices[using]
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, matrix.shape[1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        scores = self._scores(matrix, queries)
+
+        k = min(limit, len(snapshot.ids))
+        results = []
+        for column in range(queries.shape[0]):
+            column_scores = scores[:, column]
+            if k == 0:
+                results.append([])
+                continue
+            top = np.argpartition(-column_scores, k - 1)[:k]
+            top = top[np.argsort(-column_scores[top])]
+            results.append([
+                models.ScoredPoint(id=snapshot.ids[row], version=0, score=float(column_scores[row]),
+                                   payload=snapshot.payloads[row])
+                for row in top
+            ])
+
+        with self._stats_lock:
+            self.searches += 1
+            self.queries += queries.shape[0]
+            self.search_seconds += time.perf_counter() - started
+        return results
+
+    def search(self, using: str, query, limit: int) -> List[models.ScoredPoint]:
+        return self.search_batch(using, [query], limit)[0]
+
+    def vectors(self, using: str, ids) -> Dict[str, np.ndarray]:
+        """Normalized `using` vectors of the given point ids that are in the index, keyed by str(id)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {}
+        matrix = snapshot.matrices[using]
+        rows = {str(point_id): snapshot.rows.get(str(point_id)) for point_id in ids}
+        return {point_id: matrix[row].astype(np.float32) for point_id, row in rows.items() if row is not None}
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        with self._stats_lock:
+            return {
+                "status": self.status,
+                "points": len(snapshot.ids) if snapshot else 0,
+                "dtype": self.dtype.name,
+                "version": snapshot.version if snapshot else None,
+                "collection_version": self.collection_version,
+                "memory_mb": round(sum(m.nbytes for m in snapshot.matrices.values()) / 2**20, 1) if snapshot else 0.0,
+                "load_seconds": self.load_seconds,
+                "searches": self.searches,
+                "queries": self.queries,
+                "mean_search_ms": round(self.search_seconds * 1000 / self.searches, 3) if self.searches else 0.0,
+            }
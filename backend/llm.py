@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, Iterator
+
+from executors import run_io
+
+# --- CONFIGURATION ---
+# gemini | fake (local streaming stand-in for benchmarks and tests, no API key needed)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Fake model timing: delay before the first token, then per token
+FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "300"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "15"))
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "120"))
+
+_DONE = object()
+
+
+class LLMBackend:
+    """
+    Text generation behind the RAG endpoints. Subclasses implement the
+    blocking generate() / stream(); the async variants run them on the I/O
+    pool so the event loop never waits on the model.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the model behind the answers (part of the response cache key)"""
+        return self.name
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        return await run_io(self.generate, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Chunks of the answer as the model produces them"""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for chunk in self.stream(prompt):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, _DONE)
+
+        producer = asyncio.ensure_future(run_io(produce))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is _DONE:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+            await producer
+        finally:
+            # Client went away or the stream failed: stop pulling from the model
+            cancelled.set()
+
+
+class GeminiLLM(LLMBackend):
+    """Google Gemini; the SDK is imported and configured on first use"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, model_name: str = GEMINI_MODEL):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model_name}"
+
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str) -> str:
+        return self.model().generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model().generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeStreamingLLM(LLMBackend):
+    """
+    Deterministic local model: a fixed-length markdown answer derived from the
+    prompt, streamed word by word with configurable latency.
+    """
+
+    name = "fake"
+
+    def __init__(self, first_token_ms: float = FAKE_LLM_FIRST_TOKEN_MS, token_ms: float = FAKE_LLM_TOKEN_MS,
+                 tokens: int = FAKE_LLM_TOKENS):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+
+    def _words(self, prompt: str):
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        header = ["### ", "Observations\n\n", f"Reference {digest}: "]
+        filler = "no acute cardiopulmonary abnormality is identified on this synthetic response".split()
+        body = [f"{filler[i % len(filler)]} " for i in range(max(0, self.tokens - len(header)))]
+        return header + body
+
+    def generate(self, prompt: str) -> str:
+        time.sleep((self.first_token_ms + self.token_ms * self.tokens) / 1000)
+        return "".join(self._words(prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        time.sleep(self.first_token_ms / 1000)
+        for word in self._words(prompt):
+            yield word
+            time.sleep(self.token_ms / 1000)
+
+    async def agenerate(self, prompt: str) -> str:
+        await asyncio.sleep((self.first_token_ms + self.token_ms * self.tokens) / 1000)
+        return "".join(self._words(prompt))
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        # Native coroutine timing: no I/O thread per stream
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for word in self._words(prompt):
+            yield word
+            await asyncio.sleep(self.token_ms / 1000)
+
+
+LLM_BACKENDS = {
+    "gemini": GeminiLLM,
+    "fake": FakeStreamingLLM,
+}
+
+
+def load_llm(name: str = LLM_BACKEND) -> LLMBackend:
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{name}'. Choose from: {', '.join(LLM_BACKENDS)}")
+    return LLM_BACKENDS[name]()
@@ -0,0 +1,93 @@
+"""Minimal closed-loop HTTP load generator shared by the benchmark scripts (stdlib only)"""
+import json
+import math
+import time
+import threading
+import http.client
+from urllib.parse import urlparse
+from typing import Callable, Optional
+
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile of a list of numbers (q in 0..100)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def run_load(base_url: str, path: str, make_body: Optional[Callable[[int], dict]] = None,
+             requests: int = 200, concurrency: int = 8, method: str = "POST",
+             timeout: float = 120.0) -> dict:
+    """
+    Fire `requests` calls at base_url + path from `concurrency` keep-alive
+    connections. make_body(i) returns the JSON body for request i.
+    Returns throughput and latency percentiles in milliseconds.
+    """
+    url = urlparse(base_url)
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            body = json.dumps(make_body(i)).encode() if make_body else None
+            headers = {"Content-Type": "application/json"} if body else {}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if response.status >= 400:
+                        errors.append(response.status)
+                    else:
+                        latencies.append(elapsed)
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "requests_per_sec": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def wait_until_ready(base_url: str, path: str = "/ready", timeout: float = 600.0) -> bool:
+    """Poll a readiness endpoint until it returns 200"""
+    url = urlparse(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
@@ -1,14 +1,12 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import os
 import shutil
 from pathlib import Path
-import torch
-import open_clip
 from PIL import Image
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
@@ -16,125 +14,31 @@ from dotenv import load_dotenv
 from datetime import datetime
 import uuid
 import json
-import google.generativeai as genai
-from fpdf import FPDF, XPos, YPos
 import re
+import time
+import asyncio
 
-# Helper for PDF character safety
-def clean_text_for_pdf(text: str):
-    """
-    Sanitizes text for FPDF (Standard 14 Fonts).
-    Replaces common Unicode characters with ASCII equivalents to prevent crashes.
-    """
-    replacements = {
-        "•": "-",       # Bullet to hyphen
-        "“": '"',       # Smart quotes to straight
-        "”": '"',
-        "‘": "'",       # Smart apostrophe
-        "’": "'",
-        "—": "-",       # Em dash
-        "–": "-",       # En dash
-        "…": "...",     # Ellipsis
-        "\u200b": "",   # Zero-width space
-    }
-    for char, repl in replacements.items():
-        text = text.replace(char, repl)
-
-    # Encode to Latin-1 and replace incompatible chars with '?'
-    return text.encode('latin-1', 'replace').decode('latin-1')
-class ModernPDFReport(FPDF):
-    def header(self):
-        # --- Medical Letterhead ---
-        self.set_font("Helvetica", 'B', 22)
-        # Title
-        self.cell(0, 10, "RADIOLOGY DIAGNOSTIC REPORT", align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        
-        # Subtitle / Hospital Info
-        self.set_font("Helvetica", 'I', 10)
-        self.set_text_color(100, 100, 100) # Dark Gray
-        
-        # FIXED: Changed "•" to "|" to prevent encoding error
-        contact_info = "Advanced Diagnostics | Radiology Expert"
-        self.cell(0, 6, contact_info, align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        
-        # Horizontal Line
-        self.set_draw_color(0, 0, 0)
-        self.set_line_width(0.5)
-        self.line(10, 28, 200, 28)
-        self.ln(10) # Spacer
-
-    def footer(self):
-        # Position at 1.5 cm from bottom
-        self.set_y(-15)
-        self.set_font("Helvetica", 'I', 8)
-        self.set_text_color(128, 128, 128) # Gray
-        # Page number and Disclaimer
-        self.cell(0, 10, f'Page {self.page_no()} | CONFIDENTIAL MEDICAL RECORD | Electronically Generated by AI', align='C')
-
-    def add_patient_section(self, patient_id, scan_id, date, confidence):
-        """Creates a professional box for patient demographics"""
-        # Ensure inputs are safe
-        patient_id = clean_text_for_pdf(str(patient_id))
-        scan_id = clean_text_for_pdf(str(scan_id))
-        date = clean_text_for_pdf(str(date))
-
-        self.set_fill_color(245, 245, 245) # Very light gray background
-        self.set_text_color(0, 0, 0)
-        self.set_font("Helvetica", 'B', 10)
-        
-        # Header bar for demographics
-        self.cell(0, 8, "  PATIENT DEMOGRAPHICS & EXAM DETAILS", 0, 1, 'L', True)
-        
-        self.set_font("Helvetica", '', 10)
-        self.ln(2)
-        
-        # Grid Layout for details
-        # Row 1
-        self.set_font("Helvetica", 'B', 10)
-        self.cell(35, 6, "Patient ID:", 0, 0)
-        self.set_font("Helvetica", '', 10)
-        self.cell(60, 6, patient_id, 0, 0)
-        
-        self.set_font("Helvetica", 'B', 10)
-        self.cell(35, 6, "Exam Date:", 0, 0)
-        self.set_font("Helvetica", '', 10)
-        self.cell(0, 6, date, 0, 1)
-
-        # Row 2
-        self.set_font("Helvetica", 'B', 10)
-        self.cell(35, 6, "Scan ID:", 0, 0)
-        self.set_font("Helvetica", '', 10)
-        self.cell(60, 6, scan_id, 0, 0)
-        
-        self.set_font("Helvetica", 'B', 10)
-        self.cell(35, 6, "AI Confidence:", 0, 0)
-        self.set_font("Helvetica", '', 10)
-        self.cell(0, 6, f"{confidence:.2%}", 0, 1)
-        
-        # Bottom spacer line
-        self.set_draw_color(200, 200, 200)
-        self.line(10, self.get_y()+2, 200, self.get_y()+2)
-        self.ln(8)
-
-    def add_medical_section(self, title, body_text):
-        """Adds a standardized section with a bold uppercase title"""
-        # Clean inputs
-        title = clean_text_for_pdf(title)
-        body_text = clean_text_for_pdf(body_text)
-
-        # Section Title
-        self.set_font("Helvetica", 'B', 12)
-        self.set_text_color(0, 51, 102) # Dark Blue for headers
-        self.cell(0, 8, title.upper(), 0, 1, 'L')
-        
-        # Section Body
-        self.set_font("Helvetica", '', 11)
-        self.set_text_color(0, 0, 0) # Back to black
-        self.multi_cell(0, 6, body_text)
-        self.ln(4) # Space between sections
-# Load environment variables
+# Load environment variables (before local modules read their configuration)
 load_dotenv()
 
+# Heavy dependencies (torch, open_clip, google.generativeai, fpdf) are imported
+# lazily on first use so the API starts accepting connections immediately.
+from embedding_engine import EmbeddingEngine
+from inference_backends import load_backend, MODEL_NAME, INFERENCE_BACKEND, TOWERS
+from executors import run_cpu, run_io, shutdown_executors
+from embedding_cache import TextEmbeddingCache, ImageEmbeddingStore, image_digest
+from knowledge_index import KnowledgeIndex, KNOWLEDGE_INDEX_REFRESH_SECONDS
+from neighbor_cache import NeighborCache
+from query_planner import QueryPlanner, planner_stats
+from data_access import Knowledge, Sentences, Uploads, ChatHistory, MedicalHistory
+from qdrant_pool import QdrantPool
+from collection_config import create_scan_collection, DEFAULT_PROFILE, SEARCH_PARAMS
+from llm import load_llm, LLM_BACKEND
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from context_packer import ContextPacker, PackedContext, trim_to_tokens, PREVIEW_TOKENS
+from sentence_index import SENTENCE_COLLECTION, SENTENCE_RETRIEVAL_ENABLED, SENTENCE_GROUP_SIZE, passages_from_groups
+
 app = FastAPI(title="Radiology RAG API")
 
 # CORS middleware
@@ -152,23 +56,31 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Configure Gemini
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    llm_model = genai.GenerativeModel('gemini-2.5-flash')
-else:
-    llm_model = None
+
+# Towers to load in the background at startup, e.g. "text,image" (default: load on first use)
+WARMUP_TOWERS = [t.strip() for t in os.getenv("WARMUP_TOWERS", "").split(",") if t.strip()]
+for _tower in WARMUP_TOWERS:
+    if _tower not in TOWERS:
+        raise ValueError(f"Unknown tower '{_tower}' in WARMUP_TOWERS. Choose from: {', '.join(TOWERS)}")
+
+# LLM backend chosen by LLM_BACKEND (Gemini by default; its SDK is imported on first use)
+llm = load_llm(LLM_BACKEND)
+
+if not llm.available:
     print("⚠️ Warning: GEMINI_API_KEY not set. LLM features will be limited.")
 
+# Finished answers, keyed on prompt template version + normalized query + knowledge point ids
+llm_cache = ResponseCache(llm.model_id)
+
 # --- COLLECTION STRATEGY ---
 KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
 USER_COLLECTION = os.getenv("QDRANT_USER_COLLECTION", "patient_uploads")
 CHAT_COLLECTION = "chat_history"
 
-# Initialize Qdrant client
+# Blocking client for collection setup and the knowledge index loader (worker threads)
 qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60)
+# Pooled async client for request handlers; opened on startup, closed on shutdown
+qdrant = QdrantPool(QDRANT_URL, QDRANT_API_KEY)
 
 # Ensure collections exist and have required indexes
 def ensure_collections():
@@ -176,14 +88,9 @@ def ensure_collections():
     try:
         # User uploads collection
         if not qdrant_client.collection_exists(USER_COLLECTION):
-            qdrant_client.create_collection(
-                collection_name=USER_COLLECTION,
-                vectors_config={
-                    "image_vector": models.VectorParams(size=512, distance=models.Distance.COSINE),
-                    "text_vector": models.VectorParams(size=512, distance=models.Distance.COSINE),
-                }
-            )
-            print(f"✅ Created collection: {USER_COLLECTION}")
+            # Quantization / on-disk originals / HNSW settings come from QDRANT_* (collection_config.py)
+            create_scan_collection(qdrant_client, USER_COLLECTION)
+            print(f"✅ Created collection: {USER_COLLECTION} ({DEFAULT_PROFILE.describe()})")
         
         # Create payload indexes for patient_uploads collection
         try:
@@ -245,14 +152,15 @@ def ensure_collections():
     except Exception as e:
         print(f"⚠️ Collection setup warning: {e}")
 
-ensure_collections()
+# BioMedCLIP towers are loaded lazily and independently of each other
+# Runtime (fp32 torch, int8, TorchScript, ONNX) is chosen by INFERENCE_BACKEND
+inference_backend = load_backend(INFERENCE_BACKEND, MODEL_NAME)
 
-# Load BioMedCLIP model
-print("🏥 Loading Microsoft BioMedCLIP...")
-model, _, preprocess = open_clip.create_model_and_transforms(
-    'hf-hub:microsoft/BioMedCLIP-PubMedBERT_256-vit_base_patch16_224'
-)
-tokenizer = open_clip.get_tokenizer('hf-hub:microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224')
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the Qdrant connections and worker pools on shutdown"""
+    await qdrant.close()
+    shutdown_executors()
 
 # Mount uploads folder for serving images
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -282,21 +190,284 @@ class GetChatHistoryRequest(BaseModel):
 
 # --- HELPER FUNCTIONS ---
 
-def get_text_embedding(text: str):
-    """Generate text embedding using BioMedCLIP"""
-    text_tokens = tokenizer([text])
-    with torch.no_grad():
-        txt_features = model.encode_text(text_tokens)
-        txt_features /= txt_features.norm(dim=-1, keepdim=True)
-    return txt_features.squeeze().tolist()
-
-def get_image_embedding(image_path: str):
-    """Generate image embedding using BioMedCLIP"""
-    image = preprocess(Image.open(image_path)).unsqueeze(0)
-    with torch.no_grad():
-        img_features = model.encode_image(image)
-        img_features /= img_features.norm(dim=-1, keepdim=True)
-    return img_features.squeeze().tolist()
+def save_upload_file(file: UploadFile, destination: Path):
+    """Stream an uploaded file to disk (blocking; run via run_io)"""
+    file.file.seek(0)
+    with open(destination, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+# Concurrent requests are coalesced into one forward pass per tower
+embedding_engine = EmbeddingEngine(inference_backend.encode_text, inference_backend.encode_images)
+
+# Folder names, placeholder captions and repeat chat questions recur constantly
+text_embedding_cache = TextEmbeddingCache()
+
+async def get_text_embedding(text: str):
+    """Generate text embedding using BioMedCLIP (memoized on normalized text)"""
+    cached = text_embedding_cache.get(text)
+    if cached is not None:
+        return cached
+    vector = await embedding_engine.aencode_text(text)
+    text_embedding_cache.put(text, vector)
+    return vector
+
+# Vectors for already-seen images persist across restarts and are shared by workers
+image_embedding_store = ImageEmbeddingStore()
+
+def load_image_for_embedding(image_path: str):
+    """Decode an image to RGB and compute its content address (CPU-bound)"""
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+    # The runtime is part of the key: torch, int8 and ONNX vectors differ slightly
+    return image, image_digest(image, f"{inference_backend.name}|{inference_backend.model_name}")
+
+async def get_image_embedding(image_path: str):
+    """Generate image embedding using BioMedCLIP (reused if the pixels were seen before)"""
+    image, digest = await run_cpu(load_image_for_embedding, image_path)
+    cached = await run_io(image_embedding_store.get, digest)
+    if cached is not None:
+        return cached
+    vector = await embedding_engine.aencode_image(image)
+    await run_io(image_embedding_store.put, digest, vector)
+    return vector
+
+# The knowledge base is small enough to search in process (exact cosine, one matmul)
+knowledge_index = KnowledgeIndex(qdrant_client, KNOWLEDGE_COLLECTION, payload_fields=Knowledge.HIT.payload)
+
+async def search_knowledge(vector, using: str, limit: int):
+    """Top-k knowledge-base hits: in-process index when loaded, Qdrant otherwise"""
+    if knowledge_index.ready:
+        return await run_cpu(knowledge_index.search, using, vector, limit)
+    return (await qdrant.query_points(
+        collection_name=KNOWLEDGE_COLLECTION,
+        query=vector,
+        using=using,
+        limit=limit,
+        search_params=SEARCH_PARAMS,
+        with_payload=Knowledge.HIT.with_payload
+    )).points
+
+async def search_knowledge_batch(vectors, using: str, limit: int):
+    """search_knowledge for several query vectors (one matmul when the index is loaded)"""
+    if knowledge_index.ready:
+        return await run_cpu(knowledge_index.search_batch, using, vectors, limit)
+    # One query_batch_points round trip for all vectors
+    plan = QueryPlanner(qdrant)
+    searches = [plan.query(KNOWLEDGE_COLLECTION, vector, using=using, limit=limit, search_params=SEARCH_PARAMS,
+                           with_payload=Knowledge.HIT.with_payload) for vector in vectors]
+    await plan.execute()
+    return [search.result() for search in searches]
+
+# Reference reports in RAG prompts: token-budgeted, near-duplicates removed, trimmed at sentences
+context_packer = ContextPacker()
+
+def point_id(value):
+    """Qdrant id of a knowledge point; integer ids that went through a string payload come back as ints"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+async def knowledge_text_vectors(hits) -> dict:
+    """text_vectors of knowledge hits keyed by str(id), for near-duplicate removal"""
+    # Qdrant rejects "42" for an integer id, so ids keep their type until the result is keyed
+    ids = list(dict.fromkeys(point_id(hit.id) for hit in hits))
+    if not ids:
+        return {}
+    if knowledge_index.ready:
+        return knowledge_index.vectors("text_vector", ids)
+    try:
+        records = await qdrant.retrieve(
+            collection_name=KNOWLEDGE_COLLECTION,
+            ids=ids,
+            with_payload=Knowledge.DEDUP_VECTOR.with_payload,
+            with_vectors=Knowledge.DEDUP_VECTOR.with_vectors
+        )
+    except Exception as e:
+        # Packing still deduplicates identical texts without the vectors
+        print(f"⚠️ Could not load knowledge text vectors: {e}")
+        return {}
+    return {str(record.id): record.vector["text_vector"] for record in records
+            if record.vector and "text_vector" in record.vector}
+
+async def pack_context(hits, budget: Optional[int] = None) -> PackedContext:
+    return context_packer.pack(hits, await knowledge_text_vectors(hits), budget)
+
+# Sentence-level child points of the knowledge base (built by data/ingest_sentences.py)
+sentence_index_ready = False
+
+def check_sentence_index() -> bool:
+    """Whether the sentence collection exists and has points (blocking; run via run_io)"""
+    global sentence_index_ready
+    sentence_index_ready = (SENTENCE_RETRIEVAL_ENABLED and qdrant_client.collection_exists(SENTENCE_COLLECTION)
+                            and qdrant_client.count(SENTENCE_COLLECTION).count > 0)
+    return sentence_index_ready
+
+async def search_knowledge_passages(vector, limit: int):
+    """
+    Top-`limit` knowledge cases for a text query, each reduced to its
+    best-matching sentences. Falls back to whole reports without a sentence index.
+    """
+    if not sentence_index_ready:
+        return await search_knowledge(vector, "text_vector", limit)
+    groups = (await qdrant.query_points_groups(
+        collection_name=SENTENCE_COLLECTION,
+        query=vector,
+        using="text_vector",
+        group_by="parent_id",
+        limit=limit,
+        group_size=SENTENCE_GROUP_SIZE,
+        search_params=SEARCH_PARAMS,
+        with_payload=Sentences.PASSAGE.with_payload
+    )).groups
+    return passages_from_groups(groups)
+
+# Neighbors of an uploaded scan are reused by analyze, chat, compare and report
+neighbor_cache = NeighborCache()
+
+# Concurrent duplicate analyze / report requests for a scan share one computation
+single_flight = SingleFlight()
+
+# --- RAG ENRICHMENT ---
+# Uploads precompute their knowledge neighbors in the background and store them
+# on the scan point (rag_status / rag_neighbors / rag_kb_version), so analyze,
+# diagnose and report read precomputed context instead of searching.
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "4"))
+
+enrichment_slots = asyncio.Semaphore(ENRICHMENT_CONCURRENCY)
+enrichment_stats = {"queued": 0, "in_flight": 0, "completed": 0, "failed": 0, "total_seconds": 0.0}
+
+def compact_neighbors(hits) -> List[dict]:
+    """Only what the RAG prompts read: id, score and report text"""
+    return [
+        {"id": hit.id, "score": round(hit.score, 6), "report_text": (hit.payload or {}).get("report_text", "")}
+        for hit in hits
+    ]
+
+def neighbors_from_payload(stored: List[dict]):
+    return [
+        models.ScoredPoint(id=point_id(item["id"]), version=0, score=item["score"], payload={"report_text": item["report_text"]})
+        for item in stored
+    ]
+
+async def store_scan_neighbors(scan_id: str, hits, version: Optional[str]):
+    """Persist precomputed neighbors on the scan point"""
+    await qdrant.set_payload(
+        collection_name=USER_COLLECTION,
+        payload={
+            "rag_status": "ready",
+            "rag_neighbors": compact_neighbors(hits),
+            "rag_kb_version": version,
+            "rag_updated_at": datetime.now().isoformat(),
+            "rag_error": None
+        },
+        points=[scan_id]
+    )
+
+async def enrich_scan(scan_id: str, image_vector: List[float]):
+    """Background stage after upload: compute and store the scan's top-K knowledge neighbors"""
+    async with enrichment_slots:
+        enrichment_stats["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            version = knowledge_index.collection_version
+            fetch = neighbor_cache.top_k
+            hits = await search_knowledge(image_vector, "image_vector", fetch)
+            neighbor_cache.put(scan_id, "image_vector", version, hits, fetch)
+            await store_scan_neighbors(scan_id, hits, version)
+            enrichment_stats["completed"] += 1
+        except Exception as e:
+            enrichment_stats["failed"] += 1
+            print(f"⚠️ Enrichment failed for scan {scan_id}: {e}")
+            try:
+                await qdrant.set_payload(
+                    collection_name=USER_COLLECTION,
+                    payload={"rag_status": "failed", "rag_error": str(e)},
+                    points=[scan_id]
+                )
+            except Exception:
+                pass
+        finally:
+            enrichment_stats["in_flight"] -= 1
+            enrichment_stats["total_seconds"] += time.perf_counter() - started
+
+def schedule_enrichment(scan_id: str, image_vector: List[float]):
+    enrichment_stats["queued"] += 1
+    spawn_background(enrich_scan(scan_id, image_vector))
+
+def enrichment_metrics() -> dict:
+    finished = enrichment_stats["completed"] + enrichment_stats["failed"]
+    return {
+        **{k: v for k, v in enrichment_stats.items() if k != "total_seconds"},
+        "pending": enrichment_stats["queued"] - finished - enrichment_stats["in_flight"],
+        "mean_seconds": round(enrichment_stats["total_seconds"] / finished, 4) if finished else 0.0
+    }
+
+async def get_scan_neighbors_many(scan_ids: List[str], limit: int, using: str = "image_vector"):
+    """
+    Top-`limit` knowledge hits for each uploaded scan, served from the neighbor
+    cache or the neighbors precomputed at upload when possible. Remaining scans
+    are searched together and their neighbors persisted for next time.
+    Returns None in place of a scan that does not exist.
+    """
+    version = knowledge_index.collection_version
+    results = [neighbor_cache.get(scan_id, using, version, limit) for scan_id in scan_ids]
+    missing = list(dict.fromkeys(scan_id for scan_id, hits in zip(scan_ids, results) if hits is None))
+    if not missing:
+        return results
+
+    records = await qdrant.retrieve(
+        collection_name=USER_COLLECTION,
+        ids=missing,
+        with_payload=Uploads.RAG_CONTEXT.with_payload,
+        with_vectors=Uploads.RAG_CONTEXT.with_vector(using).with_vectors
+    )
+    resolved, vectors = {}, {}
+    fetch = neighbor_cache.fetch_limit(limit)
+    for record in records:
+        scan_id = str(record.id)
+        payload = record.payload or {}
+        stored = payload.get("rag_neighbors")
+        if (using == "image_vector" and payload.get("rag_status") == "ready" and stored is not None
+                and payload.get("rag_kb_version") == version and len(stored) >= min(limit, fetch)):
+            hits = neighbors_from_payload(stored)
+            neighbor_cache.put(scan_id, using, version, hits, len(stored))
+            resolved[scan_id] = hits[:limit]
+        else:
+            vectors[scan_id] = record.vector[using]
+
+    if vectors:
+        found = list(vectors)
+        hit_lists = await search_knowledge_batch([vectors[scan_id] for scan_id in found], using, fetch)
+        for scan_id, hits in zip(found, hit_lists):
+            neighbor_cache.put(scan_id, using, version, hits, fetch)
+            resolved[scan_id] = hits[:limit]
+            if using == "image_vector":
+                # Missing or stale (knowledge base re-ingested): refresh the stored context
+                spawn_background(store_scan_neighbors(scan_id, hits, version))
+    return [hits if hits is not None else resolved.get(scan_id) for scan_id, hits in zip(scan_ids, results)]
+
+async def get_scan_neighbors(scan_id: str, limit: int, using: str = "image_vector"):
+    """Top-`limit` knowledge hits for one uploaded scan (None if the scan does not exist)"""
+    return (await get_scan_neighbors_many([scan_id], limit, using))[0]
+
+async def refresh_knowledge_index():
+    """Keep the in-process index and the knowledge version in step with the collection"""
+    while True:
+        try:
+            if await run_io(knowledge_index.refresh):
+                # Re-ingested knowledge base: cached neighbors and answers are stale
+                neighbor_cache.clear()
+                llm_cache.clear()
+        except Exception as e:
+            print(f"⚠️ Knowledge index refresh failed: {e}")
+        try:
+            was_ready = sentence_index_ready
+            if await run_io(check_sentence_index) != was_ready:
+                # Text-path prompts switch between sentence passages and whole reports
+                llm_cache.clear()
+        except Exception as e:
+            print(f"⚠️ Sentence index check failed: {e}")
+        await asyncio.sleep(KNOWLEDGE_INDEX_REFRESH_SECONDS)
 
 def classify_intent(message: str) -> dict:
     """
@@ -327,14 +498,19 @@ def classify_intent(message: str) -> dict:
     # Default to diagnose
     return {"intent": "diagnose", "confidence": 0.8}
 
-def generate_llm_response(prompt: str, context: str = "") -> str:
-    """Generate response using Gemini LLM with strict professional formatting."""
-    if not llm_model:
-        return "LLM not configured. Please set GEMINI_API_KEY environment variable."
-    
-    try:
-        # Improved System Prompt for Professionalism
-        full_prompt = f"""
+LLM_NOT_CONFIGURED = "LLM not configured. Please set GEMINI_API_KEY environment variable."
+
+# Bump when the template text changes: cached answers are keyed on these
+RAG_PROMPT_VERSION = "rag-v2"
+REPORT_PROMPT_VERSION = "report-v1"
+
+def llm_cache_key(template_version: str, query: str, sources=()) -> str:
+    """Response cache key for a prompt built from `query` and the knowledge hits `sources`"""
+    return llm_cache.key(template_version, query, [hit.id for hit in sources], knowledge_index.collection_version)
+
+def build_rag_prompt(prompt: str, context: str = "") -> str:
+    """Radiologist system prompt with strict professional formatting"""
+    return f"""
         ACT AS A SENIOR CONSULTING RADIOLOGIST.
         
         {context}
@@ -354,11 +530,21 @@ def generate_llm_response(prompt: str, context: str = "") -> str:
             * **Recommendation**: Next steps.
         4.  **Disclaimer**: End with a subtle standard disclaimer.
         """
-        
-        response = llm_model.generate_content(full_prompt)
-        return response.text
+
+async def generate_llm_response(prompt: str, context: str = "", sources=()) -> str:
+    """Generate the whole LLM answer at once (`sources`: the knowledge hits behind `context`)"""
+    if not llm.available:
+        return LLM_NOT_CONFIGURED
+    key = llm_cache_key(RAG_PROMPT_VERSION, prompt, sources)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        answer = await llm.agenerate(build_rag_prompt(prompt, context))
     except Exception as e:
         return f"Error generating response: {str(e)}"
+    llm_cache.put(key, answer)
+    return answer
 # --- ENDPOINTS ---
 
 @app.post("/upload-scan")
@@ -379,19 +565,14 @@ async def upload_scan(
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         file_path = UPLOAD_DIR / unique_filename
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_io(save_upload_file, file, file_path)
 
-        # Generate embeddings
-        image = preprocess(Image.open(file_path)).unsqueeze(0)
+        # Generate embeddings (both towers are batched with concurrent uploads)
         placeholder_text = f"Medical {scan_type} scan uploaded by patient. {notes}"
-        text_tokens = tokenizer([placeholder_text])
-
-        with torch.no_grad():
-            img_features = model.encode_image(image)
-            img_features /= img_features.norm(dim=-1, keepdim=True)
-            txt_features = model.encode_text(text_tokens)
-            txt_features /= txt_features.norm(dim=-1, keepdim=True)
+        image_vector, text_vector = await asyncio.gather(
+            get_image_embedding(str(file_path)),
+            get_text_embedding(placeholder_text)
+        )
 
         scan_id = str(uuid.uuid4())
         upload_timestamp = datetime.now()
@@ -411,19 +592,23 @@ async def upload_scan(
             "notes": notes,
             "file_size": file_path.stat().st_size,
             "content_type": file.content_type,
-            "has_chat_history": False
+            "has_chat_history": False,
+            "rag_status": "pending"
         }
 
         point = models.PointStruct(
             id=scan_id,
             vector={
-                "image_vector": img_features.squeeze().tolist(),
-                "text_vector": txt_features.squeeze().tolist()
+                "image_vector": image_vector,
+                "text_vector": text_vector
             },
             payload=payload
         )
 
-        qdrant_client.upsert(collection_name=USER_COLLECTION, points=[point])
+        await qdrant.upsert(collection_name=USER_COLLECTION, points=[point])
+
+        # Knowledge neighbors are computed after the response; see /scan-context/{scan_id}
+        schedule_enrichment(scan_id, image_vector)
 
         # Sync scan to Medical History -> Scans folder
         sync_result = await sync_to_medical_history(
@@ -446,6 +631,7 @@ async def upload_scan(
             "filename": unique_filename,
             "upload_timestamp": upload_timestamp.isoformat(),
             "message": "Scan uploaded and saved to patient records.",
+            "context_status": "pending",
             "synced_to_history": sync_result["success"]
         }
 
@@ -462,7 +648,7 @@ async def get_patient_history(request: GetHistoryRequest):
     """
     try:
         # Search for all scans belonging to this patient
-        results = qdrant_client.scroll(
+        results = await qdrant.scroll(
             collection_name=USER_COLLECTION,
             scroll_filter=models.Filter(
                 must=[
@@ -473,7 +659,7 @@ async def get_patient_history(request: GetHistoryRequest):
                 ]
             ),
             limit=100,
-            with_payload=True,
+            with_payload=Uploads.HISTORY_ROW.with_payload,
             with_vectors=False
         )
         
@@ -490,7 +676,8 @@ async def get_patient_history(request: GetHistoryRequest):
                 "status": "normal",  # Could be computed from analysis
                 "filename": payload.get("filename"),
                 "has_chat_history": payload.get("has_chat_history", False),
-                "upload_timestamp": payload.get("upload_timestamp")
+                "upload_timestamp": payload.get("upload_timestamp"),
+                "context_status": payload.get("rag_status", "missing")
             })
         
         # Sort by upload timestamp (newest first)
@@ -510,66 +697,80 @@ async def get_scan_image(filename: str):
         raise HTTPException(status_code=404, detail="Image not found")
     return FileResponse(file_path)
 
+@app.get("/scan-context/{scan_id}")
+async def get_scan_context(scan_id: str):
+    """Progress of the upload-time RAG enrichment for a scan (pending / ready / failed)"""
+    records = await qdrant.retrieve(
+        collection_name=USER_COLLECTION,
+        ids=[scan_id],
+        with_payload=Uploads.RAG_CONTEXT.with_payload
+    )
+    if not records:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    payload = records[0].payload or {}
+    status = payload.get("rag_status", "missing")
+    return {
+        "scan_id": scan_id,
+        "status": status,
+        "ready": status == "ready",
+        "neighbors": len(payload.get("rag_neighbors") or []),
+        "kb_version": payload.get("rag_kb_version"),
+        "up_to_date": payload.get("rag_kb_version") == knowledge_index.collection_version,
+        "updated_at": payload.get("rag_updated_at"),
+        "error": payload.get("rag_error")
+    }
+
 @app.post("/analyze-scan")
 async def analyze_scan(request: AnalysisRequest):
     """
     RAG-based scan analysis using the knowledge base.
     """
     try:
-        # Get the user's image vector
-        user_record = qdrant_client.retrieve(
-            collection_name=USER_COLLECTION,
-            ids=[request.scan_id],
-            with_vectors=True
-        )
-        
-        if not user_record:
-            raise HTTPException(status_code=404, detail="Scan not found")
-            
-        user_image_vector = user_record[0].vector['image_vector']
+        return await single_flight.run(("analyze-scan", request.scan_id), lambda: analyze_scan_result(request.scan_id))
+    except Exception as e:
+        print(f"Analysis Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-        # Search the knowledge collection
-        search_results = qdrant_client.query_points(
-            collection_name=KNOWLEDGE_COLLECTION,
-            query=user_image_vector,
-            using="image_vector",
-            limit=5
-        ).points
-
-        similar_cases = []
-        context_reports = []
-        
-        for hit in search_results:
-            report_text = hit.payload.get("report_text", "No report available")
-            similar_cases.append({
-                "similarity_score": round(hit.score, 4),
-                "diagnosis_report": report_text,
-                "reference_case_id": hit.payload.get("scan_id", "Unknown")
-            })
-            context_reports.append(f"Similar Case (Score: {hit.score:.2f}):\n{report_text}")
+async def analyze_scan_result(scan_id: str, generate=generate_llm_response) -> dict:
+    """Similar cases plus the LLM analysis of an uploaded scan"""
+    # Search the knowledge collection with the user's image vector (cached per scan)
+    search_results = await get_scan_neighbors(scan_id, 5)
 
-        # Generate LLM analysis
-        context = f"""Based on visual similarity analysis of the uploaded scan, here are the most similar cases from our verified radiology database:
+    if search_results is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
 
-{chr(10).join(context_reports[:3])}
+    similar_cases = []
+    
+    for hit in search_results:
+        report_text = hit.payload.get("report_text", "No report available")
+        similar_cases.append({
+            "similarity_score": round(hit.score, 4),
+            "diagnosis_report": report_text,
+            "reference_case_id": hit.payload.get("scan_id", "Unknown")
+        })
 
-Use these similar cases to provide a comprehensive analysis."""
+    packed = await pack_context(search_results)
+    context_reports = [f"Similar Case (Score: {hit.score:.2f}):\n{text}" for hit, text in packed]
 
-        llm_analysis = generate_llm_response(
-            "Provide a detailed radiological analysis and preliminary findings based on the similar cases found.",
-            context
-        )
+    # Generate LLM analysis
+    context = f"""Based on visual similarity analysis of the uploaded scan, here are the most similar cases from our verified radiology database:
 
-        return {
-            "status": "success",
-            "analysis": llm_analysis,
-            "similar_cases": similar_cases,
-            "reasoning": "Analysis generated using RAG with BioMedCLIP embeddings and Gemini LLM."
-        }
+{chr(10).join(context_reports)}
 
-    except Exception as e:
-        print(f"Analysis Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+Use these similar cases to provide a comprehensive analysis."""
+
+    llm_analysis = await generate(
+        "Provide a detailed radiological analysis and preliminary findings based on the similar cases found.",
+        context,
+        sources=packed.hits
+    )
+
+    return {
+        "status": "success",
+        "analysis": llm_analysis,
+        "similar_cases": similar_cases,
+        "reasoning": "Analysis generated using RAG with BioMedCLIP embeddings and Gemini LLM."
+    }
 
 @app.post("/chat")
 async def chat_endpoint(request: ChatMessage):
@@ -581,73 +782,60 @@ async def chat_endpoint(request: ChatMessage):
     3. compare - Compare current and historical scans
     """
     try:
-        print("Classifying intent...")
-        intent_result = classify_intent(request.message)
-        intent = intent_result["intent"]
-        
-        response_data = {
-            "intent": intent,
-            "confidence": intent_result["confidence"],
-            "message": "",
-            "images": [],
-            "scan_data": None
-        }
-        
-        if intent == "diagnose":
-            # Global RAG diagnosis
-            response_data = await handle_diagnose_intent(request)
-            
-        elif intent == "fetch":
-            # Fetch specific historical scan
-            response_data = await handle_fetch_intent(request)
-            
-        elif intent == "compare":
-            # Compare scans
-            response_data = await handle_compare_intent(request)
-        
-        return response_data
-        
+        return await route_chat(request)
     except Exception as e:
         print(f"Chat Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
-async def handle_diagnose_intent(request: ChatMessage) -> dict:
+async def route_chat(request: ChatMessage, generate=generate_llm_response) -> dict:
+    """Classify the message and run the matching intent handler"""
+    print("Classifying intent...")
+    intent_result = classify_intent(request.message)
+    intent = intent_result["intent"]
+    
+    response_data = {
+        "intent": intent,
+        "confidence": intent_result["confidence"],
+        "message": "",
+        "images": [],
+        "scan_data": None
+    }
+    
+    if intent == "diagnose":
+        # Global RAG diagnosis
+        response_data = await handle_diagnose_intent(request, generate)
+        
+    elif intent == "fetch":
+        # Fetch specific historical scan (no LLM call)
+        response_data = await handle_fetch_intent(request)
+        
+    elif intent == "compare":
+        # Compare scans
+        response_data = await handle_compare_intent(request, generate)
+    
+    return response_data
+
+async def handle_diagnose_intent(request: ChatMessage, generate=generate_llm_response) -> dict:
     """Handle diagnosis intent - RAG across knowledge base"""
     try:
         # Get the current scan's vector if available
         if request.current_scan_id:
-            user_record = qdrant_client.retrieve(
-                collection_name=USER_COLLECTION,
-                ids=[request.current_scan_id],
-                with_vectors=True
-            )
+            # Search knowledge base (neighbors are cached per scan)
+            search_results = await get_scan_neighbors(request.current_scan_id, 5)
             
-            if user_record:
-                image_vector = user_record[0].vector['image_vector']
-                
-                # Search knowledge base
-                # FIXED: Added .points to extract the list of hits
-                search_results = qdrant_client.query_points(
-                    collection_name=KNOWLEDGE_COLLECTION,
-                    query=image_vector,
-                    using="image_vector",
-                    limit=5
-                ).points  
-                
+            if search_results is not None:
                 # Format context as strict data points
-                context_reports = []
-                for hit in search_results:
-                    report = hit.payload.get("report_text", "")
-                    context_reports.append(f"- CASE STUDY (Confidence: {hit.score:.2f}): {report}")
+                packed = await pack_context(search_results)
+                context_reports = [f"- CASE STUDY (Confidence: {hit.score:.2f}): {text}" for hit, text in packed]
                 
                 context = f"""
                 REFERENCE CLINICAL DATA (Derived from similar verified cases):
-                {chr(10).join(context_reports[:3])}
+                {chr(10).join(context_reports)}
                 
                 Analyze the current query using the reference data above as diagnostic precedence.
                 """
                 
-                llm_response = generate_llm_response(request.message, context)
+                llm_response = await generate(request.message, context, sources=packed.hits)
                 
                 return {
                     "intent": "diagnose",
@@ -655,24 +843,19 @@ async def handle_diagnose_intent(request: ChatMessage) -> dict:
                     "message": llm_response,
                     "images": [],
                     "scan_data": None,
-                    "similar_cases": [{"score": hit.score, "report": hit.payload.get("report_text", "")[:200]} for hit in search_results[:3]]
+                    "similar_cases": [{"score": hit.score, "report": trim_to_tokens(text, PREVIEW_TOKENS)} for hit, text in packed]
                 }
         
         # If no current scan, use text-based search
-        text_vector = get_text_embedding(request.message)
+        text_vector = await get_text_embedding(request.message)
         
-        # FIXED: Added .points here as well
-        search_results = qdrant_client.query_points(
-            collection_name=KNOWLEDGE_COLLECTION,
-            query=text_vector,
-            using="text_vector",
-            limit=3
-        ).points
+        # Best-matching sentences per case rather than whole captions (when the sentence index exists)
+        search_results = await search_knowledge_passages(text_vector, 3)
         
-        context_reports = [hit.payload.get("report_text", "") for hit in search_results]
-        context = f"REFERENCE LITERATURE:\n" + "\n".join(context_reports)
+        packed = await pack_context(search_results)
+        context = f"REFERENCE LITERATURE:\n" + "\n".join(packed.texts)
         
-        llm_response = generate_llm_response(request.message, context)
+        llm_response = await generate(request.message, context, sources=packed.hits)
         
         return {
             "intent": "diagnose",
@@ -694,9 +877,9 @@ async def handle_diagnose_intent(request: ChatMessage) -> dict:
 async def handle_fetch_intent(request: ChatMessage) -> dict:
     """Handle fetch intent - Find specific patient scan by semantic search"""
     try:
-        query_vector = get_text_embedding(request.message)
+        query_vector = await get_text_embedding(request.message)
         
-        search_results = qdrant_client.query_points(
+        search_results = (await qdrant.query_points(
             collection_name=USER_COLLECTION,
             query=query_vector,
             using="text_vector",
@@ -708,8 +891,10 @@ async def handle_fetch_intent(request: ChatMessage) -> dict:
                     )
                 ]
             ),
-            limit=3
-        ).points
+            limit=3,
+            search_params=SEARCH_PARAMS,
+            with_payload=Uploads.FETCH_MATCH.with_payload
+        )).points
         
         if not search_results:
             return {
@@ -766,7 +951,7 @@ async def handle_fetch_intent(request: ChatMessage) -> dict:
             "scan_data": None
         }
 
-async def handle_compare_intent(request: ChatMessage) -> dict:
+async def handle_compare_intent(request: ChatMessage, generate=generate_llm_response) -> dict:
     """Handle compare intent - Compare current and historical scans"""
     try:
         # Use current_scan_id if available, otherwise fall back to scan_id (historical scan)
@@ -781,32 +966,14 @@ async def handle_compare_intent(request: ChatMessage) -> dict:
                 "scan_data": None
             }
         
-        # Get primary scan (current or selected historical)
-        current_record = qdrant_client.retrieve(
-            collection_name=USER_COLLECTION,
-            ids=[primary_scan_id],
-            with_vectors=True,
-            with_payload=True
-        )
-        
-        if not current_record:
-            return {
-                "intent": "compare",
-                "confidence": 0.5,
-                "message": "**Error**: Current scan reference lost. Please reload.",
-                "images": [],
-                "scan_data": None
-            }
-        
-        current_payload = current_record[0].payload
-        current_image_vector = current_record[0].vector['image_vector']
+        # Level 1 (independent): primary scan payload, best historical match for
+        # the query, and the primary scan's knowledge neighbors
+        query_vector = await get_text_embedding(request.message)
         
+        plan = QueryPlanner(qdrant)
+        current_lookup = plan.retrieve(USER_COLLECTION, [primary_scan_id], with_payload=Uploads.COMPARE_SCAN.with_payload)
         # Find previous scan (exclude the primary scan from results)
-        query_vector = get_text_embedding(request.message)
-        
-        historical_results = qdrant_client.query_points(
-            collection_name=USER_COLLECTION,
-            query=query_vector,
+        historical_lookup = plan.query(USER_COLLECTION, query_vector,
             using="text_vector",
             query_filter=models.Filter(
                 must=[
@@ -822,8 +989,27 @@ async def handle_compare_intent(request: ChatMessage) -> dict:
                     )
                 ]
             ),
-            limit=1
-        ).points
+            limit=1,
+            search_params=SEARCH_PARAMS,
+            with_payload=Uploads.COMPARE_SCAN.with_payload
+        )
+        _, current_similar = await asyncio.gather(
+            plan.execute(),
+            get_scan_neighbors(primary_scan_id, 2)
+        )
+        current_record = current_lookup.result()
+        historical_results = historical_lookup.result()
+        
+        if not current_record:
+            return {
+                "intent": "compare",
+                "confidence": 0.5,
+                "message": "**Error**: Current scan reference lost. Please reload.",
+                "images": [],
+                "scan_data": None
+            }
+        
+        current_payload = current_record[0].payload
         
         if not historical_results:
             return {
@@ -837,42 +1023,27 @@ async def handle_compare_intent(request: ChatMessage) -> dict:
         historical_payload = historical_results[0].payload
         historical_scan_id = historical_payload.get("scan_id")
         
-        # Get historical scan vector
-        historical_record = qdrant_client.retrieve(
-            collection_name=USER_COLLECTION,
-            ids=[historical_scan_id],
-            with_vectors=True
-        )
+        # Level 2: RAG similar cases for the historical scan
+        historical_similar = await get_scan_neighbors(historical_scan_id, 2) if historical_scan_id else None
+        current_similar = current_similar or []
+        historical_similar = historical_similar or []
         
-        historical_image_vector = historical_record[0].vector['image_vector']
-        
-        # RAG: Get similar cases
-        current_similar = qdrant_client.query_points(
-            collection_name=KNOWLEDGE_COLLECTION,
-            query=current_image_vector,
-            using="image_vector",
-            limit=2
-        ).points
-        
-        historical_similar = qdrant_client.query_points(
-            collection_name=KNOWLEDGE_COLLECTION,
-            query=historical_image_vector,
-            using="image_vector",
-            limit=2
-        ).points
-        
-        # Context
-        current_context = "\n".join([hit.payload.get("report_text", "")[:500] for hit in current_similar])
-        historical_context = "\n".join([hit.payload.get("report_text", "")[:500] for hit in historical_similar])
+        # Context: half of the token budget per scan, one text-vector lookup for both sides
+        vectors = await knowledge_text_vectors(current_similar + historical_similar)
+        side_budget = context_packer.budget // 2
+        current_packed = context_packer.pack(current_similar, vectors, side_budget)
+        historical_packed = context_packer.pack(historical_similar, vectors, side_budget)
+        current_context = "\n".join(current_packed.texts)
+        historical_context = "\n".join(historical_packed.texts)
         
         comparison_prompt = f"""
         Perform a strict chronological comparison between the two scans below.
 
         DATA A: CURRENT SCAN ({current_payload.get('upload_date', 'Recent')})
-        Context A: {current_context[:800]}
+        Context A: {current_context}
 
         DATA B: PREVIOUS SCAN ({historical_payload.get('upload_date', 'Earlier')})
-        Context B: {historical_context[:800]}
+        Context B: {historical_context}
 
         USER QUERY: {request.message}
 
@@ -883,7 +1054,7 @@ async def handle_compare_intent(request: ChatMessage) -> dict:
         4. End with a "Progression Assessment" section.
         """
 
-        llm_response = generate_llm_response(comparison_prompt, "")
+        llm_response = await generate(comparison_prompt, "", sources=current_packed.hits + historical_packed.hits)
         
         return {
             "intent": "compare",
@@ -926,6 +1097,119 @@ async def handle_compare_intent(request: ChatMessage) -> dict:
             "scan_data": None
         }
         
+# --- STREAMING (SSE) ---
+# /chat/stream and /analyze-scan/stream run the same handlers as their JSON
+# counterparts, but the LLM call is deferred: retrieval results go out as soon
+# as they exist, then the answer streams token by token.
+
+stream_stats = {"streams": 0, "failed": 0, "token_streams": 0,
+                "ttfb_seconds": 0.0, "first_token_seconds": 0.0, "total_seconds": 0.0}
+
+class DeferredLLM:
+    """Stands in for an LLM answer when a handler runs for a streaming endpoint"""
+
+    def __init__(self, prompt: str, context: str, sources=()):
+        self.prompt = prompt
+        self.context = context
+        self.sources = list(sources)
+
+async def defer_llm_response(prompt: str, context: str = "", sources=()) -> DeferredLLM:
+    return DeferredLLM(prompt, context, sources)
+
+async def replay_answer(text: str):
+    """A cached answer, sent as a single token event"""
+    yield text
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_answer(produce, text_field: str):
+    """
+    SSE body: a `retrieval` event with everything but the LLM text, `token`
+    events while the LLM streams, then `done` with the full text and timings.
+    Failures after the 200 header are reported as an `error` event.
+    """
+    started = time.perf_counter()
+    stream_stats["streams"] += 1
+    try:
+        response = await produce(defer_llm_response)
+    except HTTPException as e:
+        stream_stats["failed"] += 1
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        return
+    except Exception as e:
+        stream_stats["failed"] += 1
+        yield sse_event("error", {"status_code": 500, "detail": str(e)})
+        return
+
+    pending = response.get(text_field)
+    deferred = isinstance(pending, DeferredLLM)
+    yield sse_event("retrieval", {key: value for key, value in response.items() if not (deferred and key == text_field)})
+    ttfb = time.perf_counter() - started
+    stream_stats["ttfb_seconds"] += ttfb
+
+    parts, first_token, cached = [], None, None
+    if deferred and not llm.available:
+        parts.append(LLM_NOT_CONFIGURED)
+        yield sse_event("token", {"text": LLM_NOT_CONFIGURED})
+    elif deferred:
+        key = llm_cache_key(RAG_PROMPT_VERSION, pending.prompt, pending.sources)
+        cached = llm_cache.get(key)
+        chunks = replay_answer(cached) if cached is not None else llm.astream(build_rag_prompt(pending.prompt, pending.context))
+        try:
+            async for chunk in chunks:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                    stream_stats["token_streams"] += 1
+                    stream_stats["first_token_seconds"] += first_token
+                parts.append(chunk)
+                yield sse_event("token", {"text": chunk})
+            if cached is None:
+                llm_cache.put(key, "".join(parts))
+        except Exception as e:
+            stream_stats["failed"] += 1
+            yield sse_event("error", {"status_code": 500, "detail": f"Error generating response: {str(e)}"})
+
+    total = time.perf_counter() - started
+    stream_stats["total_seconds"] += total
+    yield sse_event("done", {
+        text_field: "".join(parts) if deferred else pending,
+        "llm_backend": llm.name,
+        "cached": cached is not None,
+        "ttfb_ms": round(ttfb * 1000, 1),
+        "first_token_ms": round(first_token * 1000, 1) if first_token is not None else None,
+        "total_ms": round(total * 1000, 1)
+    })
+
+def sse_response(produce, text_field: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_answer(produce, text_field),
+        media_type="text/event-stream",
+        # Disable proxy buffering so events reach the browser as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def streaming_metrics() -> dict:
+    streams = stream_stats["streams"]
+    token_streams = stream_stats["token_streams"]
+    return {
+        "streams": streams,
+        "failed": stream_stats["failed"],
+        "mean_ttfb_ms": round(stream_stats["ttfb_seconds"] * 1000 / streams, 1) if streams else 0.0,
+        "mean_first_token_ms": round(stream_stats["first_token_seconds"] * 1000 / token_streams, 1) if token_streams else 0.0,
+        "mean_total_ms": round(stream_stats["total_seconds"] * 1000 / streams, 1) if streams else 0.0
+    }
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatMessage):
+    """/chat as Server-Sent Events: retrieval, then LLM tokens, then final metadata"""
+    return sse_response(lambda generate: route_chat(request, generate), "message")
+
+@app.post("/analyze-scan/stream")
+async def analyze_scan_stream(request: AnalysisRequest):
+    """/analyze-scan as Server-Sent Events: similar cases, then LLM tokens, then final metadata"""
+    return sse_response(lambda generate: analyze_scan_result(request.scan_id, generate), "analysis")
+
 @app.post("/save-chat")
 async def save_chat_history(request: SaveChatRequest):
     """Save chat conversation for a specific scan"""
@@ -936,7 +1220,7 @@ async def save_chat_history(request: SaveChatRequest):
         
         # Create summary for semantic search
         summary = " ".join([msg.get("content", "")[:100] for msg in request.messages[:5]])
-        text_vector = get_text_embedding(summary)
+        text_vector = await get_text_embedding(summary)
         
         payload = {
             "chat_id": chat_id_string,  # Keep original string for reference
@@ -953,10 +1237,10 @@ async def save_chat_history(request: SaveChatRequest):
             payload=payload
         )
         
-        qdrant_client.upsert(collection_name=CHAT_COLLECTION, points=[point])
+        await qdrant.upsert(collection_name=CHAT_COLLECTION, points=[point])
         
         # Update the scan to mark it has chat history
-        qdrant_client.set_payload(
+        await qdrant.set_payload(
             collection_name=USER_COLLECTION,
             payload={"has_chat_history": True},
             points=[request.scan_id]
@@ -976,10 +1260,10 @@ async def get_chat_history(request: GetChatHistoryRequest):
         chat_id_string = f"{request.patient_id}_{request.scan_id}"
         chat_uuid = str(uuid.uuid5(uuid.NAMESPACE_DNS, chat_id_string))
         
-        result = qdrant_client.retrieve(
+        result = await qdrant.retrieve(
             collection_name=CHAT_COLLECTION,
             ids=[chat_uuid],
-            with_payload=True
+            with_payload=ChatHistory.CONVERSATION.with_payload
         )
         
         if result:
@@ -999,7 +1283,7 @@ async def get_chat_history(request: GetChatHistoryRequest):
 async def update_scan_report(scan_id: str = Form(...), report_text: str = Form(...), status: str = Form(default="normal")):
     """Update the report/findings for a scan after analysis"""
     try:
-        qdrant_client.set_payload(
+        await qdrant.set_payload(
             collection_name=USER_COLLECTION,
             payload={
                 "report_text": report_text,
@@ -1019,6 +1303,53 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: which components are loaded (503 until collections and warmup towers are ready)"""
+    components = {
+        "qdrant_collections": collections_ready,
+        "text_tower": inference_backend.is_loaded("text"),
+        "image_tower": inference_backend.is_loaded("image"),
+        "llm": llm.available,
+        "knowledge_index": knowledge_index.status,
+        "sentence_index": sentence_index_ready,
+    }
+    ready = collections_ready and all(inference_backend.is_loaded(t) for t in WARMUP_TOWERS)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "components": components,
+            "warmup_towers": WARMUP_TOWERS,
+            "tower_load_seconds": inference_backend.load_seconds
+        }
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime counters (embedding batch sizes, queue depth, cache hit rates)"""
+    return {
+        "embedding_batches": embedding_engine.stats(),
+        "text_embedding_cache": text_embedding_cache.stats(),
+        "image_embedding_store": image_embedding_store.stats(),
+        "knowledge_index": knowledge_index.stats(),
+        "neighbor_cache": neighbor_cache.stats(),
+        "enrichment": enrichment_metrics(),
+        "query_planner": planner_stats(),
+        "qdrant": qdrant.stats(),
+        "streaming": streaming_metrics(),
+        "llm_cache": llm_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "context_packer": context_packer.stats()
+    }
+
+@app.delete("/llm-cache")
+async def clear_llm_cache():
+    """Drop every cached LLM answer (e.g. after editing a prompt or the knowledge base by hand)"""
+    cleared = len(llm_cache)
+    llm_cache.clear()
+    return {"success": True, "cleared": cleared}
+
 # --- MEDICAL HISTORY FILE MANAGEMENT ---
 
 MEDICAL_HISTORY_COLLECTION = "medical_history"
@@ -1052,7 +1383,38 @@ def ensure_medical_history_collection():
     except Exception as e:
         print(f"⚠️ Medical history collection setup warning: {e}")
 
-ensure_medical_history_collection()
+# --- STARTUP ---
+
+collections_ready = False
+background_tasks = set()
+
+def setup_collections():
+    """Create collections and payload indexes (blocking; run via run_io)"""
+    global collections_ready
+    ensure_collections()
+    ensure_medical_history_collection()
+    collections_ready = True
+
+def spawn_background(coro):
+    """Fire-and-forget task that is kept referenced until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def startup_event():
+    """Accept connections immediately; prepare collections and warm towers in the background"""
+    await qdrant.start()
+    spawn_background(run_io(setup_collections))
+    if WARMUP_TOWERS:
+        spawn_background(run_io(inference_backend.warmup, WARMUP_TOWERS))
+    spawn_background(refresh_knowledge_index())
+
+def render_report_pdf(*args):
+    """Render the formal report PDF; fpdf is imported on the first report"""
+    from pdf_report import render_report_pdf as render
+    return render(*args)
 
 # --- HELPER FUNCTION TO SYNC TO MEDICAL HISTORY ---
 
@@ -1071,7 +1433,7 @@ async def sync_to_medical_history(
     """
     try:
         # Ensure collection exists before proceeding
-        ensure_medical_history_collection()
+        await run_io(ensure_medical_history_collection)
         
         # First, ensure the target folder exists
         folder_filter = [
@@ -1093,18 +1455,18 @@ async def sync_to_medical_history(
             )
         ]
         
-        folder_results = qdrant_client.scroll(
+        folder_results = await qdrant.scroll(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             scroll_filter=models.Filter(must=folder_filter),
             limit=1,
-            with_payload=True,
+            with_payload=MedicalHistory.EXISTS.with_payload,
             with_vectors=False
         )
         
         # If folder doesn't exist, create it
         if not folder_results[0]:
             folder_id = str(uuid.uuid4())
-            text_vector = get_text_embedding(f"Medical folder: {target_folder}")
+            text_vector = await get_text_embedding(f"Medical folder: {target_folder}")
             
             folder_payload = {
                 "patient_id": patient_id,
@@ -1121,7 +1483,7 @@ async def sync_to_medical_history(
                 payload=folder_payload
             )
             
-            qdrant_client.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[folder_point])
+            await qdrant.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[folder_point])
             print(f"✅ Created {target_folder} folder for patient: {patient_id}")
         
         # Create patient-specific upload directory for medical history
@@ -1134,11 +1496,11 @@ async def sync_to_medical_history(
         dest_file_path = patient_upload_dir / unique_filename
         
         # Copy the file
-        shutil.copy2(source_file_path, dest_file_path)
+        await run_io(shutil.copy2, source_file_path, dest_file_path)
         
         # Create file entry in medical history collection
         file_id = str(uuid.uuid4())
-        text_vector = get_text_embedding(f"Medical {file_type}: {original_filename}")
+        text_vector = await get_text_embedding(f"Medical {file_type}: {original_filename}")
         
         file_payload = {
             "patient_id": patient_id,
@@ -1159,7 +1521,7 @@ async def sync_to_medical_history(
             payload=file_payload
         )
         
-        qdrant_client.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[file_point])
+        await qdrant.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[file_point])
         
         print(f"✅ Synced {original_filename} to {target_folder} for patient: {patient_id}")
         
@@ -1196,11 +1558,11 @@ async def get_medical_history(patient_id: str, path: str = ""):
             )
         ]
         
-        results = qdrant_client.scroll(
+        results = await qdrant.scroll(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             scroll_filter=models.Filter(must=filter_conditions),
             limit=1000,
-            with_payload=True,
+            with_payload=MedicalHistory.LISTING.with_payload,
             with_vectors=False
         )
         
@@ -1212,7 +1574,7 @@ async def get_medical_history(patient_id: str, path: str = ""):
             if item_type == "folder":
                 # Count items in this folder
                 folder_path = f"{path}/{payload.get('name')}" if path else payload.get("name")
-                item_count = count_items_in_folder(patient_id, folder_path)
+                item_count = await count_items_in_folder(patient_id, folder_path)
                 
                 items.append({
                     "id": str(point.id),
@@ -1238,7 +1600,7 @@ async def get_medical_history(patient_id: str, path: str = ""):
             default_folders = ["Scans", "Prescriptions", "Reports", "Lab Results", "Other Documents"]
             for folder_name in default_folders:
                 folder_id = str(uuid.uuid4())
-                text_vector = get_text_embedding(f"Medical folder: {folder_name}")
+                text_vector = await get_text_embedding(f"Medical folder: {folder_name}")
                 
                 payload = {
                     "patient_id": patient_id,
@@ -1255,7 +1617,7 @@ async def get_medical_history(patient_id: str, path: str = ""):
                     payload=payload
                 )
                 
-                qdrant_client.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
+                await qdrant.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
                 
                 items.append({
                     "id": folder_id,
@@ -1276,10 +1638,10 @@ async def get_medical_history(patient_id: str, path: str = ""):
         print(f"Error fetching medical history: {str(e)}")
         return {"success": False, "items": [], "error": str(e)}
 
-def count_items_in_folder(patient_id: str, folder_path: str) -> int:
+async def count_items_in_folder(patient_id: str, folder_path: str) -> int:
     """Count items in a folder"""
     try:
-        results = qdrant_client.scroll(
+        results = await qdrant.scroll(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             scroll_filter=models.Filter(
                 must=[
@@ -1294,7 +1656,7 @@ def count_items_in_folder(patient_id: str, folder_path: str) -> int:
                 ]
             ),
             limit=1000,
-            with_payload=False,
+            with_payload=MedicalHistory.EXISTS.with_payload,
             with_vectors=False
         )
         return len(results[0])
@@ -1310,7 +1672,7 @@ async def create_folder(patient_id: str, request: CreateFolderRequest):
         folder_id = str(uuid.uuid4())
         
         # Generate a simple text vector for the folder
-        text_vector = get_text_embedding(f"Medical folder: {request.name}")
+        text_vector = await get_text_embedding(f"Medical folder: {request.name}")
         
         payload = {
             "patient_id": patient_id,
@@ -1327,7 +1689,7 @@ async def create_folder(patient_id: str, request: CreateFolderRequest):
             payload=payload
         )
         
-        qdrant_client.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
+        await qdrant.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
         
         return {"success": True, "folder_id": folder_id, "message": "Folder created successfully"}
         
@@ -1356,13 +1718,12 @@ async def upload_medical_file(
         file_path = patient_upload_dir / unique_filename
         
         # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_io(save_upload_file, file, file_path)
         
         file_id = str(uuid.uuid4())
         
         # Generate text vector for the file
-        text_vector = get_text_embedding(f"Medical {file_type}: {file.filename}")
+        text_vector = await get_text_embedding(f"Medical {file_type}: {file.filename}")
         
         payload = {
             "patient_id": patient_id,
@@ -1383,7 +1744,7 @@ async def upload_medical_file(
             payload=payload
         )
         
-        qdrant_client.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
+        await qdrant.upsert(collection_name=MEDICAL_HISTORY_COLLECTION, points=[point])
         
         return {"success": True, "file_id": file_id, "message": "File uploaded successfully"}
         
@@ -1400,10 +1761,10 @@ async def delete_medical_item(patient_id: str, item_id: str):
     """
     try:
         # Get item details first
-        result = qdrant_client.retrieve(
+        result = await qdrant.retrieve(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             ids=[item_id],
-            with_payload=True
+            with_payload=MedicalHistory.DELETE_TARGET.with_payload
         )
         
         if result:
@@ -1425,7 +1786,7 @@ async def delete_medical_item(patient_id: str, item_id: str):
                 await delete_folder_contents(patient_id, folder_path)
         
         # Delete from Qdrant
-        qdrant_client.delete(
+        await qdrant.delete(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             points_selector=models.PointIdsList(points=[item_id])
         )
@@ -1441,7 +1802,7 @@ async def delete_medical_item(patient_id: str, item_id: str):
 async def delete_folder_contents(patient_id: str, folder_path: str):
     """Recursively delete folder contents"""
     try:
-        results = qdrant_client.scroll(
+        results = await qdrant.scroll(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             scroll_filter=models.Filter(
                 must=[
@@ -1456,7 +1817,7 @@ async def delete_folder_contents(patient_id: str, folder_path: str):
                 ]
             ),
             limit=1000,
-            with_payload=True,
+            with_payload=MedicalHistory.FOLDER_CONTENT.with_payload,
             with_vectors=False
         )
         
@@ -1472,7 +1833,7 @@ async def delete_folder_contents(patient_id: str, folder_path: str):
                     file_path.unlink()
             
             # Delete point
-            qdrant_client.delete(
+            await qdrant.delete(
                 collection_name=MEDICAL_HISTORY_COLLECTION,
                 points_selector=models.PointIdsList(points=[str(point.id)])
             )
@@ -1486,10 +1847,10 @@ async def rename_medical_item(patient_id: str, item_id: str, request: RenameItem
     """
     try:
         # Get item details first
-        result = qdrant_client.retrieve(
+        result = await qdrant.retrieve(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             ids=[item_id],
-            with_payload=True
+            with_payload=MedicalHistory.RENAME_TARGET.with_payload
         )
         
         if not result:
@@ -1510,7 +1871,7 @@ async def rename_medical_item(patient_id: str, item_id: str, request: RenameItem
             new_path = f"{parent_path}/{request.name}" if parent_path else request.name
             new_payload["path"] = new_path
         
-        qdrant_client.set_payload(
+        await qdrant.set_payload(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             payload=new_payload,
             points=[item_id]
@@ -1530,10 +1891,10 @@ async def download_medical_file(patient_id: str, item_id: str):
     Download a file from the patient's medical history.
     """
     try:
-        result = qdrant_client.retrieve(
+        result = await qdrant.retrieve(
             collection_name=MEDICAL_HISTORY_COLLECTION,
             ids=[item_id],
-            with_payload=True
+            with_payload=MedicalHistory.DOWNLOAD.with_payload
         )
         
         if not result:
@@ -1568,13 +1929,21 @@ async def generate_formal_report(scan_id: str):
     """
     Retrieves similar cases, uses Gemini to structure a clinical report,
     and returns a downloadable PDF with professional formatting.
+    Concurrent requests for the same scan share one report (and one history entry).
     """
+    return await single_flight.run(("generate-formal-report", scan_id), lambda: build_formal_report(scan_id))
+
+async def build_formal_report(scan_id: str) -> dict:
+    """Structured report text, rendered PDF and medical-history sync for one scan"""
     try:
-        # 1. Fetch the scan from Qdrant
-        user_record = qdrant_client.retrieve(
-            collection_name=USER_COLLECTION,
-            ids=[scan_id],
-            with_vectors=True
+        # 1 + 2. Fetch the scan from Qdrant and its knowledge neighbors (concurrently)
+        user_record, search_results = await asyncio.gather(
+            qdrant.retrieve(
+                collection_name=USER_COLLECTION,
+                ids=[scan_id],
+                with_payload=Uploads.REPORT_SCAN.with_payload
+            ),
+            get_scan_neighbors(scan_id, 1)
         )
         if not user_record:
             raise HTTPException(status_code=404, detail="Scan not found")
@@ -1583,19 +1952,10 @@ async def generate_formal_report(scan_id: str):
         patient_id = payload.get('patient_id', 'Unknown')
         scan_date = payload.get('upload_date_full', datetime.now().strftime("%Y-%m-%d"))
 
-        # 2. RAG: Search knowledge base
-        image_vector = user_record[0].vector['image_vector']
-        search_results = qdrant_client.query_points(
-            collection_name=KNOWLEDGE_COLLECTION,
-            query=image_vector,
-            using="image_vector",
-            limit=1
-        )
-
         if not search_results:
             raise HTTPException(status_code=404, detail="No similar reference cases found")
 
-        match = search_results.points[0] # Fixed: query_points returns object with points list
+        match = search_results[0]
         raw_context = match.payload.get("report_text", "No reference report available")
         similarity_score = match.score
 
@@ -1620,40 +1980,22 @@ async def generate_formal_report(scan_id: str):
         FOLLOW-UP||[Next steps for the patient]
         """
         
-        response = llm_model.generate_content(prompt)
-        structured_text = response.text
+        if not llm.available:
+            raise RuntimeError(LLM_NOT_CONFIGURED)
+        # The prompt depends only on the nearest neighbor, so its report text is reusable
+        key = llm_cache_key(REPORT_PROMPT_VERSION, prompt, [match])
+        structured_text = llm_cache.get(key)
+        if structured_text is None:
+            structured_text = await llm.agenerate(prompt)
+            llm_cache.put(key, structured_text)
 
-        # 4. PDF Generation
-        pdf = ModernPDFReport()
-        pdf.add_page()
-        
-        # Add Demographics Box
-        pdf.add_patient_section(patient_id, scan_id, scan_date, similarity_score)
-        
-        # Parse and Add Sections
-        # We split by '##' to get sections, then '||' to get title vs body
-        sections = structured_text.split("##")
-        
-        found_structured_data = False
-        
-        for section in sections:
-            if "||" in section:
-                parts = section.split("||")
-                if len(parts) >= 2:
-                    title = parts[0].strip()
-                    body = parts[1].strip()
-                    if title and body:
-                        pdf.add_medical_section(title, body)
-                        found_structured_data = True
-        
-        # Fallback: If LLM didn't follow the split structure, dump the text nicely
-        if not found_structured_data:
-            pdf.add_medical_section("REPORT DETAILS", structured_text)
-
-        # 5. Output
+        # 4. PDF Generation (CPU-bound, kept off the event loop)
         report_filename = f"Report_{scan_id}.pdf"
         report_path = UPLOAD_DIR / report_filename
-        pdf.output(str(report_path))
+        await run_cpu(
+            render_report_pdf, report_path, patient_id, scan_id, scan_date,
+            similarity_score, structured_text
+        )
 
         # Sync report to Medical History -> Reports folder
         sync_result = await sync_to_medical_history(
@@ -0,0 +1,50 @@
+import os
+from typing import List, Optional
+
+from embedding_cache import LRUCache
+
+# --- CONFIGURATION ---
+NEIGHBOR_CACHE_SIZE = int(os.getenv("NEIGHBOR_CACHE_SIZE", "1024"))
+NEIGHBOR_CACHE_TTL_SECONDS = float(os.getenv("NEIGHBOR_CACHE_TTL_SECONDS", "3600"))
+# Hits fetched (and cached) per scan; any smaller k is served by slicing
+NEIGHBOR_CACHE_TOP_K = int(os.getenv("NEIGHBOR_CACHE_TOP_K", "10"))
+
+
+class NeighborCache:
+    """
+    Knowledge-base neighbors of uploaded scans, keyed by
+    (scan_id, vector name, knowledge collection version).
+
+    An entry holds the top NEIGHBOR_CACHE_TOP_K hits, so analyze (k=5), chat
+    (k=5), compare (k=2) and the formal report (k=1) all share one search.
+    Re-ingesting the knowledge base changes its version, which makes every
+    old entry unreachable; clear() drops them eagerly.
+    """
+
+    def __init__(self, capacity: int = NEIGHBOR_CACHE_SIZE, ttl_seconds: float = NEIGHBOR_CACHE_TTL_SECONDS,
+                 top_k: int = NEIGHBOR_CACHE_TOP_K):
+        self.top_k = top_k
+        self._cache = LRUCache(capacity, ttl_seconds=ttl_seconds)
+
+    def fetch_limit(self, limit: int) -> int:
+        """How many hits to search for when filling an entry for a `limit` request"""
+        return max(limit, self.top_k)
+
+    def get(self, scan_id: str, using: str, version: Optional[str], limit: int) -> Optional[List]:
+        entry = self._cache.get((scan_id, using, version))
+        if entry is None:
+            return None
+        hits, complete = entry
+        # A short list is still authoritative if the search returned fewer than it asked for
+        if limit <= len(hits) or complete:
+            return hits[:limit]
+        return None
+
+    def put(self, scan_id: str, using: str, version: Optional[str], hits: List, requested: int):
+        self._cache.put((scan_id, using, version), (list(hits), len(hits) < requested))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {"top_k": self.top_k, "ttl_seconds": self._cache.ttl_seconds, **self._cache.stats()}
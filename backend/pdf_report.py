@@ -0,0 +1,145 @@
+from pathlib import Path
+from fpdf import FPDF, XPos, YPos
+
+# Helper for PDF character safety
+def clean_text_for_pdf(text: str):
+    """
+    Sanitizes text for FPDF (Standard 14 Fonts).
+    Replaces common Unicode characters with ASCII equivalents to prevent crashes.
+    """
+    replacements = {
+        "•": "-",       # Bullet to hyphen
+        "“": '"',       # Smart quotes to straight
+        "”": '"',
+        "‘": "'",       # Smart apostrophe
+        "’": "'",
+        "—": "-",       # Em dash
+        "–": "-",       # En dash
+        "…": "...",     # Ellipsis
+        "\u200b": "",   # Zero-width space
+    }
+    for char, repl in replacements.items():
+        text = text.replace(char, repl)
+
+    # Encode to Latin-1 and replace incompatible chars with '?'
+    return text.encode('latin-1', 'replace').decode('latin-1')
+class ModernPDFReport(FPDF):
+    def header(self):
+        # --- Medical Letterhead ---
+        self.set_font("Helvetica", 'B', 22)
+        # Title
+        self.cell(0, 10, "RADIOLOGY DIAGNOSTIC REPORT", align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        
+        # Subtitle / Hospital Info
+        self.set_font("Helvetica", 'I', 10)
+        self.set_text_color(100, 100, 100) # Dark Gray
+        
+        # FIXED: Changed "•" to "|" to prevent encoding error
+        contact_info = "Advanced Diagnostics | Radiology Expert"
+        self.cell(0, 6, contact_info, align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        
+        # Horizontal Line
+        self.set_draw_color(0, 0, 0)
+        self.set_line_width(0.5)
+        self.line(10, 28, 200, 28)
+        self.ln(10) # Spacer
+
+    def footer(self):
+        # Position at 1.5 cm from bottom
+        self.set_y(-15)
+        self.set_font("Helvetica", 'I', 8)
+        self.set_text_color(128, 128, 128) # Gray
+        # Page number and Disclaimer
+        self.cell(0, 10, f'Page {self.page_no()} | CONFIDENTIAL MEDICAL RECORD | Electronically Generated by AI', align='C')
+
+    def add_patient_section(self, patient_id, scan_id, date, confidence):
+        """Creates a professional box for patient demographics"""
+        # Ensure inputs are safe
+        patient_id = clean_text_for_pdf(str(patient_id))
+        scan_id = clean_text_for_pdf(str(scan_id))
+        date = clean_text_for_pdf(str(date))
+
+        self.set_fill_color(245, 245, 245) # Very light gray background
+        self.set_text_color(0, 0, 0)
+        self.set_font("Helvetica", 'B', 10)
+        
+        # Header bar for demographics
+        self.cell(0, 8, "  PATIENT DEMOGRAPHICS & EXAM DETAILS", 0, 1, 'L', True)
+        
+        self.set_font("Helvetica", '', 10)
+        self.ln(2)
+        
+        # Grid Layout for details
+        # Row 1
+        self.set_font("Helvetica", 'B', 10)
+        self.cell(35, 6, "Patient ID:", 0, 0)
+        self.set_font("Helvetica", '', 10)
+        self.cell(60, 6, patient_id, 0, 0)
+        
+        self.set_font("Helvetica", 'B', 10)
+        self.cell(35, 6, "Exam Date:", 0, 0)
+        self.set_font("Helvetica", '', 10)
+        self.cell(0, 6, date, 0, 1)
+
+        # Row 2
+        self.set_font("Helvetica", 'B', 10)
+        self.cell(35, 6, "Scan ID:", 0, 0)
+        self.set_font("Helvetica", '', 10)
+        self.cell(60, 6, scan_id, 0, 0)
+        
+        self.set_font("Helvetica", 'B', 10)
+        self.cell(35, 6, "AI Confidence:", 0, 0)
+        self.set_font("Helvetica", '', 10)
+        self.cell(0, 6, f"{confidence:.2%}", 0, 1)
+        
+        # Bottom spacer line
+        self.set_draw_color(200, 200, 200)
+        self.line(10, self.get_y()+2, 200, self.get_y()+2)
+        self.ln(8)
+
+    def add_medical_section(self, title, body_text):
+        """Adds a standardized section with a bold uppercase title"""
+        # Clean inputs
+        title = clean_text_for_pdf(title)
+        body_text = clean_text_for_pdf(body_text)
+
+        # Section Title
+        self.set_font("Helvetica", 'B', 12)
+        self.set_text_color(0, 51, 102) # Dark Blue for headers
+        self.cell(0, 8, title.upper(), 0, 1, 'L')
+        
+        # Section Body
+        self.set_font("Helvetica", '', 11)
+        self.set_text_color(0, 0, 0) # Back to black
+        self.multi_cell(0, 6, body_text)
+        self.ln(4) # Space between sections
+
+def render_report_pdf(report_path: Path, patient_id, scan_id, scan_date, similarity_score, structured_text: str):
+    """Lay out the structured LLM report as a PDF and write it to report_path"""
+    pdf = ModernPDFReport()
+    pdf.add_page()
+    
+    # Add Demographics Box
+    pdf.add_patient_section(patient_id, scan_id, scan_date, similarity_score)
+    
+    # Parse and Add Sections
+    # We split by '##' to get sections, then '||' to get title vs body
+    sections = structured_text.split("##")
+    
+    found_structured_data = False
+    
+    for section in sections:
+        if "||" in section:
+            parts = section.split("||")
+            if len(parts) >= 2:
+                title = parts[0].strip()
+                body = parts[1].strip()
+                if title and body:
+                    pdf.add_medical_section(title, body)
+                    found_structured_data = True
+    
+    # Fallback: If LLM didn't follow the split structure, dump the text nicely
+    if not found_structured_data:
+        pdf.add_medical_section("REPORT DETAILS", structured_text)
+
+    pdf.output(str(report_path))
@@ -0,0 +1,131 @@
+import os
+import math
+import asyncio
+import functools
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from executors import run_io
+
+# --- CONFIGURATION ---
+# "async": AsyncQdrantClient on the event loop (default)
+# "threaded": the blocking QdrantClient on the I/O thread pool (previous behaviour, kept for benchmarks)
+QDRANT_CLIENT_MODE = os.getenv("QDRANT_CLIENT_MODE", "async")
+# HTTP connection pool of the REST transport
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "64"))
+QDRANT_POOL_KEEPALIVE = int(os.getenv("QDRANT_POOL_KEEPALIVE", "32"))
+QDRANT_POOL_KEEPALIVE_SECONDS = float(os.getenv("QDRANT_POOL_KEEPALIVE_SECONDS", "30"))
+# gRPC multiplexes every call over one HTTP/2 channel and skips JSON encoding
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+# Per-call deadlines (seconds): reads sit on the request path, writes may move more data
+QDRANT_READ_TIMEOUT = float(os.getenv("QDRANT_READ_TIMEOUT", "10"))
+QDRANT_WRITE_TIMEOUT = float(os.getenv("QDRANT_WRITE_TIMEOUT", "30"))
+
+CLIENT_MODES = ("async", "threaded")
+READ_METHODS = frozenset({"query_points", "query_batch_points", "query_points_groups", "retrieve", "scroll", "count",
+                          "collection_exists"})
+
+
+class QdrantPool:
+    """
+    Shared Qdrant client for request handlers, opened on application startup
+    and closed on shutdown.
+
+    Client methods are called directly on the pool and are always awaitable:
+    `await pool.retrieve(collection_name=..., ids=[...])`. Each call runs under
+    a client-side deadline (QDRANT_READ_TIMEOUT for reads, QDRANT_WRITE_TIMEOUT
+    otherwise); pass `deadline=` to override it for one call.
+    """
+
+    def __init__(self, url: str, api_key: str = None, mode: str = QDRANT_CLIENT_MODE,
+                 pool_size: int = QDRANT_POOL_SIZE, keepalive: int = QDRANT_POOL_KEEPALIVE,
+                 prefer_grpc: bool = QDRANT_PREFER_GRPC, grpc_port: int = QDRANT_GRPC_PORT,
+                 read_timeout: float = QDRANT_READ_TIMEOUT, write_timeout: float = QDRANT_WRITE_TIMEOUT):
+        if mode not in CLIENT_MODES:
+            raise ValueError(f"Unknown QDRANT_CLIENT_MODE '{mode}'. Choose from: {', '.join(CLIENT_MODES)}")
+        self.url = url
+        self.api_key = api_key
+        self.mode = mode
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.prefer_grpc = prefer_grpc
+        self.grpc_port = grpc_port
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self._client = None
+        self.calls = 0
+        self.timeouts = 0
+        self.in_flight = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("Qdrant pool is not started")
+        return self._client
+
+    async def start(self):
+        if self._client is not None:
+            return
+        options = dict(
+            url=self.url,
+            api_key=self.api_key,
+            prefer_grpc=self.prefer_grpc,
+            grpc_port=self.grpc_port,
+            # Transport-level ceiling; the per-call deadlines below are the effective limits
+            timeout=math.ceil(max(self.read_timeout, self.write_timeout)),
+        )
+        if not self.prefer_grpc:
+            options["limits"] = httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.keepalive,
+                keepalive_expiry=QDRANT_POOL_KEEPALIVE_SECONDS,
+            )
+        self._client = AsyncQdrantClient(**options) if self.mode == "async" else QdrantClient(**options)
+        transport = "gRPC" if self.prefer_grpc else f"REST, {self.pool_size} connections"
+        print(f"✅ Qdrant pool started ({self.mode}, {transport})")
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is None:
+            return
+        if self.mode == "async":
+            await client.close()
+        else:
+            client.close()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self.client, name)
+        default_deadline = self.read_timeout if name in READ_METHODS else self.write_timeout
+
+        @functools.wraps(method)
+        async def call(*args, deadline: float = None, **kwargs):
+            if self.mode == "async":
+                pending = method(*args, **kwargs)
+            else:
+                pending = run_io(method, *args, **kwargs)
+            self.calls += 1
+            self.in_flight += 1
+            try:
+                return await asyncio.wait_for(pending, deadline or default_deadline)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise TimeoutError(f"Qdrant {name} exceeded {deadline or default_deadline:.1f}s")
+            finally:
+                self.in_flight -= 1
+        return call
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "transport": "grpc" if self.prefer_grpc else "rest",
+            "pool_size": self.pool_size if not self.prefer_grpc else None,
+            "read_timeout_s": self.read_timeout,
+            "write_timeout_s": self.write_timeout,
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import List
+
+from qdrant_client.http import models
+
+_stats_lock = threading.Lock()
+_stats = {"plans": 0, "planned_calls": 0, "round_trips": 0}
+
+
+class QueryPlanner:
+    """
+    Request-scoped batcher for Qdrant reads.
+
+    Handlers register the reads of one dependency level (query() / retrieve())
+    and then await execute(). All queries against the same collection go out as
+    one query_batch_points call, retrieves with the same projection are merged
+    into one call, and the resulting round trips run concurrently. Each
+    registered read returns a future that resolves to the same value the direct
+    client call would have produced.
+    """
+
+    def __init__(self, client):
+        # Anything with awaitable client methods (QdrantPool, AsyncQdrantClient)
+        self.client = client
+        self._queries = defaultdict(list)   # collection -> [(QueryRequest, future)]
+        self._retrieves = defaultdict(list)  # (collection, payload, vectors) -> [(ids, future)]
+
+    def query(self, collection_name: str, query, using: str = None, limit: int = 10,
+              query_filter: models.Filter = None, search_params: models.SearchParams = None,
+              with_payload=True, with_vectors=False) -> asyncio.Future:
+        """Queue a query_points call; resolves to its list of ScoredPoints"""
+        future = asyncio.get_running_loop().create_future()
+        request = models.QueryRequest(
+            query=query, using=using, limit=limit, filter=query_filter, params=search_params,
+            with_payload=with_payload, with_vector=with_vectors,
+        )
+        self._queries[collection_name].append((request, future))
+        return future
+
+    def retrieve(self, collection_name: str, ids: List, with_payload=True, with_vectors=False) -> asyncio.Future:
+        """Queue a retrieve call; resolves to its list of Records (in id order, missing ids skipped)"""
+        future = asyncio.get_running_loop().create_future()
+        key = (collection_name, _hashable(with_payload), _hashable(with_vectors))
+        self._retrieves[key].append((list(ids), future))
+        return future
+
+    async def execute(self):
+        """Run every queued read in as few, concurrent, round trips as possible"""
+        queries, retrieves = self._queries, self._retrieves
+        self._queries, self._retrieves = defaultdict(list), defaultdict(list)
+
+        calls = [self._run_queries(collection, entries) for collection, entries in queries.items()]
+        calls += [self._run_retrieves(key, entries) for key, entries in retrieves.items()]
+        with _stats_lock:
+            _stats["plans"] += 1
+            _stats["planned_calls"] += sum(len(e) for e in queries.values()) + sum(len(e) for e in retrieves.values())
+            _stats["round_trips"] += len(calls)
+        await asyncio.gather(*calls)
+
+    async def _run_queries(self, collection_name, entries):
+        try:
+            if len(entries) == 1:
+                request, _ = entries[0]
+                responses = [await self.client.query_points(
+                    collection_name=collection_name,
+                    query=request.query,
+                    using=request.using,
+                    query_filter=request.filter,
+                    search_params=request.params,
+                    limit=request.limit,
+                    with_payload=request.with_payload,
+                    with_vectors=request.with_vector
+                )]
+            else:
+                responses = await self.client.query_batch_points(
+                    collection_name=collection_name,
+                    requests=[request for request, _ in entries]
+                )
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        for (_, future), response in zip(entries, responses):
+            future.set_result(response.points)
+
+    async def _run_retrieves(self, key, entries):
+        collection_name, with_payload, with_vectors = key
+        ids = list(dict.fromkeys(point_id for point_ids, _ in entries for point_id in point_ids))
+        try:
+            records = await self.client.retrieve(
+                collection_name=collection_name,
+                ids=ids,
+                with_payload=_unhashable(with_payload),
+                with_vectors=_unhashable(with_vectors)
+            )
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        by_id = {str(record.id): record for record in records}
+        for point_ids, future in entries:
+            future.set_result([by_id[str(i)] for i in point_ids if str(i) in by_id])
+
+
+def _hashable(selector):
+    return tuple(selector) if isinstance(selector, list) else selector
+
+
+def _unhashable(selector):
+    return list(selector) if isinstance(selector, tuple) else selector
+
+
+def planner_stats() -> dict:
+    with _stats_lock:
+        saved = _stats["planned_calls"] - _stats["round_trips"]
+        return {**_stats, "round_trips_saved": saved}
@@ -0,0 +1,47 @@
+import os
+import json
+import hashlib
+from typing import Iterable, Optional
+
+from embedding_cache import LRUCache, normalize_text
+
+# --- CONFIGURATION ---
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+
+
+class ResponseCache:
+    """
+    Finished LLM answers keyed by what the prompt is built from: the prompt
+    template version, the normalized query and the ids of the knowledge points
+    in its context (plus the model and knowledge collection version).
+
+    Only successful answers are stored. Bump a template's version when its
+    text changes; re-ingesting the knowledge base changes the collection
+    version, and clear() drops every entry eagerly.
+    """
+
+    def __init__(self, model_id: str, capacity: int = LLM_CACHE_SIZE, ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.model_id = model_id
+        self._cache = LRUCache(capacity, ttl_seconds=ttl_seconds)
+
+    def key(self, template_version: str, query: str, source_ids: Iterable = (),
+            kb_version: Optional[str] = None) -> str:
+        # Source order is part of the prompt, so it is part of the key
+        material = [self.model_id, template_version, kb_version, normalize_text(query), [str(i) for i in source_ids]]
+        return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def put(self, key: str, text: str):
+        self._cache.put(key, text)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def stats(self) -> dict:
+        return {"model": self.model_id, "ttl_seconds": self._cache.ttl_seconds, **self._cache.stats()}
@@ -0,0 +1,96 @@
+import os
+import uuid
+import hashlib
+from typing import List
+
+from qdrant_client.http import models
+
+from collection_config import create_scan_collection, DEFAULT_PROFILE
+from context_packer import split_sentences
+from embedding_cache import normalize_text
+
+# --- CONFIGURATION ---
+# Child points: one text_vector per report sentence, linked to its radiology_memory case by parent_id
+SENTENCE_COLLECTION = os.getenv("QDRANT_SENTENCE_COLLECTION", "radiology_sentences")
+SENTENCE_RETRIEVAL_ENABLED = os.getenv("SENTENCE_RETRIEVAL_ENABLED", "true").lower() in ("1", "true", "yes")
+# Best-matching sentences kept per parent case
+SENTENCE_GROUP_SIZE = int(os.getenv("SENTENCE_GROUP_SIZE", "2"))
+# Shorter fragments ("Arrow.", "AP view.") are merged into the previous sentence
+SENTENCE_MIN_CHARS = int(os.getenv("SENTENCE_MIN_CHARS", "20"))
+
+
+def report_sentences(report_text: str, min_chars: int = SENTENCE_MIN_CHARS) -> List[str]:
+    """Sentences of a report in order, short fragments merged and repeats removed"""
+    sentences = []
+    for sentence in split_sentences(report_text or ""):
+        if sentences and len(sentence) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+        else:
+            sentences.append(sentence)
+    seen, unique = set(), []
+    for sentence in sentences:
+        key = normalize_text(sentence)
+        if key not in seen:
+            seen.add(key)
+            unique.append(sentence)
+    return unique
+
+
+def report_hash(report_text: str, model_id: str) -> str:
+    """Changes whenever the report, the sentence splitting or the embedding model changes"""
+    digest = hashlib.sha256(f"{model_id}|{SENTENCE_MIN_CHARS}|".encode())
+    digest.update((report_text or "").encode())
+    return digest.hexdigest()
+
+
+def sentence_point_id(parent_id, position: int) -> str:
+    """Stable child id; a re-indexed case has its old children deleted first (delete_children)"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{parent_id}#{position}"))
+
+
+def sentence_point(parent_id, position: int, sentence: str, vector, content_hash: str) -> models.PointStruct:
+    return models.PointStruct(
+        id=sentence_point_id(parent_id, position),
+        vector={"text_vector": vector},
+        payload={"parent_id": str(parent_id), "position": position, "sentence": sentence,
+                 "report_hash": content_hash}
+    )
+
+
+def delete_children(client, parent_ids, collection_name: str = SENTENCE_COLLECTION):
+    """Remove every sentence of the given cases (before re-adding them, or when the case is gone)"""
+    if not parent_ids:
+        return
+    client.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(filter=models.Filter(must=[
+            models.FieldCondition(key="parent_id", match=models.MatchAny(any=[str(p) for p in parent_ids]))
+        ])),
+        wait=True
+    )
+
+
+def create_sentence_collection(client, collection_name: str = SENTENCE_COLLECTION, profile=DEFAULT_PROFILE):
+    """Text-only scan collection plus the parent_id index that grouped queries rely on"""
+    create_scan_collection(client, collection_name, profile, vector_names=("text_vector",))
+    client.create_payload_index(collection_name=collection_name, field_name="parent_id",
+                                field_schema=models.PayloadSchemaType.KEYWORD)
+
+
+def passages_from_groups(groups) -> List[models.ScoredPoint]:
+    """
+    One hit per parent case from a query_points_groups(group_by="parent_id")
+    result: id = parent id, score = best sentence score, report_text = the
+    matched sentences in report order. Shaped like a knowledge-base hit, so
+    prompt packing and the response cache treat it the same way.
+    """
+    passages = []
+    for group in groups:
+        if not group.hits:
+            continue
+        ordered = sorted(group.hits, key=lambda hit: hit.payload.get("position", 0))
+        passages.append(models.ScoredPoint(
+            id=str(group.id), version=0, score=max(hit.score for hit in group.hits),
+            payload={"report_text": " ".join(hit.payload.get("sentence", "") for hit in ordered)}
+        ))
+    return passages
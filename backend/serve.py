@@ -0,0 +1,139 @@
+"""
+Multi-worker server that shares BioMedCLIP weights copy-on-write.
+
+The parent process imports the app and loads the model towers once, then
+forks --workers uvicorn workers that all accept on the same socket. Tensor
+storage is never written after loading, so the pages stay shared between
+workers instead of being duplicated per process as with `uvicorn --workers`.
+Each worker's torch intra-op pool is capped so the workers together do not
+oversubscribe the cores.
+
+    python serve.py --workers 4 --port 8000
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))
+PRELOAD_TOWERS = [t.strip() for t in os.getenv("PRELOAD_TOWERS", "image,text").split(",") if t.strip()]
+
+# Backends whose towers can be built without running a forward pass. Running
+# inference in the parent would start OpenMP / ORT thread pools, which are not
+# safe to inherit across fork(), so the exporting backends load per worker.
+FORK_SAFE_BACKENDS = {"torch", "torch-int8"}
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, threads: int, log_level: str):
+    """Body of a forked worker: cap torch threads and serve until signalled"""
+    import uvicorn
+
+    if "torch" in sys.modules:
+        import torch
+        torch.set_num_threads(threads)
+
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--threads", type=int, default=TORCH_THREADS_PER_WORKER,
+                        help="torch intra-op threads per worker (default: cores // workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("❌ serve.py needs fork(); on this platform use `uvicorn main:app --workers N` instead.")
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    # Must be set before torch initializes its thread pools
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+
+    import main as app_module
+
+    backend = app_module.inference_backend
+    if backend.name in FORK_SAFE_BACKENDS:
+        print(f"🏥 Preloading towers {PRELOAD_TOWERS} in parent (pid {os.getpid()})...")
+        backend.warmup(PRELOAD_TOWERS)
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    else:
+        print(f"⚠️ INFERENCE_BACKEND={backend.name} is loaded per worker (not fork-safe to preload)")
+
+    # Move everything allocated so far into the permanent GC generation so the
+    # collector never touches (and un-shares) those pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🚀 Serving on {args.host}:{args.port} with {args.workers} workers x {threads} torch threads")
+
+    children = {}
+    shutting_down = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(app_module.app, sock, threads, args.log_level)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(args.workers):
+        spawn(slot)
+
+    # Supervise: restart workers that die unexpectedly
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is not None and not shutting_down:
+            print(f"⚠️ Worker {pid} exited with status {status}; restarting")
+            time.sleep(1)
+            spawn(slot)
+
+    sock.close()
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 import os
+import argparse
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
-from qdrant_client.http import models
 
 # 1. Load the SAME variables the backend uses
 load_dotenv()
 
+# Quantization / on-disk / HNSW settings (QDRANT_* env vars, same as the backend)
+from collection_config import create_scan_collection, update_scan_collection, DEFAULT_PROFILE
+
+parser = argparse.ArgumentParser(description="Create the Qdrant collections")
+parser.add_argument("--update-existing", action="store_true",
+                    help="Apply the current quantization / HNSW settings to collections that already exist")
+args = parser.parse_args()
+
 qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
 qdrant_key = os.getenv("QDRANT_API_KEY")
 
@@ -21,15 +29,12 @@ KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memor
 def create_coll(name):
     try:
         if not client.collection_exists(name):
-            print(f"🛠️ Creating collection: {name}...")
-            client.create_collection(
-                collection_name=name,
-                vectors_config={
-                    "image_vector": models.VectorParams(size=512, distance=models.Distance.COSINE),
-                    "text_vector": models.VectorParams(size=512, distance=models.Distance.COSINE)
-                }
-            )
+            print(f"🛠️ Creating collection: {name} ({DEFAULT_PROFILE.describe()})...")
+            create_scan_collection(client, name)
             print(f"✅ Created {name}!")
+        elif args.update_existing:
+            update_scan_collection(client, name)
+            print(f"🔧 Updated '{name}' to {DEFAULT_PROFILE.describe()} (optimizing in the background)")
         else:
             print(f"👍 Collection '{name}' already exists.")
     except Exception as e:
@@ -0,0 +1,50 @@
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests. The first caller for a key
+    (endpoint, scan_id, params...) starts the computation as a task; callers
+    arriving while it runs await the same task and receive its result or
+    exception. The key is released as soon as the task finishes, so later
+    requests compute afresh.
+
+    The task is shielded: a caller that disconnects does not cancel the work
+    the others are waiting for.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._stats = defaultdict(lambda: {"leaders": 0, "coalesced": 0, "failed": 0})
+
+    async def run(self, key: Tuple[Hashable, ...], compute: Callable[[], Awaitable]):
+        stats = self._stats[key[0]]
+        task = self._inflight.get(key)
+        if task is not None:
+            stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        stats["leaders"] += 1
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every waiter went away
+        if task.cancelled() or task.exception() is not None:
+            self._stats[key[0]]["failed"] += 1
+
+    def stats(self) -> dict:
+        in_flight = defaultdict(int)
+        for key in self._inflight:
+            in_flight[key[0]] += 1
+        return {
+            endpoint: {**counts, "in_flight": in_flight[endpoint],
+                       "coalesce_rate": round(counts["coalesced"] / (counts["leaders"] + counts["coalesced"]), 4)}
+            for endpoint, counts in self._stats.items()
+        }
@@ -0,0 +1,97 @@
+"""
+SSE event order of /chat/stream and /analyze-scan/stream with the local fake
+LLM (LLM_BACKEND=fake) and retrieval mocked out, so no Qdrant, BioMedCLIP or
+Gemini is needed.
+
+    cd backend && python -m pytest tests
+"""
+import sys
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # fastapi.testclient
+pytest.importorskip("numpy")
+pytest.importorskip("qdrant_client")
+
+from fastapi.testclient import TestClient
+from qdrant_client.http import models
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    """main imported with the fake LLM; uploads/ and the embedding store go to a temp dir"""
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {"LLM_BACKEND": "fake", "FAKE_LLM_FIRST_TOKEN_MS": "0", "FAKE_LLM_TOKEN_MS": "0",
+                            "FAKE_LLM_TOKENS": "5", "KNOWLEDGE_INDEX_ENABLED": "false",
+                            "LLM_CACHE_SIZE": "0"}.items():
+            patch.setenv(name, value)
+        patch.chdir(tmp_path_factory.mktemp("backend"))
+        patch.syspath_prepend(str(BACKEND_DIR))
+        sys.modules.pop("main", None)
+        import main
+        yield main
+        sys.modules.pop("main", None)
+
+
+@pytest.fixture
+def client(main, monkeypatch):
+    async def text_embedding(text):
+        return [0.0] * 512
+
+    async def passages(vector, limit):
+        return [models.ScoredPoint(id=1, version=0, score=0.9,
+                                   payload={"report_text": "Small left pleural effusion. No pneumothorax."})]
+
+    async def no_vectors(hits):
+        return {}
+
+    async def unknown_scan(scan_id, limit, using="image_vector"):
+        return None
+
+    monkeypatch.setattr(main, "get_text_embedding", text_embedding)
+    monkeypatch.setattr(main, "search_knowledge_passages", passages)
+    monkeypatch.setattr(main, "knowledge_text_vectors", no_vectors)
+    monkeypatch.setattr(main, "get_scan_neighbors", unknown_scan)
+    # Not entered as a context manager: startup (Qdrant, warm-up) does not run
+    return TestClient(main.app)
+
+
+def sse_events(body: str):
+    """[(event, data)] of an SSE body"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_chat_stream_emits_retrieval_tokens_done(client):
+    response = client.post("/chat/stream", json={"patient_id": "P1", "message": "What is pleural effusion?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = sse_events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "retrieval"
+    assert names[-1] == "done"
+    assert set(names[1:-1]) == {"token"}
+
+    tokens = "".join(data["text"] for name, data in events if name == "token")
+    done = events[-1][1]
+    assert tokens
+    assert done["message"] == tokens
+    assert done["llm_backend"] == "fake"
+    assert done["cached"] is False
+
+
+def test_analyze_scan_stream_unknown_scan_is_an_error_event(client):
+    response = client.post("/analyze-scan/stream", json={"scan_id": "missing"})
+    assert response.status_code == 200
+
+    events = sse_events(response.text)
+    assert events == [("error", {"status_code": 404, "detail": "Scan not found"})]
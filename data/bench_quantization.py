@@ -0,0 +1,175 @@
+"""
+Quantization benchmark: fp32 vs scalar (int8) vs binary storage of radiology_memory.
+
+The vectors already in the knowledge collection are copied into one scratch
+collection per storage profile (no re-encoding). Each record of
+radiology_test_set.json is then encoded once and searched against every
+profile. Reported per profile:
+  - estimated RAM / disk for vectors, quantized copies and the HNSW graph
+  - p50 / p99 query latency
+  - recall@k against an exact (brute-force) fp32 search
+
+    python bench_quantization.py --profiles fp32 scalar binary --k 10 --output quantization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+load_dotenv()
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from collection_config import CollectionProfile, create_scan_collection, VECTOR_NAMES, VECTOR_SIZE
+from loadgen import percentile
+from bench_retrieval import encode_test_split
+
+# --- CONFIGURATION ---
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
+TEST_FILE = "radiology_test_set.json"
+BENCH_PREFIX = "bench_quant"
+COPY_BATCH = 256
+
+PROFILES = {
+    "fp32": CollectionProfile(quantization="none", vectors_on_disk=False),
+    "scalar": CollectionProfile(quantization="scalar", vectors_on_disk=True, rescore=True),
+    "scalar-no-rescore": CollectionProfile(quantization="scalar", vectors_on_disk=True, rescore=False),
+    "binary": CollectionProfile(quantization="binary", vectors_on_disk=True, rescore=True, oversampling=3.0),
+    "binary-no-rescore": CollectionProfile(quantization="binary", vectors_on_disk=True, rescore=False),
+}
+
+
+def estimated_memory_mb(profile: CollectionProfile, points: int, vectors: int) -> dict:
+    """Vector storage footprint implied by the profile (HNSW level 0 dominates the graph)"""
+    originals = points * VECTOR_SIZE * 4 * vectors
+    quantized = {"none": 0, "scalar": points * VECTOR_SIZE, "binary": points * VECTOR_SIZE // 8}[profile.quantization]
+    quantized *= vectors
+    graph = points * profile.hnsw_m * 2 * 4 * vectors
+    ram = disk = 0
+    for size, on_disk in ((originals, profile.originals_on_disk),
+                          (quantized, not profile.always_ram),
+                          (graph, profile.hnsw_on_disk)):
+        if on_disk:
+            disk += size
+        else:
+            ram += size
+    return {"ram_mb": round(ram / 2**20, 2), "disk_mb": round(disk / 2**20, 2)}
+
+
+def copy_collection(client, target: str, profile: CollectionProfile) -> int:
+    """Create `target` with the profile and fill it with the knowledge vectors"""
+    if client.collection_exists(target):
+        client.delete_collection(target)
+    # Index immediately: the knowledge base is below Qdrant's default indexing threshold
+    create_scan_collection(client, target, profile,
+                           optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1))
+    copied, offset = 0, None
+    while True:
+        points, offset = client.scroll(KNOWLEDGE_COLLECTION, limit=COPY_BATCH, offset=offset,
+                                       with_payload=False, with_vectors=list(VECTOR_NAMES))
+        client.upsert(target, points=[models.PointStruct(id=point.id, vector=point.vector) for point in points],
+                      wait=True)
+        copied += len(points)
+        if offset is None:
+            return copied
+
+
+def wait_until_indexed(client, name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(1.0)
+    print(f"⚠️ {name} is still optimizing; results may include unindexed segments")
+
+
+def run_queries(client, name: str, queries, using: str, k: int, params):
+    results, latencies = [], []
+    for vector in queries:
+        started = time.perf_counter()
+        hits = client.query_points(name, query=vector, using=using, limit=k,
+                                   search_params=params, with_payload=False).points
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([str(hit.id) for hit in hits])
+    return results, latencies
+
+
+def recall_at(results, truth, k: int) -> float:
+    found = sum(len(set(got[:k]) & set(exact[:k])) for got, exact in zip(results, truth))
+    return found / (k * len(truth)) if truth else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--using", default="image_vector", choices=list(VECTOR_NAMES))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="Test records to use as queries")
+    parser.add_argument("--hnsw-m", type=int, help="Override HNSW m for every profile")
+    parser.add_argument("--ef-construct", type=int, help="Override HNSW ef_construct for every profile")
+    parser.add_argument("--hnsw-ef", type=int, help="Override the search-time HNSW beam for every profile")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=120)
+    overrides = {key: value for key, value in (("hnsw_m", args.hnsw_m), ("hnsw_ef_construct", args.ef_construct),
+                                               ("search_hnsw_ef", args.hnsw_ef)) if value is not None}
+
+    print(f"🏥 Encoding up to {args.queries} test queries ({args.using})...")
+    _, queries = encode_test_split(TEST_FILE, args.using, args.queries)
+    queries = queries.tolist()
+
+    # Ground truth: exhaustive fp32 search, independent of any index
+    baseline = f"{BENCH_PREFIX}_fp32_exact"
+    points = copy_collection(client, baseline, PROFILES["fp32"])
+    truth, _ = run_queries(client, baseline, queries, args.using, args.k, models.SearchParams(exact=True))
+    print(f"📚 {points} knowledge points, {len(queries)} queries, recall@{args.k} vs exact fp32")
+
+    reports = []
+    try:
+        for name in args.profiles:
+            profile = PROFILES[name].with_options(**overrides)
+            collection = f"{BENCH_PREFIX}_{name.replace('-', '_')}"
+            print(f"▶️ {name}: {profile.describe()}")
+            copy_collection(client, collection, profile)
+            wait_until_indexed(client, collection)
+            params = profile.search_params()
+            run_queries(client, collection, queries[:20], args.using, args.k, params)  # warm-up
+            results, latencies = run_queries(client, collection, queries, args.using, args.k, params)
+            reports.append({
+                "profile": name,
+                "description": profile.describe(),
+                **estimated_memory_mb(profile, points, len(VECTOR_NAMES)),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                **{f"recall@{k}": round(recall_at(results, truth, k), 4) for k in sorted({1, 5, args.k}) if k <= args.k},
+            })
+            if not args.keep:
+                client.delete_collection(collection)
+    finally:
+        if not args.keep:
+            client.delete_collection(baseline)
+
+    print()
+    for report in reports:
+        print(f"--- {report['profile']} ({report['description']}) ---")
+        for key, value in report.items():
+            if key not in ("profile", "description"):
+                print(f"   {key:<10} {value}")
+        print()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=4)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
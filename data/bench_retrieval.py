@@ -0,0 +1,310 @@
+"""
+Headless retrieval benchmark and regression harness over radiology_test_set.json.
+
+The held-out split is embedded in batches (optionally cached with
+--query-cache) and every case is searched against the knowledge base through
+one of these backends:
+  qdrant         the Qdrant server at QDRANT_URL (with the collection's search params)
+  qdrant-memory  qdrant_client local mode (":memory:"), loaded from the server or --artifact
+  index          the backend's in-process NumPy KnowledgeIndex, loaded the same way
+
+A hit is relevant when its diagnosis labels overlap the query's (generic
+labels such as "findings" are ignored; cases with only generic labels are
+skipped for quality metrics). Reports recall@1/5/10 (share of cases with a
+relevant hit in the top k), mean precision@k, p50/p95/p99 latency and QPS,
+and writes everything as JSON. With --baseline the run fails (exit 1) when
+recall drops or p95 latency grows past the allowed margins.
+
+    python bench_retrieval.py --backend index --output results/index.json
+    python bench_retrieval.py --backend index --baseline results/index.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+load_dotenv()
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from collection_config import SEARCH_PARAMS, VECTOR_NAMES
+from loadgen import percentile
+from records import iter_records
+
+# --- CONFIGURATION ---
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
+TEST_FILE = "radiology_test_set.json"
+BACKENDS = ("qdrant", "qdrant-memory", "index")
+RECALL_KS = (1, 5, 10)
+ENCODE_BATCH_SIZE = 32
+LOAD_BATCH = 256
+
+
+# --- QUERIES ---
+
+def load_image(path):
+    return Image.open(os.path.normpath(path.replace("\\", "/"))).convert("RGB")
+
+
+def encode_test_split(path: str, using: str, limit: int = None, batch_size: int = ENCODE_BATCH_SIZE):
+    """(records, float32 matrix) for the held-out split; unreadable images are skipped"""
+    from inference_backends import load_backend, INFERENCE_BACKEND, MODEL_NAME
+    backend = load_backend(INFERENCE_BACKEND, os.getenv("MODEL_NAME") or MODEL_NAME)
+
+    records, vectors, batch = [], [], []
+
+    def flush():
+        if not batch:
+            return
+        if using == "text_vector":
+            encoded = backend.encode_text([record["report_text"] for record, _ in batch])
+        else:
+            encoded = backend.encode_images([image for _, image in batch])
+        records.extend(record for record, _ in batch)
+        vectors.extend(encoded)
+        batch.clear()
+
+    for i, record in enumerate(iter_records(path)):
+        if limit is not None and i >= limit:
+            break
+        if using == "image_vector":
+            try:
+                batch.append((record, load_image(record["image_path"])))
+            except OSError as e:
+                print(f"⚠️ Skipping {record['image_path']}: {e}")
+                continue
+        else:
+            batch.append((record, None))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return records, np.asarray(vectors, dtype=np.float32).reshape(len(records), -1)
+
+
+def load_queries(args):
+    """Encode the test split, or reuse --query-cache when it matches this model and vector"""
+    from inference_backends import INFERENCE_BACKEND, MODEL_NAME
+    key = {"model": os.getenv("MODEL_NAME") or MODEL_NAME, "backend": INFERENCE_BACKEND,
+           "using": args.using, "test_file": TEST_FILE, "limit": args.queries}
+    if args.query_cache and os.path.exists(args.query_cache):
+        cached = np.load(args.query_cache, allow_pickle=False)
+        if json.loads(str(cached["key"])) == key:
+            print(f"📦 Reusing query vectors from {args.query_cache}")
+            return json.loads(str(cached["records"])), cached["vectors"]
+
+    print(f"🏥 Encoding the test split ({args.using}, batches of {ENCODE_BATCH_SIZE})...")
+    started = time.perf_counter()
+    records, vectors = encode_test_split(TEST_FILE, args.using, args.queries)
+    print(f"   {len(records)} queries in {time.perf_counter() - started:.1f}s")
+    if args.query_cache:
+        np.savez(args.query_cache, key=json.dumps(key), records=json.dumps(records), vectors=vectors)
+    return records, vectors
+
+
+# --- BACKENDS ---
+
+def iter_source_points(server, artifact_dir):
+    """Batches of (id, vectors, diagnosis payload) from the server collection or an artifact"""
+    if artifact_dir:
+        from embedding_artifact import ArtifactReader
+        for batch in ArtifactReader(artifact_dir).iter_batches(LOAD_BATCH):
+            yield [(point_id, {name: vector.tolist() for name, vector in vectors.items()},
+                    {"diagnosis": payload.get("diagnosis", [])}) for point_id, vectors, payload, _ in batch]
+        return
+    offset = None
+    while True:
+        points, offset = server.scroll(KNOWLEDGE_COLLECTION, limit=LOAD_BATCH, offset=offset,
+                                       with_payload=["diagnosis"], with_vectors=list(VECTOR_NAMES))
+        yield [(point.id, point.vector, point.payload) for point in points]
+        if offset is None:
+            return
+
+
+def load_memory_client(server, artifact_dir):
+    client = QdrantClient(":memory:")
+    client.create_collection(KNOWLEDGE_COLLECTION, vectors_config={
+        name: models.VectorParams(size=512, distance=models.Distance.COSINE) for name in VECTOR_NAMES
+    })
+    for batch in iter_source_points(server, artifact_dir):
+        client.upsert(KNOWLEDGE_COLLECTION, points=[
+            models.PointStruct(id=point_id, vector=vectors, payload=payload) for point_id, vectors, payload in batch
+        ])
+    return client
+
+
+def build_searcher(args):
+    """(search(vector) -> [(id, diagnosis labels)], points in the knowledge base)"""
+    server = None if args.artifact and args.backend != "qdrant" else \
+        QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60)
+
+    if args.backend == "qdrant":
+        def search(vector):
+            hits = server.query_points(KNOWLEDGE_COLLECTION, query=vector.tolist(), using=args.using, limit=args.k,
+                                       search_params=SEARCH_PARAMS, with_payload=["diagnosis"]).points
+            return [(hit.id, hit.payload.get("diagnosis", [])) for hit in hits]
+        return search, server.count(KNOWLEDGE_COLLECTION, exact=True).count
+
+    client = load_memory_client(server, args.artifact)
+    points = client.count(KNOWLEDGE_COLLECTION, exact=True).count
+
+    if args.backend == "qdrant-memory":
+        def search(vector):
+            hits = client.query_points(KNOWLEDGE_COLLECTION, query=vector.tolist(), using=args.using, limit=args.k,
+                                       with_payload=["diagnosis"]).points
+            return [(hit.id, hit.payload.get("diagnosis", [])) for hit in hits]
+        return search, points
+
+    from knowledge_index import KnowledgeIndex
+    index = KnowledgeIndex(client, KNOWLEDGE_COLLECTION, max_points=max(points, 1), enabled=True,
+                           payload_fields=["diagnosis"])
+    index.refresh(force=True)
+
+    def search(vector):
+        return [(hit.id, hit.payload.get("diagnosis", [])) for hit in index.search(args.using, vector, args.k)]
+    return search, points
+
+
+# --- METRICS ---
+
+def quality_metrics(records, results, generic_labels) -> dict:
+    hits_at = {k: 0 for k in RECALL_KS}
+    precision_at = {k: 0.0 for k in RECALL_KS}
+    evaluated = 0
+    for record, hits in zip(records, results):
+        labels = set(record.get("diagnosis", [])) - generic_labels
+        if not labels:
+            continue
+        evaluated += 1
+        relevant = [bool(labels & set(diagnosis or [])) for _, diagnosis in hits]
+        for k in RECALL_KS:
+            hits_at[k] += any(relevant[:k])
+            precision_at[k] += sum(relevant[:k]) / k
+    return {
+        "evaluated_queries": evaluated,
+        "skipped_generic_queries": len(records) - evaluated,
+        **{f"recall@{k}": round(hits_at[k] / evaluated, 4) if evaluated else 0.0 for k in RECALL_KS},
+        **{f"precision@{k}": round(precision_at[k] / evaluated, 4) if evaluated else 0.0 for k in RECALL_KS},
+    }
+
+
+def run_queries(search, vectors, concurrency: int):
+    """Every query once; returns (results in query order, latencies ms, wall seconds)"""
+    def timed(vector):
+        started = time.perf_counter()
+        hits = search(vector)
+        return hits, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            timed_results = list(pool.map(timed, vectors))
+    else:
+        timed_results = [timed(vector) for vector in vectors]
+    wall = time.perf_counter() - started
+    return [hits for hits, _ in timed_results], [ms for _, ms in timed_results], wall
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare_to_baseline(result: dict, baseline_path: str, max_recall_drop: float, max_latency_increase: float):
+    """List of regressions of `result` against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for k in RECALL_KS:
+        key = f"recall@{k}"
+        before, after = baseline["metrics"].get(key), result["metrics"][key]
+        if before is not None and after < before - max_recall_drop:
+            regressions.append(f"{key} {before} → {after}")
+    before, after = baseline["metrics"].get("p95_ms"), result["metrics"]["p95_ms"]
+    if before and after > before * (1 + max_latency_increase):
+        regressions.append(f"p95_ms {before} → {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="index", choices=BACKENDS)
+    parser.add_argument("--using", default="image_vector", choices=list(VECTOR_NAMES))
+    parser.add_argument("--k", type=int, default=max(RECALL_KS), help="Hits fetched per query")
+    parser.add_argument("--queries", type=int, help="Only use the first N test cases")
+    parser.add_argument("--concurrency", type=int, default=1, help="Parallel query threads for the QPS run")
+    parser.add_argument("--artifact", help="Load qdrant-memory / index from an embedding artifact instead of the server")
+    parser.add_argument("--query-cache", help="Cache the encoded test split in this .npz file")
+    parser.add_argument("--generic-labels", nargs="*", default=["findings"],
+                        help="Diagnosis labels that do not count as a match")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Previous results JSON to check for regressions")
+    parser.add_argument("--max-recall-drop", type=float, default=0.01)
+    parser.add_argument("--max-latency-increase", type=float, default=0.25, help="Allowed relative p95 growth")
+    args = parser.parse_args()
+    if args.k < max(RECALL_KS):
+        parser.error(f"--k must be at least {max(RECALL_KS)}")
+
+    records, vectors = load_queries(args)
+    search, points = build_searcher(args)
+    print(f"📚 {args.backend}: {points} knowledge points, {len(records)} queries ({args.using})")
+
+    # Warm-up (index pages, connection pool)
+    run_queries(search, vectors[:min(20, len(vectors))], 1)
+    results, latencies, wall = run_queries(search, vectors, args.concurrency)
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "backend": args.backend,
+            "using": args.using,
+            "knowledge_points": points,
+            "queries": len(records),
+            "concurrency": args.concurrency,
+            "source": args.artifact if args.artifact and args.backend != "qdrant" else QDRANT_URL,
+        },
+        "metrics": {
+            **quality_metrics(records, results, set(args.generic_labels)),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "qps": round(len(latencies) / wall, 1) if wall else 0.0,
+        },
+    }
+
+    print()
+    for key, value in result["metrics"].items():
+        print(f"   {key:<24} {value}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(result, args.baseline, args.max_recall_drop, args.max_latency_increase)
+        if regressions:
+            print(f"\n❌ Regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 import shutil
-import json
+from records import iter_records
 
 # --- CONFIGURATION ---
 JSON_FILE_PATH = "radiology_test_set.json"  # The path to your JSON file
@@ -13,19 +13,18 @@ def organize_test_images():
         os.makedirs(DEST_DIR)
         print(f"✅ Created directory: {DEST_DIR}")
 
-    # 2. Load the JSON file
-    try:
-        with open(JSON_FILE_PATH, 'r') as f:
-            test_records = json.load(f)
-    except FileNotFoundError:
+    # 2. Check the JSON file
+    if not os.path.exists(JSON_FILE_PATH):
         print(f"❌ Error: Could not find {JSON_FILE_PATH}")
         return
 
-    # 3. Loop through JSON and copy images
+    # 3. Stream the JSON and copy images
+    total_count = 0
     copied_count = 0
     missing_count = 0
 
-    for record in test_records:
+    for record in iter_records(JSON_FILE_PATH):
+        total_count += 1
         # Extract the filename from the path in the JSON (handles both / and \)
         raw_path = record.get("image_path", "")
         filename = os.path.basename(raw_path.replace("\\", "/"))
@@ -46,7 +45,7 @@ def organize_test_images():
             missing_count += 1
 
     print(f"\n--- Task Complete ---")
-    print(f"Total images in JSON: {len(test_records)}")
+    print(f"Total images in JSON: {total_count}")
     print(f"Successfully copied: {copied_count}")
     print(f"Missing from source: {missing_count}")
 
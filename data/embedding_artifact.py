@@ -0,0 +1,124 @@
+"""
+On-disk embedding artifact: everything needed to rebuild a collection without
+running BioMedCLIP.
+
+    <dir>/meta.json          format version, row count, dim, dtype, vector names, model
+    <dir>/ids.json           id index: point ids as stored (int or UUID string) + content hashes, row-aligned
+    <dir>/payload.json       columnar payload: {"columns": {field: [value per row]}}
+    <dir>/<vector>.f32       raw row-major float32 matrix per named vector, np.memmap-able
+
+Vector files are plain little-endian float32 so they can be memory-mapped by
+numpy (or anything else) without parsing.
+"""
+import os
+import json
+import time
+
+import numpy as np
+
+ARTIFACT_FORMAT = 1
+VECTOR_NAMES = ("image_vector", "text_vector")
+
+
+def point_id(value):
+    """Qdrant id from the id index; artifacts written before ids kept their type hold ints as digit strings"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+class ArtifactWriter:
+    """Streams rows into an artifact directory; vectors go straight to disk"""
+
+    def __init__(self, directory, dim=512, vector_names=VECTOR_NAMES, metadata=None):
+        self.directory = directory
+        self.dim = dim
+        self.vector_names = tuple(vector_names)
+        self.metadata = metadata or {}
+        self.ids, self.hashes = [], []
+        self.columns = {}
+        os.makedirs(directory, exist_ok=True)
+        self._files = {name: open(os.path.join(directory, f"{name}.f32"), "wb") for name in self.vector_names}
+
+    def append(self, point_id, vectors, payload, digest=None):
+        row = len(self.ids)
+        for name in self.vector_names:
+            vector = np.asarray(vectors[name], dtype="<f4")
+            if vector.shape != (self.dim,):
+                raise ValueError(f"{name} of point {point_id} has shape {vector.shape}, expected ({self.dim},)")
+            self._files[name].write(vector.tobytes())
+        for field in payload.keys() - self.columns.keys():
+            self.columns[field] = [None] * row
+        for field, values in self.columns.items():
+            values.append(payload.get(field))
+        self.ids.append(point_id)
+        self.hashes.append(digest)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._dump("ids.json", {"ids": self.ids, "hashes": self.hashes})
+        self._dump("payload.json", {"columns": self.columns})
+        # meta.json is written last: its presence marks the artifact as complete
+        self._dump("meta.json", {
+            "format": ARTIFACT_FORMAT,
+            "count": len(self.ids),
+            "dim": self.dim,
+            "dtype": "float32",
+            "vectors": list(self.vector_names),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            **self.metadata,
+        })
+
+    def _dump(self, name, obj):
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(obj, f)
+        os.replace(path + ".tmp", path)
+
+
+class ArtifactReader:
+    """Read side: vectors are memory-mapped, payload columns are loaded on demand"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"{directory} is not a complete embedding artifact (no meta.json)")
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported artifact format {self.meta.get('format')}")
+        with open(os.path.join(directory, "ids.json")) as f:
+            index = json.load(f)
+        self.ids, self.hashes = [point_id(value) for value in index["ids"]], index["hashes"]
+        self.vectors = {
+            name: np.memmap(os.path.join(directory, f"{name}.f32"), dtype="<f4", mode="r",
+                            shape=(self.meta["count"], self.meta["dim"]))
+            for name in self.meta["vectors"]
+        }
+        self._columns = None
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            with open(os.path.join(self.directory, "payload.json")) as f:
+                self._columns = json.load(f)["columns"]
+        return self._columns
+
+    def payload(self, row):
+        return {field: values[row] for field, values in self.columns.items() if values[row] is not None}
+
+    def iter_batches(self, batch_size):
+        """Yield lists of (id, {vector name: row}, payload, hash)"""
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            blocks = {name: np.asarray(matrix[start:stop]) for name, matrix in self.vectors.items()}
+            yield [
+                (self.ids[row], {name: blocks[name][row - start] for name in blocks},
+                 self.payload(row), self.hashes[row])
+                for row in range(start, stop)
+            ]
@@ -1,29 +1,21 @@
-import json
 import os
-import random
 import matplotlib.pyplot as plt
 from PIL import Image
 import textwrap
+from records import iter_records, reservoir_sample
 
 # --- CONFIGURATION ---
 JSON_FILE = "radiology_memory.json"
 SAMPLES_TO_CHECK = 5  # How many you want to verify
 
 def verify_samples():
-    # 1. Load Data
+    # 1 + 2. Stream the data and pick random samples in a single pass
     try:
-        with open(JSON_FILE, 'r') as f:
-            data = json.load(f)
+        samples = reservoir_sample(iter_records(JSON_FILE), SAMPLES_TO_CHECK)
     except FileNotFoundError:
         print("❌ File not found.")
         return
 
-    # 2. Pick Random Samples
-    if len(data) < SAMPLES_TO_CHECK:
-        samples = data
-    else:
-        samples = random.sample(data, SAMPLES_TO_CHECK)
-
     # 3. Display Them
     print(f"🔍 Inspecting {len(samples)} random records...\n")
 
@@ -1,14 +1,27 @@
+import io
 import os
-import json
+import re
+import time
 import uuid
+import queue
 import random
-from datasets import load_dataset
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from records import RecordWriter
 
 # --- CONFIGURATION ---
 OUTPUT_DIR = "./data/chest_xrays"
 OUTPUT_JSON = "radiology_memory.json"
-MAX_SAMPLES = 20000 
+MAX_SAMPLES = 20000
+DATASET_NAME = "eltorio/ROCOv2-radiology"
+
+# --- ⚙️ PARALLELISM ---
+# Worker processes each stream a disjoint set of dataset shards
+HARVEST_WORKERS = int(os.getenv("HARVEST_WORKERS", str(os.cpu_count() or 4)))
+# Threads per worker that decode + save accepted JPEGs in the background
+HARVEST_WRITER_THREADS = int(os.getenv("HARVEST_WRITER_THREADS", "4"))
 
 # 1. BODY PART FILTER (Must have at least one)
 TARGET_ORGANS = ["chest", "lung", "thorax", "pleural", "pulmonary", "mediastinum"]
@@ -27,84 +40,182 @@ NEGATIVE_KEYWORDS = [
     "angiogram", "angiography", "fluoroscopy" # Live video/Dye
 ]
 
+DIAGNOSIS_KEYWORDS = ["pneumonia", "edema", "normal", "atelectasis", "effusion", "opacity", "cardiomegaly", "nodule", "fracture", "pneumothorax"]
+
+# --- 🔎 KEYWORD MATCHER ---
+# All three keyword sets compiled into one alternation. The lookahead makes
+# matches overlap, so every keyword occurrence is seen just like with
+# `keyword in text` (no keyword is a prefix of a keyword from another set).
+_ORGAN, _POSITIVE, _NEGATIVE = 0, 1, 2
+_KEYWORD_CATEGORY = {
+    **{keyword: _ORGAN for keyword in TARGET_ORGANS},
+    **{keyword: _POSITIVE for keyword in POSITIVE_KEYWORDS},
+    **{keyword: _NEGATIVE for keyword in NEGATIVE_KEYWORDS},
+}
+_KEYWORD_MATCHER = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in sorted(_KEYWORD_CATEGORY, key=len, reverse=True)) + "))"
+)
+
 def is_pure_chest_xray(text):
     """
     Returns True ONLY if it's a Chest X-ray.
     Rejects CTs, MRIs, and non-chest images.
     """
-    text = text.lower()
-    
-    # 1. Check Body Part
-    if not any(organ in text for organ in TARGET_ORGANS):
-        return False
-        
-    # 2. Check Modality (Must be X-ray)
-    if not any(mod in text for mod in POSITIVE_KEYWORDS):
-        return False
-        
-    # 3. Check Exclusions (Must NOT be CT/MRI/etc)
-    if any(bad in text for bad in NEGATIVE_KEYWORDS):
-        return False
-        
-    return True
-
-def setup_chest_data():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    print(f"📥 Connecting to ROCOv2...")
-    print(f"🎯 Target: {MAX_SAMPLES} Pure Chest X-rays (Strict Filter Active)...")
-    
-    dataset = load_dataset("eltorio/ROCOv2-radiology", split="train", streaming=True)
-
-    clean_payloads = []
-    count = 0
-    
-    # We use a progress bar to track successful finds
-    pbar = tqdm(total=MAX_SAMPLES, desc="⬇️ Finding Pure X-rays")
-
+    found = set()
+    # One scan over the caption for all three keyword sets
+    for match in _KEYWORD_MATCHER.finditer(text.lower()):
+        category = _KEYWORD_CATEGORY[match.group(1)]
+        if category == _NEGATIVE:
+            return False
+        found.add(category)
+
+    # Must have a body part AND an X-ray modality
+    return len(found) == 2
+
+def build_payload(report_text, image_path):
+    return {
+        "patient_id": f"P_{random.randint(100000, 999999)}",
+        "scan_date": f"2023-{random.randint(1,12):02d}-{random.randint(1,28):02d}",
+        "modality": "CXR", # Now we can confidently label it CXR
+        "diagnosis": [word for word in DIAGNOSIS_KEYWORDS if word in report_text.lower()] or ["findings"],
+        "report_text": report_text,
+        "image_path": image_path
+    }
+
+def harvest_shard(rank, world_size, writer_threads, claimed, max_samples, stop, results):
+    """
+    Worker process: stream this rank's shards, filter captions, and hand
+    accepted images to a background writer pool. Every saved payload is sent
+    back to the parent, which is the only process writing OUTPUT_JSON.
+    """
+    from datasets import load_dataset, Image as ImageFeature
+    from datasets.distributed import split_dataset_by_node
+    from PIL import Image
+
+    # Forked workers inherit the parent's RNG state; give each its own patient ids
+    random.seed()
+
+    dataset = load_dataset(DATASET_NAME, split="train", streaming=True)
+    # Keep raw bytes so only accepted images are ever decoded
+    dataset = dataset.cast_column("image", ImageFeature(decode=False))
+    dataset = split_dataset_by_node(dataset, rank=rank, world_size=world_size)
+
+    def save(image, report_text):
+        image_path = os.path.join(OUTPUT_DIR, f"chest_{uuid.uuid4().hex[:8]}.jpg")
+        try:
+            source = io.BytesIO(image["bytes"]) if image.get("bytes") else image["path"]
+            Image.open(source).convert("RGB").save(image_path)
+        except Exception:
+            with claimed.get_lock():
+                claimed.value -= 1  # give the slot back to another candidate
+            return
+        results.put(("record", build_payload(report_text, image_path)))
+
+    scanned = 0
+    pool = ThreadPoolExecutor(writer_threads, thread_name_prefix="jpeg-writer")
     try:
         for record in dataset:
-            if count >= MAX_SAMPLES:
+            if stop.is_set():
                 break
+            scanned += 1
+            if scanned % 256 == 0:
+                results.put(("scanned", 256))
 
             report_text = record.get("caption", "")
-            
+
             # --- THE STRICT FILTER ---
-            if is_pure_chest_xray(report_text):
-                
-                image_filename = f"chest_{uuid.uuid4().hex[:8]}.jpg"
-                image_path = os.path.join(OUTPUT_DIR, image_filename)
-                
-                try:
-                    record["image"].convert("RGB").save(image_path)
-                    
-                    payload = {
-                        "patient_id": f"P_{random.randint(100000, 999999)}",
-                        "scan_date": f"2023-{random.randint(1,12):02d}-{random.randint(1,28):02d}",
-                        "modality": "CXR", # Now we can confidently label it CXR
-                        "diagnosis": [word for word in ["pneumonia", "edema", "normal", "atelectasis", "effusion", "opacity", "cardiomegaly", "nodule", "fracture", "pneumothorax"] if word in report_text.lower()] or ["findings"],
-                        "report_text": report_text, 
-                        "image_path": image_path
-                    }
-                    
-                    clean_payloads.append(payload)
-                    count += 1
-                    pbar.update(1)
+            if not is_pure_chest_xray(report_text):
+                continue
+
+            # Reserve one of the MAX_SAMPLES slots before paying for the image write
+            with claimed.get_lock():
+                if claimed.value >= max_samples:
+                    stop.set()
+                    break
+                claimed.value += 1
+            pool.submit(save, record["image"], report_text)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        pool.shutdown(wait=True)
+        results.put(("scanned", scanned % 256))
+        results.put(("done", rank))
 
-                except Exception:
-                    continue
+def setup_chest_data(workers=HARVEST_WORKERS, writer_threads=HARVEST_WRITER_THREADS, max_samples=MAX_SAMPLES):
+    from datasets import load_dataset
 
-    except KeyboardInterrupt:
-        print("\n🛑 Download stopped by user. Saving what we have so far...")
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
 
-    pbar.close()
+    print(f"📥 Connecting to ROCOv2...")
+    print(f"🎯 Target: {max_samples} Pure Chest X-rays (Strict Filter Active)...")
+
+    n_shards = load_dataset(DATASET_NAME, split="train", streaming=True).n_shards
+    workers = max(1, min(workers, n_shards))
+    print(f"⚡ {workers} workers over {n_shards} shards, {writer_threads} JPEG writer threads each")
+
+    claimed = mp.Value("i", 0)
+    stop = mp.Event()
+    results = mp.Queue()
+    processes = [
+        mp.Process(target=harvest_shard, args=(rank, workers, writer_threads, claimed, max_samples, stop, results))
+        for rank in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    scanned = 0
+    finished = 0
+    started = time.perf_counter()
 
-    print(f"\n💾 Saving database to {OUTPUT_JSON}...")
-    with open(OUTPUT_JSON, 'w') as f:
-        json.dump(clean_payloads, f, indent=4)
+    # We use a progress bar to track successful finds
+    pbar = tqdm(total=max_samples, desc="⬇️ Finding Pure X-rays")
 
-    print(f"\n✅ DONE! Collected {len(clean_payloads)} HIGH QUALITY X-rays.")
+    # Each payload is written as soon as its image is saved, so an interrupt keeps everything found so far
+    writer = RecordWriter(OUTPUT_JSON)
+    try:
+        while finished < workers:
+            try:
+                try:
+                    kind, value = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break  # a worker died without reporting
+                    continue
+            except KeyboardInterrupt:
+                print("\n🛑 Download stopped by user. Keeping what we have so far...")
+                stop.set()
+                continue
+
+            if kind == "record":
+                if writer.count < max_samples:
+                    writer.write(value)
+                    pbar.update(1)
+            elif kind == "scanned":
+                scanned += value
+                elapsed = time.perf_counter() - started
+                pbar.set_postfix(scanned=scanned, rec_per_s=f"{scanned / elapsed:.0f}",
+                                 accept=f"{writer.count / scanned:.1%}" if scanned else "-")
+            elif kind == "done":
+                finished += 1
+    finally:
+        stop.set()
+        writer.close()
+        pbar.close()
+        for process in processes:
+            process.join(timeout=10)
+
+    elapsed = time.perf_counter() - started
+    print(f"\n💾 Database saved to {OUTPUT_JSON}")
+    print(f"📊 Scanned {scanned} records in {elapsed:.1f}s ({scanned / elapsed if elapsed else 0:.0f} records/s), "
+          f"acceptance rate {writer.count / scanned if scanned else 0:.2%}")
+    print(f"\n✅ DONE! Collected {writer.count} HIGH QUALITY X-rays.")
 
 if __name__ == "__main__":
-    setup_chest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Harvest pure chest X-rays from ROCOv2")
+    parser.add_argument("--workers", type=int, default=HARVEST_WORKERS, help="Processes, each streaming its own shards")
+    parser.add_argument("--writer-threads", type=int, default=HARVEST_WRITER_THREADS, help="JPEG writer threads per process")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES)
+    args = parser.parse_args()
+
+    setup_chest_data(args.workers, args.writer_threads, args.max_samples)
@@ -0,0 +1,189 @@
+"""
+Sentence-level index of the knowledge base.
+
+Every report_text in radiology_memory is split into sentences, the sentences
+are embedded in batches with the BioMedCLIP text tower and stored as child
+points of radiology_sentences ({"parent_id", "position", "sentence"}). The
+backend's diagnose text path then retrieves the best sentences per case with
+query_points_groups(group_by="parent_id") instead of whole captions.
+
+No images are read: the parents must already be ingested (ingest_to_qdrant.py,
+which can also run this stage with --with-sentences).
+
+    python ingest_sentences.py                # rebuild the sentence collection
+    python ingest_sentences.py --incremental  # only new, changed or deleted cases
+"""
+import os
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+
+load_dotenv()
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from sentence_index import (SENTENCE_COLLECTION, report_sentences, report_hash, sentence_point,
+                            create_sentence_collection, delete_children)
+from context_packer import estimate_tokens
+from collection_config import DEFAULT_PROFILE
+
+# --- CONFIGURATION ---
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+KNOWLEDGE_COLLECTION = os.getenv("QDRANT_KNOWLEDGE_COLLECTION", "radiology_memory")
+# Sentences are short: text-only batches can be much larger than image batches
+SENTENCE_ENCODE_BATCH_SIZE = int(os.getenv("SENTENCE_ENCODE_BATCH_SIZE", "128"))
+SENTENCE_UPLOAD_BATCH_SIZE = int(os.getenv("SENTENCE_UPLOAD_BATCH_SIZE", "256"))
+SENTENCE_UPLOAD_WORKERS = int(os.getenv("SENTENCE_UPLOAD_WORKERS", "4"))
+SCROLL_BATCH = 256
+
+
+def indexed_parents(client, collection_name):
+    """parent_id -> report_hash of every case that already has sentences"""
+    parents, offset = {}, None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, limit=1024, offset=offset,
+                                       with_payload=["parent_id", "report_hash"], with_vectors=False)
+        for point in points:
+            parents[point.payload["parent_id"]] = point.payload.get("report_hash")
+        if offset is None:
+            return parents
+
+
+def iter_parent_pages(client, collection_name):
+    """Pages of (parent_id, report_text) of every knowledge point"""
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, limit=SCROLL_BATCH, offset=offset,
+                                       with_payload=["report_text"], with_vectors=False)
+        yield [(str(point.id), (point.payload or {}).get("report_text", "")) for point in points]
+        if offset is None:
+            return
+
+
+def build_sentence_index(client, backend, source_collection=KNOWLEDGE_COLLECTION, target_collection=SENTENCE_COLLECTION,
+                         incremental=False, encode_batch_size=SENTENCE_ENCODE_BATCH_SIZE,
+                         upload_batch_size=SENTENCE_UPLOAD_BATCH_SIZE, upload_workers=SENTENCE_UPLOAD_WORKERS):
+    """
+    Split, embed and upload the sentences of every parent report. Sentences of
+    several reports share one forward pass; upserts run on a thread pool while
+    the next batch is encoded.
+
+    Incremental runs compare each report's content hash with the one stored on
+    its sentences: unchanged cases are skipped, changed cases have their old
+    sentences deleted before the new ones are added, and sentences of cases no
+    longer in the knowledge base are removed.
+    """
+    exists = client.collection_exists(target_collection)
+    if exists and not incremental:
+        print(f"⚠️ Re-creating collection '{target_collection}'...")
+        client.delete_collection(target_collection)
+        exists = False
+    if not exists:
+        create_sentence_collection(client, target_collection)
+        print(f"✅ Collection created! ({DEFAULT_PROFILE.describe()}, text_vector only)")
+
+    indexed = indexed_parents(client, target_collection) if incremental else {}
+    if indexed:
+        print(f"🔁 {len(indexed)} cases already have sentences")
+    total = client.count(source_collection, exact=True).count
+    model_id = f"{backend.name}|{backend.model_name}"
+
+    # Load the text tower up front so model load time is not charged to encoding
+    backend.warmup(("text",))
+    stats = {"parents": 0, "unchanged": 0, "replaced": 0, "removed": 0, "sentences": 0, "report_tokens": 0,
+             "sentence_tokens": 0, "encode_seconds": 0.0, "uploaded": 0}
+    started = time.perf_counter()
+    pending, window = [], deque()
+
+    def upload(points):
+        client.upsert(collection_name=target_collection, points=points)
+        return len(points)
+
+    def encode(batch):
+        encode_started = time.perf_counter()
+        vectors = backend.encode_text([sentence for *_, sentence in batch])
+        stats["encode_seconds"] += time.perf_counter() - encode_started
+        pending.extend(sentence_point(parent_id, position, sentence, vector, content_hash)
+                       for (parent_id, content_hash, position, sentence), vector in zip(batch, vectors))
+
+    with ThreadPoolExecutor(upload_workers, thread_name_prefix="upload") as pool, \
+            tqdm(total=total, unit="case") as progress:
+        batch, seen = [], set()
+        for page in iter_parent_pages(client, source_collection):
+            changed = []
+            for parent_id, report_text in page:
+                seen.add(parent_id)
+                content_hash = report_hash(report_text, model_id)
+                if indexed.get(parent_id) == content_hash:
+                    stats["unchanged"] += 1
+                    progress.update(1)
+                    continue
+                changed.append((parent_id, report_text, content_hash))
+            # Old sentences go before any new ones are queued; fewer sentences would leave orphans
+            stale = [parent_id for parent_id, _, _ in changed if parent_id in indexed]
+            delete_children(client, stale, target_collection)
+            stats["replaced"] += len(stale)
+
+            for parent_id, report_text, content_hash in changed:
+                sentences = report_sentences(report_text)
+                stats["parents"] += 1
+                stats["sentences"] += len(sentences)
+                stats["report_tokens"] += estimate_tokens(report_text or "")
+                stats["sentence_tokens"] += sum(estimate_tokens(s) for s in sentences)
+                batch.extend((parent_id, content_hash, position, sentence)
+                             for position, sentence in enumerate(sentences))
+                progress.update(1)
+                if len(batch) >= encode_batch_size:
+                    encode(batch)
+                    batch = []
+                while len(pending) >= upload_batch_size:
+                    window.append(pool.submit(upload, pending[:upload_batch_size]))
+                    del pending[:upload_batch_size]
+                    if len(window) >= upload_workers * 2:
+                        stats["uploaded"] += window.popleft().result()
+
+        # Cases deleted from the knowledge base
+        removed = [parent_id for parent_id in indexed if parent_id not in seen]
+        delete_children(client, removed, target_collection)
+        stats["removed"] = len(removed)
+        if batch:
+            encode(batch)
+        if pending:
+            window.append(pool.submit(upload, list(pending)))
+        while window:
+            stats["uploaded"] += window.popleft().result()
+
+    wall = time.perf_counter() - started
+    parents = stats["parents"] or 1
+    print(f"✅ {stats['uploaded']} sentences from {stats['parents']} cases in {wall:.1f}s "
+          f"({stats['sentences'] / parents:.1f} per case, "
+          f"{stats['sentences'] / stats['encode_seconds'] if stats['encode_seconds'] else 0.0:.0f} sentences/s encoded)")
+    if incremental:
+        print(f"   {stats['unchanged']} unchanged, {stats['replaced']} re-indexed, {stats['removed']} removed cases")
+    print(f"   mean report {stats['report_tokens'] / parents:.0f} tokens, "
+          f"mean sentence {stats['sentence_tokens'] / max(stats['sentences'], 1):.0f} tokens")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep the collection; only re-index cases whose report changed, drop deleted ones")
+    parser.add_argument("--encode-batch-size", type=int, default=SENTENCE_ENCODE_BATCH_SIZE,
+                        help="Sentences per forward pass")
+    parser.add_argument("--upload-batch-size", type=int, default=SENTENCE_UPLOAD_BATCH_SIZE, help="Points per upsert")
+    parser.add_argument("--upload-workers", type=int, default=SENTENCE_UPLOAD_WORKERS, help="Concurrent upserts")
+    args = parser.parse_args()
+
+    from inference_backends import load_backend, INFERENCE_BACKEND, MODEL_NAME
+    text_backend = load_backend(INFERENCE_BACKEND, os.getenv("MODEL_NAME") or MODEL_NAME)
+    qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60)
+    build_sentence_index(qdrant, text_backend, incremental=args.incremental,
+                         encode_batch_size=args.encode_batch_size, upload_batch_size=args.upload_batch_size,
+                         upload_workers=args.upload_workers)
@@ -1,8 +1,15 @@
+import io
 import json
 import os
+import sys
+import time
+import uuid
+import hashlib
 import random
-import torch
-import open_clip
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 from PIL import Image
 from qdrant_client import QdrantClient
@@ -18,6 +25,19 @@ TRAIN_SIZE = 3500
 # Size of the "Test" (Unseen Data)
 TEST_SIZE = 500 
 
+# --- ⚙️ PIPELINE ---
+# decode/preprocess threads -> batched encode (main thread) -> parallel upserts
+DECODE_WORKERS = int(os.getenv("INGEST_DECODE_WORKERS", str(os.cpu_count() or 4)))
+ENCODE_BATCH_SIZE = int(os.getenv("INGEST_ENCODE_BATCH_SIZE", "32"))
+UPLOAD_BATCH_SIZE = int(os.getenv("INGEST_UPLOAD_BATCH_SIZE", "64"))
+UPLOAD_WORKERS = int(os.getenv("INGEST_UPLOAD_WORKERS", "4"))
+
+# --- 📒 CHECKPOINTS ---
+# One {"id", "hash"} line per point Qdrant has confirmed; --incremental skips unchanged records
+MANIFEST_FILE = os.getenv("INGEST_MANIFEST", "ingest_manifest.jsonl")
+# One line per record that could not be ingested, rewritten on every run
+ERROR_REPORT_FILE = os.getenv("INGEST_ERROR_REPORT", "ingest_errors.jsonl")
+
 # --- ☁️ CREDENTIALS ---
  # <--- 1. Add this import
 
@@ -30,106 +50,466 @@ COLLECTION_NAME = os.getenv("QDRANT_COLLECTION")
 MODEL_ID = os.getenv("MODEL_NAME")
 
 # --- 🏥 LOAD BIOMEDCLIP MODEL ---
-print("🏥 Loading Microsoft BioMedCLIP...")
-model, _, preprocess = open_clip.create_model_and_transforms(
-    'hf-hub:microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224'
-)
-tokenizer = open_clip.get_tokenizer('hf-hub:microsoft/BiomedCLIP-PubMedBERT_256-vit_base_patch16_224')
+# Shares the backend's inference runtime (INFERENCE_BACKEND: torch, torch-int8, torchscript, onnx, onnx-int8)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from inference_backends import load_backend, INFERENCE_BACKEND, MODEL_NAME
+from embedding_artifact import ArtifactWriter, ArtifactReader, VECTOR_NAMES
+from records import iter_records, count_records, RecordWriter
+from collection_config import create_scan_collection, bump_collection_version, DEFAULT_PROFILE
+from ingest_sentences import build_sentence_index
+
+backend = load_backend(INFERENCE_BACKEND, MODEL_ID or MODEL_NAME)
 
 client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=60)
 
-def setup_collection():
+def setup_collection(recreate=True):
     if client.collection_exists(COLLECTION_NAME):
+        if not recreate:
+            print(f"📂 Updating existing collection '{COLLECTION_NAME}'")
+            return
         print(f"⚠️ Re-creating collection '{COLLECTION_NAME}'...")
         client.delete_collection(COLLECTION_NAME)
     
-    client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config={
-            "image_vector": models.VectorParams(size=512, distance=models.Distance.COSINE),
-            "text_vector": models.VectorParams(size=512, distance=models.Distance.COSINE),
+    create_scan_collection(client, COLLECTION_NAME)
+    print(f"✅ Collection created! ({DEFAULT_PROFILE.describe()})")
+
+def normalize_image_path(image_path):
+    # Handle Windows/Linux path differences
+    return os.path.normpath(image_path.replace("\\", "/"))
+
+
+def record_point_id(record):
+    """Stable point id of a scan, independent of its position in the shuffled dataset"""
+    key = f"{record.get('patient_id')}|{record.get('scan_date')}|{normalize_image_path(record['image_path'])}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def content_hash(record, image_bytes):
+    """Changes whenever the payload, the image or the embedding model changes"""
+    digest = hashlib.sha256()
+    digest.update(f"{backend.name}|{backend.model_name}".encode())
+    digest.update(json.dumps(record, sort_keys=True).encode())
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Append-only checkpoint of ingested points. A line is written (and fsynced)
+    only after the upsert containing that point succeeded, so after a crash the
+    manifest never claims more than Qdrant holds.
+    """
+
+    def __init__(self, path, reset=False):
+        self.path = path
+        self.entries = {}
+        if reset and os.path.exists(path):
+            os.remove(path)
+        elif os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from an interrupted run
+                    self.entries[entry["id"]] = entry["hash"]
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def is_current(self, point_id, digest):
+        return self.entries.get(point_id) == digest
+
+    def checkpoint(self, entries):
+        with self._lock:
+            for point_id, digest in entries:
+                self._file.write(json.dumps({"id": point_id, "hash": digest}) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ErrorReport:
+    """JSONL report of records skipped by the pipeline, with the stage and error"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w")
+        self._lock = threading.Lock()
+
+    def add(self, stage, record, error):
+        entry = {
+            "stage": stage,
+            "patient_id": record.get("patient_id"),
+            "image_path": record.get("image_path"),
+            "error": type(error).__name__,
+            "message": str(error),
         }
-    )
-    print("✅ Collection created!")
+        with self._lock:
+            self.count += 1
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
 
-def process_and_upload():
-    # 1. Load Data
-    try:
-        with open(INPUT_FILE, 'r') as f:
-            all_records = json.load(f)
-    except FileNotFoundError:
-        print(f"❌ Error: {INPUT_FILE} not found.")
-        return
+    def close(self):
+        self._file.close()
 
-    # 2. Check if we have enough data
-    total_needed = TRAIN_SIZE + TEST_SIZE
-    if len(all_records) < total_needed:
-        print(f"❌ Not enough data! You have {len(all_records)}, but need {total_needed}.")
-        return
 
-    # 3. Shuffle and Split
-    print("🔀 Shuffling data...")
-    random.seed(42) # Ensures the split is consistent every time you run it
-    random.shuffle(all_records)
+class StageStats:
+    """Items processed and busy time of one pipeline stage (thread-safe)"""
 
-    train_records = all_records[:TRAIN_SIZE]
-    test_records = all_records[TRAIN_SIZE : TRAIN_SIZE + TEST_SIZE]
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.skipped = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
 
-    # 4. Save Test Set
-    print(f"💾 Saving {len(test_records)} test records to '{TEST_FILE}'...")
-    with open(TEST_FILE, 'w') as f:
-        json.dump(test_records, f, indent=4)
+    def add(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def skip(self, items=1):
+        with self._lock:
+            self.skipped += items
+
+
+UNCHANGED = object()
+
+
+def load_record(record, manifest):
+    """
+    Hash, decode and preprocess one record on a worker thread. Returns
+    UNCHANGED if the manifest already holds this exact content.
+    """
+    point_id = record_point_id(record)
+    with open(normalize_image_path(record['image_path']), "rb") as f:
+        image_bytes = f.read()
+    digest = content_hash(record, image_bytes)
+    if manifest.is_current(point_id, digest):
+        return UNCHANGED
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        prepared = backend.preprocess_image(image.convert("RGB"))
+    return point_id, digest, record, record['report_text'], prepared
 
-    # 5. Ingest Training Set
-    print(f"🚀 Ingesting {len(train_records)} records into Qdrant...")
-    
-    points_to_upload = []
-    BATCH_SIZE = 50 
 
-    for idx, record in enumerate(tqdm(train_records)):
+def run_pipeline(records, total, args, manifest, errors):
+    """
+    Ingest an iterable of `total` records through three overlapping stages:
+      decode  - a thread pool opens and preprocesses images (PIL releases the GIL)
+      encode  - the main thread embeds encode_batch_size records per forward pass
+      upload  - a thread pool upserts upload_batch_size points while encoding continues
+    Records already in the manifest with the same content hash are skipped
+    before decoding; failures are written to the error report, not dropped.
+    """
+    stats = {name: StageStats(name) for name in ("decode", "encode", "upload")}
+    unchanged = 0
+    # Load both towers up front so model load time is not charged to a stage
+    backend.warmup()
+
+    decode_pool = ThreadPoolExecutor(args.decode_workers, thread_name_prefix="decode")
+    upload_pool = ThreadPoolExecutor(args.upload_workers, thread_name_prefix="upload")
+    # Bounds the points held in memory when uploads fall behind inference
+    upload_slots = threading.BoundedSemaphore(args.upload_workers * 2)
+    uploads = []
+
+    def timed_load(record):
+        started = time.perf_counter()
         try:
-            # Handle Windows/Linux path differences
-            image_path = os.path.normpath(record['image_path'])
-            if not os.path.exists(image_path): 
-                continue
+            item = load_record(record, manifest)
+        except Exception as e:
+            errors.add("decode", record, e)
+            item = None
+        stats["decode"].add(1, time.perf_counter() - started)
+        if item is None:
+            stats["decode"].skip()
+        return item
 
-            # Generate Embeddings
-            image = preprocess(Image.open(image_path)).unsqueeze(0)
-            text_tokens = tokenizer([record['report_text']])
+    def upload(entries):
+        points = [point for point, _, _ in entries]
+        started = time.perf_counter()
+        try:
+            client.upsert(collection_name=COLLECTION_NAME, points=points)
+            stats["upload"].add(len(points), time.perf_counter() - started)
+            manifest.checkpoint([(point.id, digest) for point, digest, _ in entries])
+        except Exception as e:
+            for _, _, record in entries:
+                errors.add("upload", record, e)
+            stats["upload"].skip(len(points))
+        finally:
+            upload_slots.release()
+
+    def submit_upload(entries):
+        upload_slots.acquire()
+        uploads.append(upload_pool.submit(upload, entries))
 
-            with torch.no_grad():
-                img_features = model.encode_image(image)
-                img_features /= img_features.norm(dim=-1, keepdim=True)
-                
-                txt_features = model.encode_text(text_tokens)
-                txt_features /= txt_features.norm(dim=-1, keepdim=True)
+    pending_points = []
 
+    def embed(batch):
+        image_vectors = backend.encode_preprocessed_images([prepared for *_, prepared in batch])
+        text_vectors = backend.encode_text([text for _, _, _, text, _ in batch])
+        return list(zip(batch, image_vectors, text_vectors))
+
+    def encode(batch):
+        started = time.perf_counter()
+        try:
+            embedded = embed(batch)
+        except Exception:
+            # Isolate the record(s) that broke the batch
+            embedded = []
+            for item in batch:
+                try:
+                    embedded.extend(embed([item]))
+                except Exception as e:
+                    errors.add("encode", item[2], e)
+                    stats["encode"].skip()
+        stats["encode"].add(len(embedded), time.perf_counter() - started)
+
+        for (point_id, digest, record, _, _), image_vector, text_vector in embedded:
             point = models.PointStruct(
-                id=idx, 
+                id=point_id,
                 vector={
-                    "image_vector": img_features.squeeze().tolist(),
-                    "text_vector": txt_features.squeeze().tolist()
+                    "image_vector": image_vector,
+                    "text_vector": text_vector
                 },
-                payload=record 
+                payload=record
             )
-            points_to_upload.append(point)
+            pending_points.append((point, digest, record))
+        while len(pending_points) >= args.upload_batch_size:
+            submit_upload(pending_points[:args.upload_batch_size])
+            del pending_points[:args.upload_batch_size]
 
-            # Upload Batch
-            if len(points_to_upload) >= BATCH_SIZE:
-                client.upsert(collection_name=COLLECTION_NAME, points=points_to_upload)
-                points_to_upload = []
+    started = time.perf_counter()
+    window = deque()
+    window_size = max(args.encode_batch_size * 2, args.decode_workers * 4)
+    record_iter = iter(records)
+    batch = []
 
-        except Exception as e:
-            continue
+    with tqdm(total=total, unit="rec") as progress:
+        def refill():
+            for record in record_iter:
+                window.append(decode_pool.submit(timed_load, record))
+                if len(window) >= window_size:
+                    break
+
+        refill()
+        while window:
+            item = window.popleft().result()
+            refill()
+            if item is None or item is UNCHANGED:
+                unchanged += item is UNCHANGED
+                progress.update(1)
+                continue
+            batch.append(item)
+            if len(batch) >= args.encode_batch_size:
+                encode(batch)
+                progress.update(len(batch))
+                progress.set_postfix(uploaded=stats["upload"].items)
+                batch = []
+
+        if batch:
+            encode(batch)
+            progress.update(len(batch))
+        if pending_points:
+            submit_upload(list(pending_points))
+            pending_points.clear()
+
+        decode_pool.shutdown()
+        for future in uploads:
+            future.result()
+        upload_pool.shutdown()
+        progress.set_postfix(uploaded=stats["upload"].items)
+
+    stats["unchanged"] = unchanged
+    stats["wall_seconds"] = time.perf_counter() - started
+    return stats
+
+
+def report_throughput(stats):
+    wall = stats["wall_seconds"]
+    print("\n📊 Pipeline throughput")
+    for name in ("decode", "encode", "upload"):
+        stage = stats[name]
+        rate = stage.items / stage.busy_seconds if stage.busy_seconds else 0.0
+        print(f"   {name:<7} {stage.items:>7} items  {stage.skipped:>5} skipped  "
+              f"{stage.busy_seconds:>8.1f}s busy  {rate:>8.1f} items/s per worker")
+    print(f"   unchanged {stats['unchanged']} records (already in the manifest)")
+    overall = stats["upload"].items / wall if wall else 0.0
+    print(f"   overall {stats['upload'].items:>7} points in {wall:.1f}s ({overall:.1f} points/s)")
+
+
+def export_artifact(directory, batch_size=256):
+    """Dump every point of the collection (vectors + payload) into an embedding artifact"""
+    hashes = {}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                hashes[entry["id"]] = entry["hash"]
+
+    total = client.count(COLLECTION_NAME, exact=True).count
+    print(f"📦 Exporting {total} points from '{COLLECTION_NAME}' to '{directory}'...")
+    writer = ArtifactWriter(directory, metadata={
+        "collection": COLLECTION_NAME, "model": backend.model_name, "backend": backend.name,
+    })
+    offset = None
+    with tqdm(total=total, unit="pt") as progress:
+        while True:
+            points, offset = client.scroll(
+                collection_name=COLLECTION_NAME, limit=batch_size, offset=offset,
+                with_payload=True, with_vectors=list(VECTOR_NAMES),
+            )
+            for point in points:
+                # Integer ids stay integers: Qdrant rejects "42" as a point id on restore
+                writer.append(point.id, point.vector, point.payload, hashes.get(str(point.id)))
+            progress.update(len(points))
+            if offset is None:
+                break
+    writer.close()
+    print(f"✅ Artifact written: {len(writer.ids)} rows")
+
+
+def rebuild_from_artifact(directory, args):
+    """Upload a collection straight from an artifact: no model, no images"""
+    artifact = ArtifactReader(directory)
+    if artifact.meta["dim"] != 512 or set(artifact.meta["vectors"]) != set(VECTOR_NAMES):
+        print(f"❌ Artifact vectors {artifact.meta['vectors']} x {artifact.meta['dim']} do not match this collection")
+        return
+    print(f"📦 Restoring {len(artifact)} points from '{directory}' "
+          f"(model {artifact.meta.get('model')}, backend {artifact.meta.get('backend')})...")
+
+    manifest = IngestManifest(MANIFEST_FILE, reset=not args.incremental)
+    stats = StageStats("upload")
+    started = time.perf_counter()
+
+    def upload(rows):
+        points = [
+            models.PointStruct(id=point_id, vector={name: vector.tolist() for name, vector in vectors.items()},
+                               payload=payload)
+            for point_id, vectors, payload, _ in rows
+        ]
+        batch_started = time.perf_counter()
+        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        stats.add(len(points), time.perf_counter() - batch_started)
+        manifest.checkpoint([(str(point_id), digest) for point_id, _, _, digest in rows if digest])
+        return len(points)
+
+    try:
+        with ThreadPoolExecutor(args.upload_workers, thread_name_prefix="upload") as pool, \
+                tqdm(total=len(artifact), unit="pt") as progress:
+            window = deque()
+            for rows in artifact.iter_batches(args.upload_batch_size):
+                window.append(pool.submit(upload, rows))
+                if len(window) >= args.upload_workers * 2:
+                    progress.update(window.popleft().result())
+            while window:
+                progress.update(window.popleft().result())
+    finally:
+        manifest.close()
+
+    wall = time.perf_counter() - started
+    print(f"✅ Restored {stats.items} points in {wall:.1f}s ({stats.items / wall if wall else 0.0:.1f} points/s)")
+
+
+def process_and_upload(args):
+    # 1. Count Data (records are streamed, never loaded all at once)
+    try:
+        total_records = count_records(INPUT_FILE)
+    except FileNotFoundError:
+        print(f"❌ Error: {INPUT_FILE} not found.")
+        return
+
+    if args.incremental and os.path.exists(TEST_FILE):
+        # Keep the existing held-out set frozen; everything else belongs in the knowledge base
+        held_out = {record_point_id(record) for record in iter_records(TEST_FILE)}
+        test_count = len(held_out)
+        train_count = sum(1 for record in iter_records(INPUT_FILE) if record_point_id(record) not in held_out)
+        train_records = (record for record in iter_records(INPUT_FILE) if record_point_id(record) not in held_out)
+        print(f"🔁 Incremental run: {train_count} candidate records, {test_count} held out in '{TEST_FILE}'")
+    else:
+        # 2. Check if we have enough data
+        total_needed = TRAIN_SIZE + TEST_SIZE
+        if total_records < total_needed:
+            print(f"❌ Not enough data! You have {total_records}, but need {total_needed}.")
+            return
+
+        # 3. Shuffle and Split
+        # Shuffling positions instead of records gives the same permutation as
+        # shuffling the loaded list did, so the split is unchanged
+        print("🔀 Shuffling data...")
+        random.seed(42) # Ensures the split is consistent every time you run it
+        order = list(range(total_records))
+        random.shuffle(order)
+
+        train_positions = set(order[:TRAIN_SIZE])
+        test_rank = {position: rank for rank, position in enumerate(order[TRAIN_SIZE : TRAIN_SIZE + TEST_SIZE])}
+        train_count, test_count = TRAIN_SIZE, len(test_rank)
+
+        # 4. Save Test Set (500 records are buffered to keep the shuffled order)
+        test_records = [None] * test_count
+        for position, record in enumerate(iter_records(INPUT_FILE)):
+            if position in test_rank:
+                test_records[test_rank[position]] = record
+        print(f"💾 Saving {test_count} test records to '{TEST_FILE}'...")
+        with RecordWriter(TEST_FILE) as writer:
+            for record in test_records:
+                writer.write(record)
+        del test_records
+
+        train_records = (record for position, record in enumerate(iter_records(INPUT_FILE))
+                         if position in train_positions)
+
+    # 5. Ingest Training Set
+    print(f"🚀 Ingesting {train_count} records into Qdrant...")
+    # A full run recreated the collection, so the old checkpoints no longer apply
+    manifest = IngestManifest(MANIFEST_FILE, reset=not args.incremental)
+    errors = ErrorReport(ERROR_REPORT_FILE)
+    try:
+        stats = run_pipeline(train_records, train_count, args, manifest, errors)
+    finally:
+        manifest.close()
+        errors.close()
+    report_throughput(stats)
 
-    # Final Upload
-    if points_to_upload:
-        client.upsert(collection_name=COLLECTION_NAME, points=points_to_upload)
-    
     print("\n🎉 Success!")
-    print(f"✅ Indexed {TRAIN_SIZE} patients in Qdrant.")
-    print(f"✅ Saved {TEST_SIZE} unseen patients to '{TEST_FILE}'.")
+    print(f"✅ Indexed {stats['upload'].items} patients in Qdrant ({stats['unchanged']} already up to date).")
+    print(f"✅ {test_count} unseen patients in '{TEST_FILE}'.")
+    if errors.count:
+        print(f"⚠️ {errors.count} records skipped, see '{ERROR_REPORT_FILE}'.")
 
 if __name__ == "__main__":
-    setup_collection()
-    process_and_upload()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Embed the training split and upload it to Qdrant")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Keep the collection and only embed records that are new or changed since {MANIFEST_FILE}; also resumes an interrupted run")
+    parser.add_argument("--export-artifact", metavar="DIR",
+                        help="After ingesting, dump the collection's vectors + payloads to an embedding artifact")
+    parser.add_argument("--export-only", action="store_true", help="With --export-artifact: skip ingestion")
+    parser.add_argument("--from-artifact", metavar="DIR",
+                        help="Rebuild the collection from an embedding artifact instead of running the model")
+    parser.add_argument("--decode-workers", type=int, default=DECODE_WORKERS, help="Image decode/preprocess threads")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Records per forward pass")
+    parser.add_argument("--upload-batch-size", type=int, default=UPLOAD_BATCH_SIZE, help="Points per upsert")
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS, help="Concurrent upserts")
+    parser.add_argument("--with-sentences", action="store_true",
+                        help="Afterwards, (re)build the sentence-level child index (see ingest_sentences.py)")
+    args = parser.parse_args()
+
+    if args.from_artifact or not args.export_only:
+        setup_collection(recreate=not args.incremental)
+        try:
+            if args.from_artifact:
+                rebuild_from_artifact(args.from_artifact, args)
+            else:
+                process_and_upload(args)
+        finally:
+            # Running backends compare this marker to decide when to reload their knowledge index
+            bump_collection_version(client, COLLECTION_NAME)
+    if args.with_sentences:
+        build_sentence_index(client, backend, source_collection=COLLECTION_NAME, incremental=args.incremental)
+    if args.export_artifact:
+        export_artifact(args.export_artifact)
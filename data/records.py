@@ -0,0 +1,137 @@
+"""
+Streaming reader / writer for the dataset files (radiology_memory.json, the test split).
+
+Two on-disk layouts are supported and detected automatically when reading:
+  - a JSON array of records (the original format), parsed incrementally
+  - line-delimited JSON (one record per line), used for paths not ending in .json
+
+Neither side ever holds more than one record (plus a read buffer) in memory.
+The writer flushes every record and fsyncs periodically, and the reader stops
+cleanly at a truncated tail, so a file cut short by an interrupt or OOM still
+yields every record written before it.
+"""
+import os
+import json
+import random
+
+READ_CHUNK_SIZE = 1 << 16
+FSYNC_EVERY = 100
+
+_decoder = json.JSONDecoder()
+
+
+def iter_records(path):
+    """Yield records one at a time from a JSON array or JSONL file"""
+    with open(path, "r") as f:
+        head = f.read(READ_CHUNK_SIZE)
+        if head.lstrip().startswith("["):
+            yield from _iter_array(f, head)
+        else:
+            yield from _iter_lines(f, head)
+
+
+def _iter_lines(f, head):
+    buffer = head
+    while True:
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except json.JSONDecodeError:
+            pass  # torn last line from an interrupted writer
+
+
+def _iter_array(f, head):
+    buffer = head
+    pos = buffer.index("[") + 1
+    eof = False
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            record = end = None
+        if record is not None and (end < len(buffer) or eof):
+            yield record
+            pos = end
+            continue
+        if eof:
+            return  # truncated array: everything complete has been yielded
+        # Need more data: drop what has been consumed and read the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = f.read(READ_CHUNK_SIZE)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+
+def count_records(path):
+    return sum(1 for _ in iter_records(path))
+
+
+def reservoir_sample(records, k, rng=random):
+    """Uniform sample of k records from a stream of unknown length (Algorithm R)"""
+    sample = []
+    for i, record in enumerate(records):
+        if i < k:
+            sample.append(record)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                sample[j] = record
+    return sample
+
+
+class RecordWriter:
+    """
+    Append records to a file as they are produced. Paths ending in .json get a
+    JSON array (readable by json.load once closed), anything else gets JSONL.
+    """
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY):
+        self.path = path
+        self.count = 0
+        self.fsync_every = fsync_every
+        self._array = path.endswith(".json")
+        self._file = open(path, "w")
+        if self._array:
+            self._file.write("[\n")
+
+    def write(self, record):
+        line = json.dumps(record)
+        if self._array:
+            self._file.write((",\n" if self.count else "") + line)
+        else:
+            self._file.write(line + "\n")
+        self._file.flush()
+        self.count += 1
+        if self.count % self.fsync_every == 0:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._array:
+            self._file.write("\n]\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
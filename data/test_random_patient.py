@@ -151,10 +151,8 @@
 # if __name__ == "__main__":
 #     test_random_sample()
 
-import json
 import os
 import torch
-import random
 import open_clip
 import matplotlib.pyplot as plt
 
@@ -163,6 +161,7 @@ from qdrant_client import QdrantClient
 from fpdf import FPDF, XPos, YPos
 import openai # We still use the openai library to talk to Gemini
 import re
+from records import iter_records, reservoir_sample
 
 # --- 🔑 CONFIGURATION ---
 QDRANT_URL = "https://10cc0ed4-d483-4a82-96fc-9924824e0126.us-east4-0.gcp.cloud.qdrant.io:6333"
@@ -247,10 +246,8 @@ def generate_well_report(raw_text, score):
 
 def test_random_sample():
     try:
-        with open(TEST_FILE, 'r') as f:
-            records = json.load(f)
-        
-        test_record = random.choice(records)
+        # One-pass uniform pick; the test set is streamed, not loaded
+        test_record = reservoir_sample(iter_records(TEST_FILE), 1)[0]
         test_image_path = os.path.normpath(test_record['image_path'])
         patient_id = test_record.get('patient_id', 'Unknown')
         